@@ -0,0 +1,208 @@
+"""
+Measure throughput and memory of the client's hot paths
+against the stand-in server from `cmkclient.fakeserver`.
+
+Request building, response decoding, bulk host creation, host listing
+and service discovery are measured for inventories of each of the given
+sizes.  The server runs in a separate process, so that timings and
+allocations are those of the client alone.
+
+Run with::
+
+    python benchmarks/bench_client.py [--hosts N [N ...]] [--max-discovery N] [--repeat N]
+                                      [--only NAME [NAME ...]]
+                                      [--output FILE] [--baseline FILE] [--threshold RATIO]
+
+With ``--baseline``, the results are compared to those previously saved
+with ``--output``, and the exit status is 1 if any benchmark got slower
+by more than the given ratio.
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import timeit
+import tracemalloc
+
+from cmkclient import WebApi
+from cmkclient import jsonstream
+from cmkclient.fakeserver import FakeServer
+
+
+def _serve(conn):
+    """
+    Run a #FakeServer, taking commands from the pipe `conn`.
+    """
+    with FakeServer() as server:
+        conn.send((server.url, server.username, server.secret))
+        while True:
+            command, arg = conn.recv()
+            if command == 'stop':
+                return
+            server.site.reset()
+            if command == 'populate':
+                server.site.populate(arg, folders=max(arg // 1000, 1))
+            conn.send(None)
+
+
+class Server:
+    """
+    Handle to a #FakeServer running in a child process.
+    """
+
+    def __init__(self):
+        self._conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_serve, args=(child_conn,), daemon=True)
+        self._process.start()
+        self.url, self.username, self.secret = self._conn.recv()
+
+    def reset(self, hosts=0):
+        self._conn.send(('populate', hosts))
+        self._conn.recv()
+
+    def stop(self):
+        self._conn.send(('stop', None))
+        self._process.join()
+
+
+def host_requests(count):
+    return [
+        {
+            'hostname': 'host{0:06}'.format(n),
+            'folder': 'folder{0:04}'.format(n % 100),
+            'ipaddress': '10.{0}.{1}.{2}'.format(n >> 16, (n >> 8) & 255, n & 255),
+            'alias': 'Host #{0}'.format(n),
+            'tags': {'agent': 'cmk-agent', 'criticality': 'prod'},
+            'snmp': False,
+        }
+        for n in range(count)
+    ]
+
+
+def all_hosts_body(count, output_format):
+    result = {
+        'host{0:06}'.format(n): {
+            'hostname': 'host{0:06}'.format(n),
+            'path': 'folder{0:04}'.format(n % 100),
+            'attributes': {'ipaddress': '10.0.0.1', 'alias': 'Host #{0}'.format(n), 'tag_agent': 'cmk-agent'},
+        }
+        for n in range(count)
+    }
+    reply = {'result': result, 'result_code': 0}
+    return (repr(reply) if output_format == 'python' else json.dumps(reply)).encode()
+
+
+class _Response:
+    status = 200
+
+
+def benchmarks(server, count, max_discovery):
+    """
+    Yield `(name, hosts, setup, run)` for each benchmark on `count` hosts.
+
+    `setup()` is called before each timed `run()` and not measured.
+    Discovery, which takes one request per host, runs on at most
+    `max_discovery` hosts.
+    """
+    api = WebApi(server.url, server.username, server.secret)
+    requests = host_requests(count)
+    format_params = WebApi._WebApi__format_params
+    build_request_data = WebApi._WebApi__build_request_data
+
+    def noop():
+        pass
+
+    bulk_data = {'hosts': [WebApi._add_host_request(host) for host in requests]}
+    yield 'format_params', count, noop, lambda: [format_params(WebApi._host_attributes(**host)) for host in requests]
+    yield 'build_request_data[json]', count, noop, lambda: build_request_data(bulk_data, 'json')
+    yield 'build_request_data[python]', count, noop, lambda: build_request_data(bulk_data, 'python')
+
+    json_body = all_hosts_body(count, 'json')
+    python_body = all_hosts_body(count, 'python')
+    yield 'parse_response[json]', count, noop, lambda: WebApi._parse_response(_Response, json_body, 'json')
+    yield 'parse_response[python]', count, noop, lambda: WebApi._parse_response(_Response, python_body, 'python')
+    yield 'jsonstream', count, noop, lambda: sum(1 for _ in jsonstream.iter_result_items(
+        json_body[n:n + 65536] for n in range(0, len(json_body), 65536)))
+
+    yield 'add_hosts', count, server.reset, lambda: api.add_hosts(requests)
+    yield 'get_all_hosts', count, lambda: server.reset(count), api.get_all_hosts
+    yield 'iter_all_hosts', count, lambda: server.reset(count), lambda: sum(1 for _ in api.iter_all_hosts())
+    discovered = min(count, max_discovery)
+    yield 'discover_services', discovered, lambda: server.reset(discovered), \
+        lambda: api.discover_services_for_all_hosts(workers=8)
+
+
+def measure(setup, run, repeat):
+    """
+    Return best wall-clock time and peak traced memory of `run()`.
+    """
+    times = []
+    for _ in range(repeat):
+        setup()
+        times.append(timeit.timeit(run, number=1))
+    setup()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hosts', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="inventory sizes to measure")
+    parser.add_argument('--max-discovery', type=int, default=10000,
+                        help="maximum number of hosts to run service discovery on (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='+', metavar='NAME', help="run only these benchmarks")
+    parser.add_argument('--output', metavar='FILE', help="save results as JSON")
+    parser.add_argument('--baseline', metavar='FILE', help="compare with results saved by --output")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="slowdown ratio reported as a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    print("Python {0} on {1}".format(platform.python_version(), platform.platform()))
+    print("{0:<28} {1:>7} {2:>10} {3:>12} {4:>10}".format('benchmark', 'hosts', 'seconds', 'hosts/s', 'peak MB'))
+
+    server = Server()
+    results = {}
+    try:
+        for count in args.hosts:
+            for name, hosts, setup, run in benchmarks(server, count, args.max_discovery):
+                if args.only and name not in args.only:
+                    continue
+                best, peak = measure(setup, run, args.repeat)
+                results['{0}/{1}'.format(name, hosts)] = {'seconds': best, 'peak_bytes': peak}
+                print("{0:<28} {1:>7} {2:>10.4f} {3:>12.0f} {4:>10.1f}".format(
+                    name, hosts, best, hosts / best, peak / 1e6))
+                sys.stdout.flush()
+    finally:
+        server.stop()
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = 0
+        for key, result in sorted(results.items()):
+            if key not in baseline:
+                continue
+            ratio = result['seconds'] / baseline[key]['seconds']
+            if ratio > args.threshold:
+                regressions += 1
+                print("REGRESSION {0}: {1:.2f}x slower than baseline".format(key, ratio))
+        if regressions:
+            sys.exit(1)
+        print("no regressions above {0:.2f}x".format(args.threshold))
+
+
+if __name__ == '__main__':
+    main()
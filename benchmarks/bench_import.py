@@ -0,0 +1,114 @@
+"""
+Measure how long one-shot uses of the package take to start.
+
+Each measurement runs a fresh interpreter: a bare ``python -c pass`` for
+reference, ``import cmkclient``, ``import cmkclient.cli``, and a whole
+``cmkclient get_host`` call against the stand-in server from
+`cmkclient.fakeserver`, both through the command-line fast path and
+through Fire.  The best wall-clock time of each is reported.
+
+Run with::
+
+    python benchmarks/bench_import.py [--repeat N] [--modules N] [--max-ms MS]
+
+With ``--modules``, the N modules slowest to import (not counting their
+own imports) are listed, as reported by ``python -X importtime``.  With
+``--max-ms``, the exit status is 1 if the fast-path call takes longer
+than the given number of milliseconds.
+"""
+
+import argparse
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from cmkclient.fakeserver import FakeServer
+
+
+def _environment():
+    env = dict(os.environ)
+    # installed packages are byte-compiled: measure that, not compilation
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+
+def measure(argv, repeat):
+    """
+    Return the best wall-clock time of running `argv` in a child process.
+    """
+    env = _environment()
+    subprocess.run(argv, env=env, stdout=subprocess.DEVNULL, check=True)  # warm up caches and bytecode
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(argv, env=env, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def slowest_imports(statement, count):
+    """
+    Return `(microseconds, module)` for the `count` modules that take longest to import when running `statement`.
+
+    Times are those spent in each module itself, not in its own imports.
+    """
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        env=_environment(), stderr=subprocess.PIPE, universal_newlines=True, check=True,
+    ).stderr
+    imports = []
+    for line in output.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        fields = line.split('|')
+        own = fields[0].rpartition(':')[2].strip()
+        if len(fields) == 3 and own.isdigit():
+            imports.append((int(own), fields[2].strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--modules', type=int, default=0, metavar='N',
+                        help="list the N slowest imports of `cmkclient.cli`")
+    parser.add_argument('--max-ms', type=float,
+                        help="fail if the fast-path `get_host` call takes longer than this")
+    args = parser.parse_args()
+
+    print("Python {0} on {1}".format(platform.python_version(), platform.platform()))
+    print("{0:<28} {1:>10}".format('benchmark', 'ms'))
+
+    python = [sys.executable]
+    cli = python + ['-m', 'cmkclient']
+    with FakeServer() as server:
+        server.api().add_host('host00')
+        options = ['--url', server.url, '--username', server.username, '--secret', server.secret]
+        results = [
+            ('python', measure(python + ['-c', 'pass'], args.repeat)),
+            ('import cmkclient', measure(python + ['-c', 'import cmkclient'], args.repeat)),
+            ('import cmkclient.cli', measure(python + ['-c', 'import cmkclient.cli'], args.repeat)),
+            ('get_host[fast path]', measure(cli + options + ['get_host', 'host00'], args.repeat)),
+            # a flag makes `main()` hand the call over to Fire
+            ('get_host[fire]', measure(
+                cli + options + ['get_host', 'host00', '--effective_attributes=False'], args.repeat)),
+        ]
+    for name, seconds in results:
+        print("{0:<28} {1:>10.1f}".format(name, seconds * 1000))
+
+    if args.modules:
+        print()
+        print("{0:<28} {1:>10}".format('import of cmkclient.cli', 'ms'))
+        for microseconds, module in slowest_imports('import cmkclient.cli', args.modules):
+            print("{0:<28} {1:>10.1f}".format(module, microseconds / 1000))
+
+    if args.max_ms is not None:
+        fast = dict(results)['get_host[fast path]'] * 1000
+        if fast > args.max_ms:
+            print("TOO SLOW: fast-path call took {0:.1f} ms, more than {1:.1f} ms".format(fast, args.max_ms))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
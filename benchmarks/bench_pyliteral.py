@@ -0,0 +1,85 @@
+"""
+Compare `cmkclient.pyliteral.loads` with `ast.literal_eval`
+on a synthetic `get_ruleset` response.
+
+Run with::
+
+    python benchmarks/bench_pyliteral.py [--folders N] [--rules N] [--repeat N]
+"""
+
+import argparse
+from ast import literal_eval
+import timeit
+import tracemalloc
+
+from cmkclient.pyliteral import loads
+
+
+def make_ruleset_response(folders, rules):
+    """
+    Return the `repr()` of a `get_ruleset` response, shaped like Check_MK's.
+    """
+    ruleset = {}
+    for folder in range(folders):
+        ruleset['folder{0}'.format(folder)] = [
+            {
+                'value': {
+                    'levels': (80.0, 90.0),
+                    'name': u'check_{0}'.format(rule),
+                    'enabled': True,
+                    'opt': None,
+                    'count': rule,
+                },
+                'condition': {
+                    'host_name': ['host{0}'.format(n) for n in range(5)],
+                    'host_tags': {'agent': 'cmk-agent', 'criticality': {'$ne': 'test'}},
+                },
+                'options': {
+                    'description': u'Rule #{0} in folder "{1}"'.format(rule, folder),
+                    'disabled': False,
+                },
+            }
+            for rule in range(rules)
+        ]
+    return repr({
+        'result': {'ruleset': ruleset, 'configuration_hash': '0123456789abcdef'},
+        'result_code': 0,
+    })
+
+
+def measure(parse, text, repeat):
+    """
+    Return best wall-clock time and peak traced memory for `parse(text)`.
+    """
+    best = min(timeit.repeat(lambda: parse(text), number=1, repeat=repeat))
+    tracemalloc.start()
+    try:
+        parse(text)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--folders', type=int, default=50)
+    parser.add_argument('--rules', type=int, default=200, help="rules per folder")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    text = make_ruleset_response(args.folders, args.rules)
+    assert loads(text) == literal_eval(text)
+    print("response size: {0:.1f} MB".format(len(text) / 1e6))
+
+    results = {}
+    for name, parse in [('ast.literal_eval', literal_eval), ('pyliteral.loads', loads)]:
+        results[name] = measure(parse, text, args.repeat)
+        print("{0:<18} {1:8.3f} s {2:10.1f} MB peak".format(name, results[name][0], results[name][1] / 1e6))
+
+    (base_time, base_mem), (new_time, new_mem) = results['ast.literal_eval'], results['pyliteral.loads']
+    print("speedup: {0:.1f}x, memory: {1:.1f}x less".format(base_time / new_time, base_mem / new_mem))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,31 @@
-from ast import literal_eval
 from collections.abc import Mapping, Sequence
 import enum
-import json
+from itertools import islice
 from os.path import join
-import re
-from typing import Any, Dict, List, Optional
-from urllib.request import urlopen
-from urllib.parse import quote, urlencode
+import socket
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional
 
 from cmkclient.exception import (
     AuthenticationError,
+    DeadlineExceeded,
     Error,
     MalformedResponseError,
     ResponseError,
     ResultError,
 )
+from cmkclient.cache import RulesetCache, SQLiteCache, TTLCache
+from cmkclient.deadline import Deadline
+
+if TYPE_CHECKING:
+    from cmkclient.metrics import RequestInfo
+    from cmkclient.ratelimit import SiteLimiter
+
+# `json`, `re`, `urllib.parse`, `concurrent.futures` and the modules
+# `cmkclient.pool` (which needs `http.client` and `ssl`), `jsonstream`,
+# `metrics`, `pyliteral` and `ratelimit` are imported by the methods
+# using them, so that importing the package stays cheap and one-shot
+# command-line calls only pay for what they use
 
 
 __version__ = '1.6.0'
@@ -45,6 +56,22 @@ class ActivateMode(enum.Enum):
     SPECIFIC = 'specific'
 
 
+# sentinel for cache misses
+_MISSING = object()
+
+
+def _batched(iterable, size):
+    """
+    Split `iterable` into lists of at most `size` items.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
 # pylint: disable=too-many-public-methods
 class WebApi:
     """
@@ -54,6 +81,21 @@ class WebApi:
     check_mk_url (str): URL to Check_Mk web application, multiple formats are supported
     username (str): Name of user to connect as. Make sure this is an automation user.
     secret (str): Secret for automation user. This is different from the password!
+    pool (ConnectionPool): pool of keep-alive connections to send requests through;
+        if `None`, a private #ConnectionPool with default settings is created
+    cache (TTLCache): if given, the lists of hosts, folders, groups and users, and the host tags,
+        are kept in this cache, and dropped from it when they are changed through this client;
+        this also makes single-group and single-user lookups cheap.
+        Use a #SQLiteCache to keep them across processes.
+        Note that cached results are shared, so they must not be modified.
+    timeout: connect and read timeouts in seconds, either as a `(connect, read)` pair
+        or a single number for both; if `None`, use #WebApi.default_timeout
+    action_timeouts (dict): timeouts for specific actions, overriding `timeout`;
+        they are merged into #WebApi.default_action_timeouts
+    limiter (SiteLimiter): if given, every request waits for this limiter's permission;
+        share it among the clients of a site, see #shared_limiter
+    ruleset_cache (RulesetCache): if given, rule sets are kept in this cache with their
+        configuration hash, and only parsed again when it changes
 
     # Examples
     ```python
@@ -65,13 +107,40 @@ class WebApi:
     ```python
     WebApi('http://checkmk.company.com/monitor', 'automation', 'secret')
     ```
+    ```python
+    WebApi('http://checkmk.company.com/monitor', 'automation', 'secret',
+           timeout=(5, 60), action_timeouts={'bake_agents': (5, 3600)})
+    ```
+    ```python
+    WebApi('http://checkmk.company.com/monitor', 'automation', 'secret',
+           limiter=shared_limiter('http://checkmk.company.com/monitor', rate=20, concurrency=8))
+    ```
     """
 
     #
     # 0. Class set up and internal tooling
     #
 
-    def __init__(self, check_mk_url, username, secret):
+    #: `(connect, read)` timeouts in seconds used when none are given to the constructor
+    default_timeout = (10.0, 120.0)
+
+    #: timeouts of actions that routinely run longer than #WebApi.default_timeout allows
+    default_action_timeouts = {
+        'activate_changes': (10.0, 1800.0),
+        'bake_agents': (10.0, 1800.0),
+        'discover_services': (10.0, 600.0),
+    }
+
+    def __init__(self,
+                 check_mk_url,
+                 username,
+                 secret,
+                 pool=None,
+                 cache=None,
+                 timeout=None,
+                 action_timeouts=None,
+                 limiter: Optional['SiteLimiter'] = None,
+                 ruleset_cache: Optional[RulesetCache] = None):
         check_mk_url = check_mk_url.rstrip('/')
 
         if check_mk_url.endswith('/webapi.py'):
@@ -84,6 +153,23 @@ class WebApi:
         self.username = username
         self.secret = secret
 
+        if pool is None:
+            from cmkclient.pool import ConnectionPool
+            pool = ConnectionPool()
+        self.pool = pool
+        self.cache = cache
+        self.timeout = (timeout if timeout is not None else self.default_timeout)
+        self.action_timeouts = dict(self.default_action_timeouts, **(action_timeouts or {}))
+        self.limiter = limiter
+        self.ruleset_cache = ruleset_cache
+        self._change_listeners = []  # type: List[Callable[[str, Optional[Dict[str, Any]]], None]]
+        self._request_hooks = []  # type: List[tuple]
+
+    __HEADERS = {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'User-Agent': 'cmkclient/' + __version__,
+    }
+
     @staticmethod
     def __format_params(params):
         """
@@ -115,6 +201,9 @@ class WebApi:
         else:
             data = WebApi.__format_params(data)
 
+        import json
+        from urllib.parse import quote
+
         if request_format == 'json':
             request_string = 'request=' + json.dumps(data)
         elif request_format == 'python':
@@ -125,6 +214,8 @@ class WebApi:
         return request_string.encode()
 
     def __build_request_path(self, **additional_query_params):
+        from urllib.parse import urlencode
+
         query_params = {
             '_username': self.username,
             '_secret': self.secret,
@@ -136,19 +227,11 @@ class WebApi:
 
         return '?'.join([self.web_api_base, query_string])
 
-    def make_request(self, action, query_params=None, data=None):
+    def _prepare_request(self, action, query_params=None, data=None):
         """
-        Make arbitrary request to Check_Mk Web API
+        Return URL, body, headers and expected output format of a Web API request.
 
-        # Arguments
-        action (str): Action request, e.g. add_host
-        query_params (dict): dict of path parameters
-        data (dict): dict that will be sent as request body
-
-        # Raises
-        ResponseError: Raised when the HTTP status code != 200
-        MalformedResponseError: when the body of the CheckMK reply cannot be parsed
-        ResultError: when CheckMK's own result code is != 0
+        This is the transport-independent part of #WebApi.make_request.
         """
         if not query_params:
             query_params = {}
@@ -158,24 +241,40 @@ class WebApi:
         query_params.update({'action': action})
 
         request_format = query_params.get('request_format', 'json')
+        output_format = query_params.get('output_format', 'json')
 
-        response = urlopen(
+        return (
             self.__build_request_path(**query_params),
-            self.__build_request_data(data, request_format)
+            self.__build_request_data(data, request_format),
+            self.__HEADERS,
+            output_format,
         )
 
-        if response.code != 200:
+    @staticmethod
+    def _parse_response(response, body, output_format):
+        """
+        Validate a Web API response and return the contents of its `result` field.
+
+        This is the transport-independent part of #WebApi.make_request.
+
+        # Arguments
+        response: HTTP response object; must have a `status` attribute
+        body (bytes): body of the HTTP response
+        output_format (str): either ``json`` or ``python``
+        """
+        if response.status != 200:
             raise ResponseError(response)
 
-        body = response.read().decode()
+        body = body.decode()
 
         if body.startswith('Authentication error:'):
             raise AuthenticationError(body)
 
-        output_format = query_params.get('output_format', 'json')
         if output_format == 'python':
-            body_dict = literal_eval(body)
+            from cmkclient import pyliteral
+            body_dict = pyliteral.loads(body)
         else:
+            import json
             body_dict = json.loads(body)
 
         try:
@@ -188,6 +287,286 @@ class WebApi:
         except KeyError:
                 raise MalformedResponseError(response)
 
+    def make_request(self, action, query_params=None, data=None, timeout=None, deadline=None):
+        """
+        Make arbitrary request to Check_Mk Web API
+
+        # Arguments
+        action (str): Action request, e.g. add_host
+        query_params (dict): dict of path parameters
+        data (dict): dict that will be sent as request body
+        timeout: connect and read timeouts for this request, see #WebApi;
+            if `None`, use those configured for `action`
+        deadline (Deadline): if given, the timeouts are shortened to the time left
+
+        # Raises
+        ResponseError: Raised when the HTTP status code != 200
+        MalformedResponseError: when the body of the CheckMK reply cannot be parsed
+        ResultError: when CheckMK's own result code is != 0
+        DeadlineExceeded: when `deadline` passed before or while the request was made
+        socket.timeout: when the server takes longer to answer than the read timeout
+        """
+        cache_key = self._cache_key(action, query_params, data)
+        result = self._cached_result(action, data, cache_key)
+        if result is not _MISSING:
+            return result
+
+        url, body, headers, output_format = self._prepare_request(action, query_params, data)
+
+        started = (self.limiter.acquire(action, deadline) if self.limiter is not None else None)
+        info = (self._before_request(action, body) if self._request_hooks else None)
+        error = None
+        try:
+            with self.pool.request(url, body, headers, self._timeout(action, timeout, deadline)) as response:
+                response_body = response.read()
+                if info is not None:
+                    info.status = response.status
+                    info.response_bytes = len(response_body)
+                result = self._parse_result(action, data, response, response_body, output_format)
+        except Exception as err:
+            error = self._timeout_error(err, action, deadline)
+            if info is not None:
+                info.error = error
+            raise error
+        finally:
+            self._invalidate_cache(action, data)
+            if started is not None:
+                self.limiter.release(started, error)
+            if info is not None:
+                self._after_request(info)
+
+        if cache_key is not None:
+            self.cache.set(cache_key, result)
+        if self._change_listeners and self._is_change_action(action):
+            self._notify_change(action, data)
+        return result
+
+    #: read actions whose results can be cached
+    _CACHEABLE_ACTIONS = frozenset([
+        'get_all_hosts',
+        'get_all_folders',
+        'get_hosttags',
+        'get_rulesets_info',
+        'get_all_contactgroups',
+        'get_all_hostgroups',
+        'get_all_servicegroups',
+        'get_all_users',
+    ])
+
+    #: map write actions to the cacheable read actions whose results they change
+    _CACHE_INVALIDATION = {}  # type: Dict[str, frozenset]
+    _CACHE_INVALIDATION.update(dict.fromkeys([
+        'edit_host', 'edit_hosts',
+        'delete_host', 'delete_hosts',
+    ], frozenset(['get_all_hosts'])))
+    # adding hosts creates missing folders
+    _CACHE_INVALIDATION.update(dict.fromkeys([
+        'add_host', 'add_hosts',
+        'add_folder', 'edit_folder', 'delete_folder',
+    ], frozenset(['get_all_hosts', 'get_all_folders'])))
+    _CACHE_INVALIDATION['set_hosttags'] = frozenset(['get_hosttags'])
+    _CACHE_INVALIDATION['set_ruleset'] = frozenset(['get_rulesets_info'])
+    _CACHE_INVALIDATION.update(
+        (action + '_' + kind, frozenset(['get_all_' + kind + 's']))
+        for action in ('add', 'edit', 'delete')
+        for kind in ('contactgroup', 'hostgroup', 'servicegroup'))
+    _CACHE_INVALIDATION.update(dict.fromkeys([
+        'add_users', 'edit_users', 'delete_users',
+    ], frozenset(['get_all_users'])))
+
+    def _timeout(self, action, timeout=None, deadline=None):
+        """
+        Return the `(connect, read)` timeouts of a request, shortened to the time left before `deadline`.
+
+        # Raises
+        DeadlineExceeded: if `deadline` has already passed
+        """
+        if timeout is None:
+            timeout = self.action_timeouts.get(action, self.timeout)
+        if deadline is not None:
+            return deadline.clip(timeout, action)
+        return timeout
+
+    @staticmethod
+    def _timeout_error(err, action, deadline):
+        """
+        Return the exception to raise for `err`: #DeadlineExceeded if it is a timeout caused by `deadline`.
+        """
+        if deadline is not None and isinstance(err, socket.timeout) and deadline.expired():
+            return DeadlineExceeded(action)
+        return err
+
+    def _cache_key(self, action, query_params, data):
+        """
+        Return the key for caching the result of a request, or `None` if it must not be cached.
+        """
+        if self.cache is None or action not in self._CACHEABLE_ACTIONS:
+            return None
+        import json
+        # results depend on the permissions of the user, so a cache shared
+        # by several users (e.g., an #SQLiteCache file) keeps them apart
+        return (
+            self.web_api_base,
+            action,
+            self.username,
+            json.dumps(query_params, sort_keys=True, default=str),
+            json.dumps(data, sort_keys=True, default=str),
+        )
+
+    def _cached_result(self, action, data, cache_key):
+        """
+        Return the cached result of a request, or `_MISSING` if it must be sent.
+        """
+        if cache_key is not None:
+            return self.cache.get(cache_key, _MISSING)
+        if action == 'get_ruleset' and self.ruleset_cache is not None:
+            return self.ruleset_cache.get(self._ruleset_key(data['ruleset_name']), _MISSING)
+        return _MISSING
+
+    def _ruleset_key(self, ruleset_name):
+        """
+        Return the key of rule set `ruleset_name` in the #RulesetCache.
+        """
+        # like #WebApi._cache_key, keep users apart: each sends the hash of its own copy
+        return (self.web_api_base, self.username, ruleset_name)
+
+    # find the hash and the result code in a `get_ruleset` response, in either output format
+    __CONFIGURATION_HASH_REGEX = br"""['"]configuration_hash['"]\s*:\s*u?['"]([0-9A-Za-z]*)['"]"""
+    __RESULT_CODE_REGEX = br"""['"]result_code['"]\s*:\s*(-?\d+)"""
+
+    def _parse_result(self, action, data, response, body, output_format):
+        """
+        Parse a response like #WebApi._parse_response, reusing the cached rule set if its hash is unchanged.
+        """
+        if action != 'get_ruleset' or self.ruleset_cache is None:
+            return self._parse_response(response, body, output_format)
+        key = self._ruleset_key(data['ruleset_name'])
+        if response.status == 200 and not body.startswith(b'Authentication error:'):
+            import re
+            codes = re.findall(self.__RESULT_CODE_REGEX, body)
+            hashes = re.findall(self.__CONFIGURATION_HASH_REGEX, body)
+            # a rule could contain the same text: then parse to be sure
+            if codes == [b'0'] and len(hashes) == 1:
+                result = self.ruleset_cache.revalidate(key, hashes[0].decode())
+                if result is not None:
+                    return result
+        result = self._parse_response(response, body, output_format)
+        self.ruleset_cache.set(key, result)
+        return result
+
+    def _invalidate_cache(self, action, data=None):
+        """
+        Drop cached results that are changed by `action`, sent with `data`.
+        """
+        if action == 'set_ruleset' and self.ruleset_cache is not None:
+            # the rule set changed for all users
+            base, name = self.web_api_base, (data or {}).get('ruleset_name')
+            self.ruleset_cache.invalidate(lambda cached: cached[0] == base and cached[2] == name)
+        if self.cache is None:
+            return
+        stale = self._CACHE_INVALIDATION.get(action)
+        if stale:
+            self.cache.invalidate(lambda key: key[0] == self.web_api_base and key[1] in stale)
+
+    def add_change_listener(self, listener: Callable[[str, Optional[Dict[str, Any]]], None]):
+        """
+        Register a function to be called after each successful request that creates pending changes.
+
+        The `listener` is called with the name of the action and the request
+        data (a dict, or `None`), from whichever thread made the request.
+
+        # Arguments
+        listener (callable): function to call
+        """
+        self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener: Callable[[str, Optional[Dict[str, Any]]], None]):
+        """
+        Unregister a function previously registered with #WebApi.add_change_listener.
+        """
+        self._change_listeners.remove(listener)
+
+    def add_request_hook(self,
+                         before: Optional[Callable[['RequestInfo'], None]] = None,
+                         after: Optional[Callable[['RequestInfo'], None]] = None):
+        """
+        Register functions to be called around each request sent to the server.
+
+        Both functions are called with a #RequestInfo, from whichever
+        thread made the request: `before` right before the request is
+        sent, and `after` once it has completed or failed, with the
+        response size, status, result code, wall time and error filled
+        in.  Results served from the cache are not reported.
+
+        # Arguments
+        before (callable): function to call before each request
+        after (callable): function to call after each request
+
+        # Examples
+        ```python
+        api.add_request_hook(after=lambda info: print(info.action, info.elapsed))
+        ```
+        """
+        self._request_hooks.append((before, after))
+
+    def remove_request_hook(self,
+                            before: Optional[Callable[['RequestInfo'], None]] = None,
+                            after: Optional[Callable[['RequestInfo'], None]] = None):
+        """
+        Unregister functions previously registered with #WebApi.add_request_hook.
+        """
+        self._request_hooks.remove((before, after))
+
+    def _before_request(self, action, body):
+        from cmkclient.metrics import RequestInfo
+        info = RequestInfo(self.web_api_base, action, len(body or b''))
+        for before, _ in list(self._request_hooks):
+            if before is not None:
+                before(info)
+        return info
+
+    def _after_request(self, info):
+        info.elapsed = time.monotonic() - info.started
+        if info.error is None:
+            info.result_code = 0
+        elif isinstance(info.error, ResultError):
+            info.result_code = info.error.result_code
+        for _, after in list(self._request_hooks):
+            if after is not None:
+                after(info)
+
+    @staticmethod
+    def _is_change_action(action):
+        """
+        Return `True` if `action` creates changes that need to be activated.
+        """
+        return action.startswith(('add_', 'edit_', 'delete_', 'set_')) or action == 'discover_services'
+
+    def _notify_change(self, action, data):
+        for listener in list(self._change_listeners):
+            listener(action, data)
+
+    def invalidate_cache(self, *actions: str):
+        """
+        Drop cached results of this client, so that they are fetched again on next use.
+
+        # Arguments
+        actions (str): names of the read actions whose results should be dropped,
+            e.g. ``get_all_users``; if none are given, drop all results
+
+        # Examples
+        ```python
+        api.invalidate_cache('get_all_users')
+        api.get_user('admin')  # fetches the users list again
+        ```
+        """
+        if self.cache is None:
+            return
+        if actions:
+            self.cache.invalidate(lambda key: key[0] == self.web_api_base and key[1] in actions)
+        else:
+            self.cache.invalidate(lambda key: key[0] == self.web_api_base)
+
     #
     # 1. Activating changes
     #
@@ -240,27 +619,48 @@ class WebApi:
         data = {
             'hostname': hostname,
             'folder': folder,
-            'attributes': {
-                'ipaddress': ipaddress,
-                'alias': alias,
-            },
+            'attributes': self._host_attributes(ipaddress=ipaddress, alias=alias, tags=tags, **custom_attrs),
         } # type: Dict[str, Any]
 
-        attributes = data['attributes'] # type: Dict[str, Optional[str]]
-        attributes.update(custom_attrs)
-        if tags:
-            for tag, value in tags.items():
-                prefix = 'tag_'
-                if tag.startswith(prefix):
-                    attributes[tag] = value
-                else:
-                    attributes[prefix + tag] = value
-
         return self.make_request('add_host', data=data)
 
+    def add_hosts(self,
+                  hosts: Iterable[Any],
+                  batch_size: Optional[int] = None,
+                  deadline: Optional[Deadline] = None):
+        """
+        Adds many nonexistent hosts to the Check_MK inventory, using as few requests as possible.
+
+        Hosts are sent in batches of `batch_size` each; a failure to add
+        one host does not prevent the others from being added.
+
+        Only available in Check_MK starting version 1.5.0.
+
+        # Arguments
+        hosts (list): each item is either a host name, or a dict
+            with the arguments that #WebApi.add_host would take
+        batch_size (int): maximum number of hosts per request; defaults to #WebApi.batch_size
+        deadline (Deadline): if given, stop sending batches once it has passed
+
+        # Returns
+        dict with keys ``succeeded_hosts`` (list of host names)
+        and ``failed_hosts`` (dict mapping host names to error messages)
+
+        # Raises
+        DeadlineExceeded: when `deadline` passes; its `outcome` holds the result
+            for the batches completed so far
+
+        # Examples
+        ```python
+        api.add_hosts(['host00', {'hostname': 'host01', 'folder': 'web', 'tags': {'agent': 'cmk-agent'}}])
+        ```
+        """
+        return self._bulk_host_request('add_hosts', map(self._add_host_request, hosts), batch_size, deadline)
+
     def edit_host(self,
                   hostname: str,
                   unset_attributes: Optional[List[str]] = None,
+                  tags: Optional[Dict[str, str]] = None,
                   **custom_attrs):
         """
         Edits the properties of an existing host
@@ -268,14 +668,130 @@ class WebApi:
         # Arguments
         hostname (str): Name of host to edit
         unset_attributes (list): List of attributes to unset
+        tags (dict): Dictionary of tags to set, prefix tag_ can be omitted
         custom_attrs (dict): dict that will get merged with generated attributes, mainly for compatibility reasons
         """
         return self.make_request('edit_host', data={
             'hostname': hostname,
             'unset_attributes': unset_attributes,
-            'attributes': custom_attrs
+            'attributes': self._host_attributes(tags=tags, **custom_attrs),
         })
 
+    def edit_hosts(self,
+                   hosts: Iterable[Mapping],
+                   batch_size: Optional[int] = None,
+                   deadline: Optional[Deadline] = None):
+        """
+        Edits the properties of many existing hosts, using as few requests as possible.
+
+        Hosts are sent in batches of `batch_size` each; a failure to edit
+        one host does not prevent the others from being changed.
+
+        Only available in Check_MK starting version 1.5.0.
+
+        # Arguments
+        hosts (list): each item is a dict with the arguments that #WebApi.edit_host would take
+        batch_size (int): maximum number of hosts per request; defaults to #WebApi.batch_size
+        deadline (Deadline): if given, stop sending batches once it has passed
+
+        # Returns
+        dict with keys ``succeeded_hosts`` (list of host names)
+        and ``failed_hosts`` (dict mapping host names to error messages)
+
+        # Raises
+        DeadlineExceeded: when `deadline` passes; its `outcome` holds the result
+            for the batches completed so far
+
+        # Examples
+        ```python
+        api.edit_hosts([{'hostname': 'host00', 'ipaddress': '192.168.0.100', 'unset_attributes': ['alias']}])
+        ```
+        """
+        return self._bulk_host_request('edit_hosts', map(self._edit_host_request, hosts), batch_size, deadline)
+
+    #: default number of hosts sent in a single request by bulk methods
+    batch_size = 500
+
+    @staticmethod
+    def _host_attributes(tags=None, **attributes):
+        """
+        Return the `attributes` dict for a host request, converting `tags` into ``tag_*`` attributes.
+        """
+        if tags:
+            for tag, value in tags.items():
+                prefix = 'tag_'
+                if tag.startswith(prefix):
+                    attributes[tag] = value
+                else:
+                    attributes[prefix + tag] = value
+        return attributes
+
+    @classmethod
+    def _add_host_request(cls, host):
+        """
+        Return the request for one host in an `add_hosts` call.
+        """
+        if isinstance(host, str):
+            host = {'hostname': host}
+        spec = dict(host)
+        hostname = spec.pop('hostname')
+        folder = spec.pop('folder', '/')
+        return cls.__format_params({
+            'hostname': hostname,
+            'folder': folder,
+            'attributes': cls._host_attributes(**spec),
+        })
+
+    @classmethod
+    def _edit_host_request(cls, host):
+        """
+        Return the request for one host in an `edit_hosts` call.
+        """
+        spec = dict(host)
+        hostname = spec.pop('hostname')
+        unset_attributes = spec.pop('unset_attributes', None)
+        return cls.__format_params({
+            'hostname': hostname,
+            'unset_attributes': unset_attributes,
+            'attributes': cls._host_attributes(**spec),
+        })
+
+    def _bulk_host_request(self, action, requests, batch_size=None, deadline=None):
+        """
+        Send host `requests` in batches through `action` and merge the outcomes.
+        """
+        outcome = {'succeeded_hosts': [], 'failed_hosts': {}}  # type: Dict[str, Any]
+        for batch in _batched(requests, batch_size or self.batch_size):
+            try:
+                result = self.make_request(action, data={'hosts': batch}, deadline=deadline)
+            except DeadlineExceeded as err:
+                # hosts of the interrupted batch may or may not have been changed
+                err.outcome = outcome
+                raise
+            except Error as err:
+                result = err
+            self._merge_bulk_result(outcome, batch, result)
+        return outcome
+
+    @staticmethod
+    def _merge_bulk_result(outcome, batch, result):
+        """
+        Add the result of a bulk host request to `outcome`.
+
+        If `result` is an exception, then the whole request failed
+        and all hosts in `batch` are recorded as failed.
+        """
+        if isinstance(result, Exception):
+            message = (result.result_body if isinstance(result, ResultError) else str(result))
+            for request in batch:
+                outcome['failed_hosts'][request['hostname']] = message
+        elif isinstance(result, Mapping):
+            outcome['succeeded_hosts'].extend(result.get('succeeded_hosts') or [])
+            outcome['failed_hosts'].update(result.get('failed_hosts') or {})
+        else:
+            # no per-host report: the request as a whole succeeded
+            outcome['succeeded_hosts'].extend(request['hostname'] for request in batch)
+
     def delete_host(self, hostname: str):
         """
         Deletes a host from the Check_MK inventory
@@ -287,29 +803,134 @@ class WebApi:
             'hostname': hostname
         })
 
-    def delete_hosts(self, hostnames: List[str]):
+    def delete_hosts(self,
+                     hostnames: Iterable[str],
+                     batch_size: Optional[int] = None,
+                     deadline: Optional[Deadline] = None):
         """
         Deletes hosts from the Check_MK inventory.
 
-        Only available in Check_MK starting version 1.5.0.
+        Host names are sent in batches of `batch_size` each.  Check_MK
+        servers older than 1.5.0 lack the `delete_hosts` action; in that
+        case, hosts are deleted one by one with #WebApi.delete_host.
 
         # Arguments
-        hostnames (list): Name of host to delete
+        hostnames (list): Names of hosts to delete
+        batch_size (int): maximum number of hosts per request; defaults to #WebApi.batch_size
+        deadline (Deadline): if given, stop sending requests once it has passed
+
+        # Returns
+        the result of the last request sent to the server, as returned by the Check_MK API
+
+        # Raises
+        DeadlineExceeded: when `deadline` passes; its `outcome` is the list
+            of hosts deleted so far
         """
-        return self.make_request('delete_host', data={
-            'hostnames': hostnames
-        })
+        deleted = []  # type: List[str]
+        result = None
+        try:
+            for batch in _batched(hostnames, batch_size or self.batch_size):
+                if self._bulk_delete_supported:
+                    try:
+                        result = self.make_request('delete_hosts', data={'hostnames': batch}, deadline=deadline)
+                        deleted.extend(batch)
+                        continue
+                    except ResultError as err:
+                        if not self._is_unknown_action(err):
+                            raise
+                        self._bulk_delete_supported = False
+                for hostname in batch:
+                    if deadline is not None:
+                        deadline.check('delete_host')
+                    result = self.delete_host(hostname)
+                    deleted.append(hostname)
+        except DeadlineExceeded as err:
+            err.outcome = deleted
+            raise
+        return result
+
+    #: whether the server is known to support the `delete_hosts` action
+    _bulk_delete_supported = True
 
-    def delete_all_hosts(self):
+    @staticmethod
+    def _is_unknown_action(err):
+        """
+        Return `True` if `err` signals that the server does not implement the requested action.
+        """
+        # Check_MK wraps it as "Check_MK exception: Unknown API action ..."
+        return isinstance(err.result_body, str) and 'Unknown API action' in err.result_body
+
+    def delete_all_hosts(self, batch_size: Optional[int] = None, deadline: Optional[Deadline] = None):
         """
         Deletes all hosts from the Check_MK inventory.
 
         This is an extension not present in the Check_MK API.
+
+        # Arguments
+        batch_size (int): maximum number of hosts per request; defaults to #WebApi.batch_size
+        deadline (Deadline): if given, stop deleting hosts once it has passed; see #WebApi.delete_hosts
+
+        # Returns
+        list of names of deleted hosts
+        """
+        hostnames = list(self.get_all_hosts())
+        self.delete_hosts(hostnames, batch_size, deadline)
+        return hostnames
+
+    def delete_hosts_by_folder(self,
+                               folder: str,
+                               batch_size: Optional[int] = None,
+                               deadline: Optional[Deadline] = None):
+        """
+        Deletes all hosts in a folder (but not in its subfolders).
+
+        This is an extension not present in the Check_MK API.
+
+        # Arguments
+        folder (str): folder to delete hosts from
+        batch_size (int): maximum number of hosts per request; defaults to #WebApi.batch_size
+        deadline (Deadline): if given, stop deleting hosts once it has passed; see #WebApi.delete_hosts
+
+        # Returns
+        list of names of deleted hosts
+        """
+        hostnames = list(self.get_hosts_by_folder(folder))
+        self.delete_hosts(hostnames, batch_size, deadline)
+        return hostnames
+
+    def delete_hosts_matching(self,
+                              predicate: Callable[[str, Dict[str, Any]], bool],
+                              effective_attributes: bool = False,
+                              batch_size: Optional[int] = None,
+                              deadline: Optional[Deadline] = None):
         """
-        all_hosts = self.get_all_hosts()
+        Deletes all hosts for which `predicate` returns `True`.
+
+        This is an extension not present in the Check_MK API.
 
-        for hostname in all_hosts:
-            self.delete_host(hostname)
+        # Arguments
+        predicate (callable): called with the host name and the host data
+            (as returned by #WebApi.get_host) for each host
+        effective_attributes (bool): If True the host data passed to `predicate`
+            includes attributes with default values
+        batch_size (int): maximum number of hosts per request; defaults to #WebApi.batch_size
+        deadline (Deadline): if given, stop deleting hosts once it has passed; see #WebApi.delete_hosts
+
+        # Returns
+        list of names of deleted hosts
+
+        # Examples
+        ```python
+        api.delete_hosts_matching(lambda name, host: name.endswith('.staging.example.org'))
+        ```
+        """
+        hostnames = [
+            hostname
+            for hostname, host in self.get_all_hosts(effective_attributes).items()
+            if predicate(hostname, host)
+        ]
+        self.delete_hosts(hostnames, batch_size, deadline)
+        return hostnames
 
     def get_host(self,
                  hostname: str,
@@ -338,6 +959,98 @@ class WebApi:
             'get_all_hosts',
             query_params={'effective_attributes': effective_attributes})
 
+    #: number of bytes read at a time from streamed responses
+    stream_chunk_size = 64 * 1024
+
+    def iter_all_hosts(self,
+                       effective_attributes: bool = False,
+                       deadline: Optional[Deadline] = None):
+        """
+        Iterates over all hosts, decoding them while the response is received.
+
+        Unlike #WebApi.get_all_hosts, the whole response is never held
+        in memory, which matters for sites with many thousands of hosts.
+        A cached #WebApi.get_all_hosts result is used if available.
+
+        The request, and its slot of #WebApi.limiter, last until the
+        iterator is exhausted or closed: the response is read as hosts
+        are asked for, so a consumer that takes long over each host
+        holds the slot, and the connection, for that long.  Use
+        #WebApi.get_all_hosts to release them as soon as possible.
+
+        This is an extension not present in the Check_MK API.
+
+        # Arguments
+        effective_attributes (bool): If True attributes with default values will be returned
+        deadline (Deadline): if given, give up reading the response once it has passed
+
+        # Returns
+        iterator over `(hostname, host)` tuples
+
+        # Raises
+        ResponseError: Raised when the HTTP status code != 200
+        MalformedResponseError: when the body of the CheckMK reply cannot be parsed
+        ResultError: when CheckMK's own result code is != 0
+        DeadlineExceeded: when `deadline` passed before or while the response was read
+
+        # Examples
+        ```python
+        for hostname, host in api.iter_all_hosts():
+            print(hostname, host['path'])
+        ```
+        """
+        query_params = {'effective_attributes': effective_attributes}
+        cache_key = self._cache_key('get_all_hosts', query_params, None)
+        if cache_key is not None:
+            result = self.cache.get(cache_key, _MISSING)
+            if result is not _MISSING:
+                yield from result.items()
+                return
+
+        url, body, headers, _ = self._prepare_request('get_all_hosts', query_params)
+
+        started = (self.limiter.acquire('get_all_hosts', deadline) if self.limiter is not None else None)
+        info = (self._before_request('get_all_hosts', body) if self._request_hooks else None)
+        error = None
+        try:
+            timeout = self._timeout('get_all_hosts', None, deadline)
+            with self.pool.request(url, body, headers, timeout) as response:
+                if info is not None:
+                    info.status = response.status
+                    info.response_bytes = 0
+                if response.status != 200:
+                    raise ResponseError(response)
+
+                first = response.read(self.stream_chunk_size)
+                if first.startswith(b'Authentication error:'):
+                    raise AuthenticationError((first + response.read()).decode())
+
+                def chunks():
+                    chunk = first
+                    while chunk:
+                        if info is not None:
+                            info.response_bytes += len(chunk)
+                        yield chunk
+                        if deadline is not None:
+                            deadline.check('get_all_hosts')
+                        chunk = response.read(self.stream_chunk_size)
+
+                from cmkclient import jsonstream
+                try:
+                    yield from jsonstream.iter_result_items(chunks())
+                except ValueError:
+                    raise MalformedResponseError(response)
+        except Exception as err:
+            error = self._timeout_error(err, 'get_all_hosts', deadline)
+            if info is not None:
+                info.error = error
+            raise error
+        finally:
+            if started is not None:
+                self.limiter.release(started, error)
+            if info is not None:
+                self._after_request(info)
+
     def get_hosts_by_folder(self,
                             folder: str,
                             effective_attributes: bool = False):
@@ -358,50 +1071,155 @@ class WebApi:
 
         return hosts
 
+    # compiled on first use (and then cached) by `re.match`
     __DISCOVERY_REGEX = {
-        'added': [re.compile(r'.*Added (\d+),.*')],
-        'removed': [re.compile(r'.*[Rr]emoved (\d+),.*')],
-        'kept': [re.compile(r'.*[Kk]ept (\d+),.*')],
-        'new_count': [re.compile(r'.*New Count (\d+)$'), re.compile(r'.*(\d+) new.*')]  # output changed in 1.6 so we have to try multiple patterns
+        'added': [r'.*Added (\d+),.*'],
+        'removed': [r'.*[Rr]emoved (\d+),.*'],
+        'kept': [r'.*[Kk]ept (\d+),.*'],
+        'new_count': [r'.*New Count (\d+)$', r'.*(\d+) new.*']  # output changed in 1.6 so we have to try multiple patterns
     }
 
     def discover_services(self,
                           hostname: str,
-                          mode: DiscoverMode = DiscoverMode.NEW):
+                          mode: DiscoverMode = DiscoverMode.NEW,
+                          deadline: Optional[Deadline] = None):
         """
         Discovers the services of a specific host
 
         # Arguments
         hostname (str): Name of host to discover services for
         mode (DiscoverMode): see #WebApi.DiscoverMode
+        deadline (Deadline): if given, give up when it passes
         """
         result = self.make_request(
             'discover_services',
             data={'hostname': hostname},
-            query_params={'mode': mode.value}
+            query_params={'mode': mode.value},
+            deadline=deadline,
         )
 
+        return self._parse_discovery_result(result)
+
+    @classmethod
+    def _parse_discovery_result(cls, result):
+        """
+        Extract service counters from the text returned by the `discover_services` action.
+        """
+        import re
         counters = {}
-        for k, patterns in self.__DISCOVERY_REGEX.items():
+        for k, patterns in cls.__DISCOVERY_REGEX.items():
             for pattern in patterns:
-                match = pattern.match(result)
+                match = re.match(pattern, result)
                 if match:
                     counters[k] = match.group(1)
 
         return counters
 
+    def iter_discover_services(self,
+                               hostnames: Optional[Iterable[str]] = None,
+                               mode: DiscoverMode = DiscoverMode.NEW,
+                               workers: int = 4,
+                               rate: Optional[float] = None,
+                               deadline: Optional[Deadline] = None):
+        """
+        Discovers the services of many hosts concurrently, yielding results as each discovery completes.
+
+        This is an extension not present in the Check_MK API.
+
+        Results are yielded in completion order, so a slow host does not hold
+        back the others.  Errors do not stop the run: they are yielded in
+        place of the result.  Closing the generator early cancels the
+        discoveries that have not started yet.
+
+        # Arguments
+        hostnames (list): names of hosts to discover services for; if `None`, all hosts
+        mode (DiscoverMode): see #WebApi.DiscoverMode
+        workers (int): maximum number of discoveries running at the same time
+        rate (float): maximum number of discoveries started per second; `None` means no limit
+        deadline (Deadline): if given, stop starting discoveries once it has passed;
+            those already submitted yield #DeadlineExceeded if they run out of time
+
+        # Yields
+        `(hostname, result)` pairs, where `result` is either the dict returned
+        by #WebApi.discover_services or the exception it raised
+
+        # Raises
+        DeadlineExceeded: after the last result, if `deadline` passed before all hosts were submitted
+        """
+        if hostnames is None:
+            hostnames = self.get_all_hosts()
+        from cmkclient.ratelimit import TokenBucket
+        throttle = (TokenBucket(rate) if rate else None)
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        def discover(hostname):
+            if throttle is not None:
+                throttle.acquire()
+            return self.discover_services(hostname, mode, deadline)
+
+        pending = {}
+        hostnames = iter(hostnames)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                while True:
+                    # keep a bounded window of submitted tasks, so that
+                    # closing the generator does not leave thousands behind
+                    if deadline is None or not deadline.expired():
+                        for hostname in hostnames:
+                            pending[executor.submit(discover, hostname)] = hostname
+                            if len(pending) >= 2 * workers:
+                                break
+                    if not pending:
+                        break
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        hostname = pending.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as err:  # pylint: disable=broad-except
+                            result = err
+                        yield hostname, result
+            finally:
+                for future in pending:
+                    future.cancel()
+        if deadline is not None and next(hostnames, _MISSING) is not _MISSING:
+            raise DeadlineExceeded('discover_services')
+
     def discover_services_for_all_hosts(self,
-                                        mode: DiscoverMode = DiscoverMode.NEW):
+                                        mode: DiscoverMode = DiscoverMode.NEW,
+                                        workers: int = 1,
+                                        rate: Optional[float] = None,
+                                        deadline: Optional[Deadline] = None):
         """
         Discovers the services of all hosts.
 
         This is an extension not present in the Check_MK API.
 
+        Stops at the first error and re-raises it; use
+        #WebApi.iter_discover_services to collect errors as well.
+
         # Arguments
         mode (DiscoverMode): see #WebApi.DiscoverMode
+        workers (int): maximum number of discoveries running at the same time
+        rate (float): maximum number of discoveries started per second; `None` means no limit
+        deadline (Deadline): if given, stop once it has passed
+
+        # Returns
+        dict mapping each host name to the result of #WebApi.discover_services
+
+        # Raises
+        DeadlineExceeded: when `deadline` passes; its `outcome` holds the results collected so far
         """
-        for host in self.get_all_hosts():
-            self.discover_services(host, mode)
+        results = {}
+        try:
+            for host, result in self.iter_discover_services(None, mode, workers, rate, deadline):
+                if isinstance(result, Exception):
+                    raise result
+                results[host] = result
+        except DeadlineExceeded as err:
+            err.outcome = results
+            raise
+        return results
 
     #
     # 3. Directory commands
@@ -593,6 +1411,12 @@ class WebApi:
             self.delete_hostgroup(groupname)
 
     def get_servicegroup(self, groupname: str):
+        """
+        Gets one service group
+
+        # Arguments
+        group (str): name of service group to get
+        """
         return self.get_all_servicegroups()[groupname]
 
     def get_all_servicegroups(self):
@@ -758,6 +1582,9 @@ class WebApi:
         """
         Gets one rule set
 
+        With a #RulesetCache, the result may come from the cache, and
+        then is shared, so it must not be modified.
+
         # Arguments
         ruleset (str): name of rule set to get
         """
@@ -774,18 +1601,30 @@ class WebApi:
 
     def set_ruleset(self,
                     ruleset_name: str,
-                    ruleset: Dict[str, str]):
+                    ruleset: Dict[str, str],
+                    configuration_hash: Optional[str] = None,
+                    use_cached_hash: bool = False):
         """
         Edits one rule set
 
         # Arguments
         ruleset_name (str): ID of rule set to edit
         ruleset (dict): config that will be set, have a look at return value of #WebApi.get_ruleset
+        configuration_hash (str): hash of the rule set the change is based on, as returned
+            by #WebApi.get_ruleset; Check_MK refuses the change if the rule set has changed
+            since.  If `None`, the change is made whatever the current rule set.
+        use_cached_hash (bool): if True and no `configuration_hash` is given, send the hash
+            of the copy in the #RulesetCache, if any, so that the change is refused if the
+            rule set has changed since it was cached
         """
         data = {
             'ruleset_name': ruleset_name,
             'ruleset': ruleset or {}
         }
+        if configuration_hash is None and use_cached_hash and self.ruleset_cache is not None:
+            configuration_hash = self.ruleset_cache.configuration_hash(self._ruleset_key(ruleset_name))
+        if configuration_hash is not None:
+            data['configuration_hash'] = configuration_hash
 
         return self.make_request('set_ruleset', data=data, query_params={'request_format': 'python'})
 
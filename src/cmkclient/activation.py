@@ -0,0 +1,245 @@
+"""
+Coalesce change activations on a Check_MK site.
+
+This is an extension not present in the Check_MK API.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Set
+
+from cmkclient import ActivateMode, ResultError
+
+
+class ActivationScheduler:
+    """
+    Activate pending changes once writes have settled, instead of after every write.
+
+    The scheduler listens for writes made through `api` (and any other
+    client passed to #ActivationScheduler.watch) and runs a single
+    #WebApi.activate_changes once no new change has been made for
+    `quiet_period` seconds, or at the latest `max_delay` seconds after the
+    first pending change.
+
+    When all pending changes are known to affect specific sites only
+    (e.g., hosts added with an explicit ``site`` attribute), only those
+    sites are activated, using #ActivateMode.SPECIFIC; otherwise all sites
+    with changes are (#ActivateMode.DIRTY).
+
+    Activation runs in a background thread; errors are recorded in
+    `last_error` and passed to `on_error`, if given.  The changes of a
+    failed activation stay pending, and are activated with the next
+    batch, after `quiet_period` at the latest.
+
+    # Arguments
+    api (WebApi): client used to activate changes; must not be an #AsyncWebApi
+    quiet_period (float): seconds without changes after which activation starts
+    max_delay (float): maximum seconds activation may be delayed after the first pending change
+    allow_foreign_changes (bool): If True changes of other users will be applied as well
+    on_error (callable): function called with the exception when an activation fails
+
+    # Examples
+    ```python
+    with ActivationScheduler(api, quiet_period=10) as scheduler:
+        api.add_host('host00')
+        api.add_host('host01')
+    # changes are activated once, at the latest when the `with` block exits
+    ```
+    """
+
+    def __init__(self,
+                 api,
+                 quiet_period: float = 5.0,
+                 max_delay: float = 60.0,
+                 allow_foreign_changes: bool = False,
+                 on_error=None):
+        self.api = api
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+        self.allow_foreign_changes = allow_foreign_changes
+        self.on_error = on_error
+
+        #: number of change signals received
+        self.changes = 0
+        #: number of `activate_changes` calls made
+        self.activations = 0
+        #: exception raised by the last failed activation, if any
+        self.last_error = None  # type: Optional[Exception]
+
+        self._cond = threading.Condition()
+        # held while an activation runs, so that there is never more than one
+        self._activation_lock = threading.Lock()
+        self._first_change = None  # type: Optional[float]
+        self._last_change = None  # type: Optional[float]
+        self._sites = set()  # type: Set[str]
+        self._all_sites = False
+        self._closed = False
+        self._watched = []
+
+        self.watch(api)
+        self._thread = threading.Thread(target=self._run, name='cmkclient-activation', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def watch(self, api):
+        """
+        Also collect changes made through `api`.
+        """
+        api.add_change_listener(self._on_change)
+        self._watched.append(api)
+
+    @property
+    def pending(self):
+        """
+        `True` if there are changes waiting to be activated.
+        """
+        with self._cond:
+            return self._first_change is not None
+
+    def notify(self, sites: Optional[Iterable[str]] = None):
+        """
+        Signal that there are changes to activate.
+
+        Writes made through watched clients call this automatically;
+        call it explicitly for changes made by other means.
+
+        # Arguments
+        sites (list): sites affected by the change; `None` means unknown
+        """
+        now = time.monotonic()
+        with self._cond:
+            self.changes += 1
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+            if sites is None:
+                self._all_sites = True
+            else:
+                self._sites.update(sites)
+            self._cond.notify()
+
+    def flush(self):
+        """
+        Activate pending changes right away (in the calling thread).
+
+        If the background thread is activating changes, wait for it to finish first.
+        """
+        with self._activation_lock:
+            with self._cond:
+                batch = self._take()
+            if batch is not None:
+                self._activate(*batch)
+
+    def close(self):
+        """
+        Stop watching clients, activate any pending changes and stop the background thread.
+        """
+        for api in self._watched:
+            api.remove_change_listener(self._on_change)
+        self._watched = []
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+
+    #
+    # internal tooling
+    #
+
+    def _on_change(self, action: str, data: Optional[Dict[str, Any]]):
+        self.notify(self._affected_sites(action, data))
+
+    @staticmethod
+    def _affected_sites(action, data):
+        """
+        Return the set of sites affected by a request, or `None` if not known.
+
+        Only new hosts with an explicit ``site`` attribute have a known
+        site: editing or deleting a host may affect the site it was on.
+        """
+        if action == 'add_host':
+            hosts = [data]
+        elif action == 'add_hosts':
+            hosts = data['hosts']
+        else:
+            return None
+        sites = set()
+        for host in hosts:
+            site = (host.get('attributes') or {}).get('site')
+            if not site:
+                return None
+            sites.add(site)
+        return sites
+
+    def _take(self):
+        """
+        Return the sites to activate and reset the pending state; must hold `self._cond`.
+        """
+        if self._first_change is None:
+            return None
+        batch = (None if self._all_sites else sorted(self._sites),)
+        self._first_change = self._last_change = None
+        self._sites = set()
+        self._all_sites = False
+        return batch
+
+    def _restore(self, sites):
+        """
+        Put the sites of a failed activation back among the pending changes, to be retried.
+        """
+        now = time.monotonic()
+        with self._cond:
+            if self._first_change is None:
+                self._first_change = self._last_change = now
+            if sites is None:
+                self._all_sites = True
+            else:
+                self._sites.update(sites)
+            self._cond.notify()
+
+    @staticmethod
+    def _nothing_to_activate(err):
+        """
+        Return `True` if `err` means there were no changes left, e.g., because another activation included them.
+        """
+        return isinstance(err, ResultError) and 'no changes to activate' in str(err.result_body)
+
+    def _activate(self, sites):
+        try:
+            if sites is None:
+                self.api.activate_changes(
+                    ActivateMode.DIRTY, allow_foreign_changes=self.allow_foreign_changes)
+            else:
+                self.api.activate_changes(
+                    ActivateMode.SPECIFIC, sites, allow_foreign_changes=self.allow_foreign_changes)
+            self.last_error = None
+        except Exception as err:  # pylint: disable=broad-except
+            self.last_error = err
+            if not self._nothing_to_activate(err):
+                self._restore(sites)
+            if self.on_error is not None:
+                self.on_error(err)
+        finally:
+            self.activations += 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    if self._first_change is None:
+                        self._cond.wait()
+                        continue
+                    deadline = min(self._last_change + self.quiet_period, self._first_change + self.max_delay)
+                    delay = deadline - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+            self.flush()
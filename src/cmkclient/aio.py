@@ -0,0 +1,939 @@
+"""
+Asynchronous (`asyncio`) variant of the Check_MK Web API client.
+"""
+
+import asyncio
+from collections import deque
+import functools
+import socket
+import ssl
+import time
+from typing import Any, Callable, Deque, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+from cmkclient import DiscoverMode, Error, ResultError, WebApi, _batched, _MISSING
+from cmkclient.deadline import Deadline, split_timeout
+from cmkclient.exception import DeadlineExceeded
+from cmkclient.pool import ACCEPT_ENCODING, decode_body, environment_proxies, proxy_headers, select_proxy
+
+
+async def _wait_for(awaitable, timeout):
+    """
+    Await `awaitable` for at most `timeout` seconds, raising `socket.timeout` like blocking sockets do.
+    """
+    if timeout is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise socket.timeout('timed out')
+
+
+async def _map_bounded(function, items, limit):
+    """
+    Await `function(item)` for all `items`, at most `limit` at a time, and return the results in order.
+
+    Unlike `asyncio.gather()` on all of them, this does not create a
+    coroutine per item up front.  As with `asyncio.gather()`, the first
+    exception is raised, while the other calls keep running.
+    """
+    items = list(items)
+    results = [None] * len(items)  # type: list
+    indices = iter(range(len(items)))
+
+    async def work():
+        for index in indices:
+            results[index] = await function(items[index])
+
+    await asyncio.gather(*[work() for _ in range(min(limit, len(items)))])
+    return results
+
+
+class AsyncResponse:
+    """
+    HTTP response received by #AsyncConnectionPool.
+
+    The body is read in full before the response is handed out, so
+    #AsyncResponse.read is a plain (non-coroutine) method.
+
+    # Attributes
+    status (int): HTTP status code
+    reason (str): HTTP reason phrase
+    headers (dict): response headers, with lowercased names
+    """
+
+    def __init__(self, status: int, reason: str, headers: Dict[str, str], body: bytes):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self._body = body
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def read(self):
+        return self._body
+
+
+class AsyncConnectionPool:
+    """
+    Pool of keep-alive HTTP(S) connections for use within an `asyncio` event loop.
+
+    # Arguments
+    maxsize (int): maximum number of idle connections kept open (across all hosts)
+    max_per_host (int): maximum number of concurrent requests towards a single host
+    idle_timeout (float): number of seconds after which an idle connection is closed instead of being reused
+    ssl_context (ssl.SSLContext): context used for HTTPS connections; if `None`, use Python's defaults
+    compress (bool): if True, ask for gzip- or deflate-compressed responses and decompress them transparently
+    proxies (dict): proxies to go through, as for #ConnectionPool; if `None`, taken from the environment
+    """
+
+    def __init__(self,
+                 maxsize: int = 10,
+                 max_per_host: int = 10,
+                 idle_timeout: float = 30.0,
+                 ssl_context=None,
+                 compress: bool = True,
+                 proxies: Optional[Dict[str, str]] = None):
+        self.maxsize = maxsize
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.ssl_context = ssl_context
+        self.compress = compress
+        self.proxies = (proxies if proxies is not None else environment_proxies())
+
+        #: number of requests served over an already-open connection
+        self.hits = 0
+        #: number of requests that required opening a new connection
+        self.misses = 0
+        #: number of reused connections found closed by the server
+        self.stale = 0
+        #: number of response body bytes received, as sent by the server
+        self.wire_bytes = 0
+        #: number of response body bytes after decompression
+        self.decoded_bytes = 0
+
+        # key -> idle connections, as `(time last used, reader, writer)`
+        self._idle = {}  # type: Dict[Tuple[str, str, int], Deque[Tuple[float, Any, Any]]]
+        self._idle_count = 0
+        self._slots = {}  # type: Dict[Tuple[str, str, int], asyncio.Semaphore]
+        self._loop = None
+
+    def stats(self):
+        """
+        Return a dictionary with the pool counters.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'idle': self._idle_count,
+            'wire_bytes': self.wire_bytes,
+            'decoded_bytes': self.decoded_bytes,
+        }
+
+    async def request(self,
+                      url: str,
+                      data: Optional[bytes] = None,
+                      headers: Optional[Dict[str, str]] = None,
+                      timeout=None):
+        """
+        Send a request and return the #AsyncResponse.
+
+        The request is a POST if `data` is given, and a GET otherwise.
+
+        # Arguments
+        url (str): absolute URL to request
+        data (bytes): request body
+        headers (dict): additional HTTP headers
+        timeout: connect and read timeouts, as accepted by #split_timeout;
+            unlike with #ConnectionPool, the read timeout limits the time
+            taken to send the request and receive the whole response
+
+        # Raises
+        socket.timeout: if connecting or receiving the response takes longer than allowed
+        """
+        connect_timeout, read_timeout = split_timeout(timeout)
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        proxy = select_proxy(self.proxies, parts.scheme, parts.hostname)
+        if proxy is not None and parts.scheme == 'http':
+            # plain HTTP goes through the proxy, which needs the whole URL
+            path = '{0}://{1}{2}'.format(parts.scheme, parts.netloc, path)
+            headers = dict(headers or {}, **proxy_headers(proxy))
+        head = self.__format_head(key, path, data, headers, (ACCEPT_ENCODING if self.compress else 'identity'))
+
+        loop = asyncio.get_event_loop()
+        if loop is not self._loop:
+            # connections and semaphores are bound to the loop that created them
+            self._idle = {}
+            self._idle_count = 0
+            self._slots = {}
+            self._loop = loop
+
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = asyncio.Semaphore(self.max_per_host)
+        async with slot:
+            conn, reused = await self.__checkout(key, connect_timeout)
+            try:
+                conn, response, keep_alive = await _wait_for(
+                    self.__exchange(key, conn, reused, head, data, connect_timeout), read_timeout)
+            except BaseException:
+                self.__close(conn)
+                raise
+
+            if keep_alive:
+                self.__checkin(key, conn)
+            else:
+                self.__close(conn)
+
+        wire_body = response.read()
+        body = decode_body(wire_body, response.headers)
+        self.wire_bytes += len(wire_body)
+        self.decoded_bytes += len(body)
+        if body is wire_body:
+            return response
+        return AsyncResponse(response.status, response.reason, response.headers, body)
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        idle, self._idle = self._idle, {}
+        self._idle_count = 0
+        for conns in idle.values():
+            for _, reader, writer in conns:
+                self.__close((reader, writer))
+
+    #
+    # internal tooling
+    #
+
+    @staticmethod
+    def __format_head(key, path, data, headers, accept_encoding):
+        scheme, host, port = key
+        if port == (443 if scheme == 'https' else 80):
+            host_header = host
+        else:
+            host_header = '{0}:{1}'.format(host, port)
+        lines = [
+            '{0} {1} HTTP/1.1'.format(('GET' if data is None else 'POST'), path),
+            'Host: ' + host_header,
+            'Accept-Encoding: ' + accept_encoding,
+        ]
+        if data is not None:
+            lines.append('Content-Length: {0}'.format(len(data)))
+        for name, value in (headers or {}).items():
+            lines.append('{0}: {1}'.format(name, value))
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def __checkout(self, key, connect_timeout):
+        now = time.monotonic()
+        conns = self._idle.get(key)
+        while conns:
+            last_used, reader, writer = conns.pop()
+            self._idle_count -= 1
+            if now - last_used > self.idle_timeout or reader.at_eof():
+                self.__close((reader, writer))
+            else:
+                self.hits += 1
+                return (reader, writer), True
+        self.misses += 1
+        return (await self.__connect(key, connect_timeout)), False
+
+    def __checkin(self, key, conn):
+        if self._idle_count < self.maxsize:
+            reader, writer = conn
+            self._idle.setdefault(key, deque()).append((time.monotonic(), reader, writer))
+            self._idle_count += 1
+        else:
+            self.__close(conn)
+
+    async def __connect(self, key, connect_timeout):
+        scheme, host, port = key
+        proxy = select_proxy(self.proxies, scheme, host)
+        if proxy is None:
+            if scheme == 'https':
+                context = self.ssl_context or ssl.create_default_context()
+                return await _wait_for(asyncio.open_connection(host, port, ssl=context), connect_timeout)
+            return await _wait_for(asyncio.open_connection(host, port), connect_timeout)
+        # like `urllib`, talk to the proxy itself in plain HTTP
+        if scheme == 'https':
+            return await _wait_for(self.__tunnel(proxy, host, port), connect_timeout)
+        return await _wait_for(asyncio.open_connection(proxy.hostname, proxy.port or 80), connect_timeout)
+
+    async def __tunnel(self, proxy, host, port):
+        """
+        Open a TLS connection to `host` through a tunnel opened with CONNECT by `proxy`.
+        """
+        # streams cannot be switched to TLS before Python 3.11, so the
+        # tunnel is set up on a bare socket first
+        loop = asyncio.get_event_loop()
+        family, socktype, proto, _, address = (await loop.getaddrinfo(
+            proxy.hostname, proxy.port or 80, type=socket.SOCK_STREAM))[0]
+        sock = socket.socket(family, socktype, proto)
+        try:
+            sock.setblocking(False)
+            await loop.sock_connect(sock, address)
+            lines = ['CONNECT {0}:{1} HTTP/1.0'.format(host, port), 'Host: {0}:{1}'.format(host, port)]
+            lines.extend('{0}: {1}'.format(name, value) for name, value in proxy_headers(proxy).items())
+            await loop.sock_sendall(sock, ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+            reply = b''
+            while b'\r\n\r\n' not in reply:
+                chunk = await loop.sock_recv(sock, 4096)
+                if not chunk:
+                    raise ConnectionResetError("Proxy closed the connection before opening the tunnel")
+                reply += chunk
+            status_line = reply.split(b'\r\n', 1)[0].decode('latin-1')
+            if status_line.split(' ', 2)[1:2] != ['200']:
+                # as raised by `http.client`
+                raise OSError('Tunnel connection failed: ' + status_line.split(' ', 1)[-1])
+            context = self.ssl_context or ssl.create_default_context()
+            return await asyncio.open_connection(sock=sock, ssl=context, server_hostname=host)
+        except BaseException:
+            sock.close()
+            raise
+
+    @staticmethod
+    def __close(conn):
+        _, writer = conn
+        writer.close()
+
+    async def __exchange(self, key, conn, reused, head, data, connect_timeout):
+        """
+        Send a request over `conn` and return `(conn, response, keep_alive)`.
+
+        As with #ConnectionPool, a request that met a connection closed
+        by the server while idle is sent again over a new connection
+        only if it could not be sent in full, or if it is a GET.
+        """
+        sent = False
+        try:
+            await self.__send(conn, head, data)
+            sent = True
+            return (conn,) + (await self.__receive(conn))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.__close(conn)
+            if not reused or (sent and data is not None):
+                raise
+
+        # the server dropped the connection while idle: retry once on a fresh one
+        self.stale += 1
+        self.misses += 1
+        conn = await self.__connect(key, connect_timeout)
+        try:
+            await self.__send(conn, head, data)
+            return (conn,) + (await self.__receive(conn))
+        except BaseException:
+            self.__close(conn)
+            raise
+
+    @staticmethod
+    async def __send(conn, head, data):
+        _, writer = conn
+        writer.write(head)
+        if data:
+            writer.write(data)
+        await writer.drain()
+
+    @staticmethod
+    async def __receive(conn):
+        reader, _ = conn
+        while True:
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionResetError("Connection closed by server before sending a response")
+            version, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+            status = int(status)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            if status != 100:
+                break
+
+        keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close')
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0], 16)
+                if size == 0:
+                    # skip trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            keep_alive = False
+
+        return AsyncResponse(status, reason, headers, body), keep_alive
+
+
+class _ResultItems:
+    """
+    Asynchronous iterator over the items of the dict returned by `request()`, which is awaited on first use.
+
+    Asynchronous generators need Python 3.6, so iterators are written as
+    classes with `__aiter__` and `__anext__`.
+    """
+
+    def __init__(self, request: Callable[[], Any]):
+        self._request = request
+        self._items = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._items is None:
+            self._items = iter((await self._request()).items())
+        try:
+            return next(self._items)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def aclose(self):
+        """
+        Stop the iteration.
+        """
+        self._items = iter(())
+
+
+class _Discoveries:
+    """
+    Asynchronous iterator returned by #AsyncWebApi.iter_discover_services.
+    """
+
+    def __init__(self, api, hostnames, mode, workers, rate, deadline):
+        self._api = api
+        self._hostnames = hostnames
+        self._mode = mode
+        self._workers = workers
+        self._interval = (1.0 / rate if rate else 0.0)
+        self._deadline = deadline
+        self._pending = set()
+        self._results = deque()  # type: Deque[Tuple[str, Any]]
+        self._next_start = None
+        self._finished = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            while not self._results:
+                if self._finished:
+                    raise StopAsyncIteration
+                await self.__start()
+                if not self._pending:
+                    self._finished = True
+                    if self._deadline is not None and next(self._hostnames, _MISSING) is not _MISSING:
+                        raise DeadlineExceeded('discover_services')
+                    raise StopAsyncIteration
+                done, self._pending = await asyncio.wait(self._pending, return_when=asyncio.FIRST_COMPLETED)
+                self._results.extend(task.result() for task in done)
+        except BaseException:
+            await self.aclose()
+            raise
+        return self._results.popleft()
+
+    async def aclose(self):
+        """
+        Stop the iteration, cancelling the discoveries still running.
+        """
+        self._finished = True
+        for task in self._pending:
+            task.cancel()
+        self._pending = set()
+
+    async def __start(self):
+        """
+        Start discoveries until `workers` are running, unless the deadline has passed.
+        """
+        loop = asyncio.get_event_loop()
+        if self._next_start is None:
+            if self._hostnames is None:
+                self._hostnames = await self._api.get_all_hosts()
+            self._hostnames = iter(self._hostnames)
+            self._next_start = loop.time()
+        if self._deadline is not None and self._deadline.expired():
+            return
+        while len(self._pending) < self._workers:
+            hostname = next(self._hostnames, _MISSING)
+            if hostname is _MISSING:
+                return
+            now = loop.time()
+            self._next_start = max(now, self._next_start)
+            self._pending.add(asyncio.ensure_future(self.__discover(hostname, self._next_start - now)))
+            self._next_start += self._interval
+
+    async def __discover(self, hostname, delay):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            return hostname, await self._api.discover_services(hostname, self._mode, self._deadline)
+        except Exception as err:  # pylint: disable=broad-except
+            return hostname, err
+
+
+# pylint: disable=too-many-public-methods
+class AsyncWebApi(WebApi):
+    """
+    Abstraction for Check_Mk Web API, for use with `asyncio`.
+
+    Every method of #WebApi is available with the same arguments, but
+    returns a coroutine that must be awaited.
+
+    # Arguments
+    check_mk_url (str): URL to Check_Mk web application, multiple formats are supported
+    username (str): Name of user to connect as. Make sure this is an automation user.
+    secret (str): Secret for automation user. This is different from the password!
+    pool (AsyncConnectionPool): pool of keep-alive connections to send requests through;
+        if `None`, a private #AsyncConnectionPool with default settings is created
+    cache (TTLCache): cache for read requests, see #WebApi
+    timeout: connect and read timeouts, see #WebApi
+    action_timeouts (dict): timeouts for specific actions, see #WebApi
+    limiter (SiteLimiter): if given, every request waits for this limiter's permission;
+        it can be shared with #WebApi clients, even ones running in other threads
+    ruleset_cache (RulesetCache): cache for rule sets, see #WebApi
+
+    # Examples
+    ```python
+    api = AsyncWebApi('http://checkmk.company.com/monitor', 'automation', 'secret')
+    await asyncio.gather(*[api.add_host(name) for name in hostnames])
+    ```
+    """
+
+    def __init__(self,
+                 check_mk_url,
+                 username,
+                 secret,
+                 pool=None,
+                 cache=None,
+                 timeout=None,
+                 action_timeouts=None,
+                 limiter=None,
+                 ruleset_cache=None):
+        super(AsyncWebApi, self).__init__(
+            check_mk_url, username, secret,
+            pool=(pool if pool is not None else AsyncConnectionPool()),
+            cache=cache,
+            timeout=timeout,
+            action_timeouts=action_timeouts,
+            limiter=limiter,
+            ruleset_cache=ruleset_cache)
+
+    async def make_request(self, action, query_params=None, data=None, timeout=None, deadline=None):
+        """
+        Make arbitrary request to Check_Mk Web API
+
+        # Arguments
+        action (str): Action request, e.g. add_host
+        query_params (dict): dict of path parameters
+        data (dict): dict that will be sent as request body
+        timeout: connect and read timeouts for this request, see #WebApi;
+            if `None`, use those configured for `action`
+        deadline (Deadline): if given, the timeouts are shortened to the time left
+
+        # Raises
+        ResponseError: Raised when the HTTP status code != 200
+        MalformedResponseError: when the body of the CheckMK reply cannot be parsed
+        ResultError: when CheckMK's own result code is != 0
+        DeadlineExceeded: when `deadline` passed before or while the request was made
+        socket.timeout: when the server takes longer to answer than the read timeout
+        """
+        cache_key = self._cache_key(action, query_params, data)
+        result = self._cached_result(action, data, cache_key)
+        if result is not _MISSING:
+            return result
+
+        url, body, headers, output_format = self._prepare_request(action, query_params, data)
+
+        started = ((await self.limiter.acquire_async(action, deadline)) if self.limiter is not None else None)
+        info = (self._before_request(action, body) if self._request_hooks else None)
+        error = None
+        try:
+            response = await self.pool.request(url, body, headers, self._timeout(action, timeout, deadline))
+            response_body = response.read()
+            if info is not None:
+                info.status = response.status
+                info.response_bytes = len(response_body)
+            result = self._parse_result(action, data, response, response_body, output_format)
+        except Exception as err:
+            error = self._timeout_error(err, action, deadline)
+            if info is not None:
+                info.error = error
+            raise error
+        finally:
+            self._invalidate_cache(action, data)
+            if started is not None:
+                self.limiter.release(started, error)
+            if info is not None:
+                self._after_request(info)
+
+        if cache_key is not None:
+            self.cache.set(cache_key, result)
+        if self._change_listeners and self._is_change_action(action):
+            self._notify_change(action, data)
+        return result
+
+    #
+    # Methods of `WebApi` that do more than a single `make_request()` call
+    # need to be re-implemented; all others return the coroutine from
+    # `make_request()` and thus are already awaitable.
+    #
+
+    async def _bulk_host_request(self, action, requests, batch_size=None, deadline=None):
+        """
+        Send host `requests` in batches through `action` and merge the outcomes.
+
+        Batches are sent concurrently, at most `pool.max_per_host` at a time.
+        """
+        async def send(batch):
+            try:
+                return await self.make_request(action, data={'hosts': batch}, deadline=deadline)
+            except Error as err:
+                return err
+
+        batches = list(_batched(requests, batch_size or self.batch_size))
+        results = await _map_bounded(send, batches, self.pool.max_per_host)
+
+        outcome = {'succeeded_hosts': [], 'failed_hosts': {}}  # type: Dict[str, Any]
+        exceeded = None
+        for batch, result in zip(batches, results):
+            if isinstance(result, DeadlineExceeded):
+                # hosts of the interrupted batch may or may not have been changed
+                exceeded = result
+                continue
+            self._merge_bulk_result(outcome, batch, result)
+        if exceeded is not None:
+            exceeded.outcome = outcome
+            raise exceeded
+        return outcome
+
+    async def delete_hosts(self,
+                           hostnames: Iterable[str],
+                           batch_size: Optional[int] = None,
+                           deadline: Optional[Deadline] = None):
+        """
+        Deletes hosts from the Check_MK inventory.
+
+        Host names are sent in batches of `batch_size` each, at most
+        `pool.max_per_host` batches at a time.  Check_MK servers older than
+        1.5.0 lack the `delete_hosts` action; in that case, hosts are
+        deleted one by one with #WebApi.delete_host.
+
+        # Arguments
+        hostnames (list): Names of hosts to delete
+        batch_size (int): maximum number of hosts per request; defaults to #WebApi.batch_size
+        deadline (Deadline): if given, stop sending requests once it has passed
+
+        # Returns
+        the result of the last request, in the order of `hostnames`, as returned by the Check_MK API
+
+        # Raises
+        DeadlineExceeded: when `deadline` passes; its `outcome` is the list
+            of hosts deleted so far
+        """
+        batches = list(_batched(hostnames, batch_size or self.batch_size))
+        if not batches:
+            return None
+        deleted = []  # type: list
+
+        async def delete_batch(batch):
+            result = await self.make_request('delete_hosts', data={'hostnames': batch}, deadline=deadline)
+            deleted.extend(batch)
+            return result
+
+        async def delete_host(hostname):
+            if deadline is not None:
+                deadline.check('delete_host')
+            result = await self.delete_host(hostname)
+            deleted.append(hostname)
+            return result
+
+        try:
+            if self._bulk_delete_supported:
+                # probe with the first batch, then send the rest concurrently
+                try:
+                    results = [await delete_batch(batches[0])]
+                    results.extend(await _map_bounded(delete_batch, batches[1:], self.pool.max_per_host))
+                    return results[-1]
+                except ResultError as err:
+                    if not self._is_unknown_action(err):
+                        raise
+                    self._bulk_delete_supported = False
+            hostnames = [hostname for batch in batches for hostname in batch]
+            results = await _map_bounded(delete_host, hostnames, self.pool.max_per_host)
+            return results[-1]
+        except DeadlineExceeded as err:
+            err.outcome = deleted
+            raise
+
+    async def delete_all_hosts(self, batch_size: Optional[int] = None, deadline: Optional[Deadline] = None):
+        """
+        Deletes all hosts from the Check_MK inventory.
+
+        This is an extension not present in the Check_MK API.
+
+        # Arguments
+        batch_size (int): maximum number of hosts per request; defaults to #WebApi.batch_size
+        deadline (Deadline): if given, stop deleting hosts once it has passed; see #WebApi.delete_hosts
+
+        # Returns
+        list of names of deleted hosts
+        """
+        hostnames = list(await self.get_all_hosts())
+        await self.delete_hosts(hostnames, batch_size, deadline)
+        return hostnames
+
+    async def delete_hosts_by_folder(self,
+                                     folder: str,
+                                     batch_size: Optional[int] = None,
+                                     deadline: Optional[Deadline] = None):
+        """
+        Deletes all hosts in a folder (but not in its subfolders).
+
+        This is an extension not present in the Check_MK API.
+
+        # Arguments
+        folder (str): folder to delete hosts from
+        batch_size (int): maximum number of hosts per request; defaults to #WebApi.batch_size
+        deadline (Deadline): if given, stop deleting hosts once it has passed; see #WebApi.delete_hosts
+
+        # Returns
+        list of names of deleted hosts
+        """
+        hostnames = list(await self.get_hosts_by_folder(folder))
+        await self.delete_hosts(hostnames, batch_size, deadline)
+        return hostnames
+
+    async def delete_hosts_matching(self,
+                                    predicate: Callable[[str, Dict[str, Any]], bool],
+                                    effective_attributes: bool = False,
+                                    batch_size: Optional[int] = None,
+                                    deadline: Optional[Deadline] = None):
+        """
+        Deletes all hosts for which `predicate` returns `True`.
+
+        This is an extension not present in the Check_MK API.
+
+        # Arguments
+        predicate (callable): called with the host name and the host data
+            (as returned by #WebApi.get_host) for each host
+        effective_attributes (bool): If True the host data passed to `predicate`
+            includes attributes with default values
+        batch_size (int): maximum number of hosts per request; defaults to #WebApi.batch_size
+        deadline (Deadline): if given, stop deleting hosts once it has passed; see #WebApi.delete_hosts
+
+        # Returns
+        list of names of deleted hosts
+        """
+        hostnames = [
+            hostname
+            for hostname, host in (await self.get_all_hosts(effective_attributes)).items()
+            if predicate(hostname, host)
+        ]
+        await self.delete_hosts(hostnames, batch_size, deadline)
+        return hostnames
+
+    async def get_hosts_by_folder(self,
+                                  folder: str,
+                                  effective_attributes: bool = False):
+        """
+        Gets hosts in folder.
+
+        This is an extension not present in the Check_MK API.
+
+        # Arguments
+        folder (str): folder to get hosts for
+        effective_attributes (bool): If True attributes with default values will be returned
+        """
+        return {
+            host: attr
+            for host, attr in (await self.get_all_hosts(effective_attributes)).items()
+            if attr['path'] == folder
+        }
+
+    def iter_all_hosts(self,
+                       effective_attributes: bool = False,
+                       deadline: Optional[Deadline] = None):
+        """
+        Iterates over all hosts.
+
+        #AsyncConnectionPool reads responses in full, so this does not
+        save memory compared to #AsyncWebApi.get_all_hosts; it is
+        provided so that code written for #WebApi.iter_all_hosts can be
+        used with `async for`.  The slot of #WebApi.limiter is given
+        back before the first host is yielded.
+
+        # Arguments
+        effective_attributes (bool): If True attributes with default values will be returned
+        deadline (Deadline): if given, give up when it passes
+        """
+        return _ResultItems(functools.partial(
+            self.make_request,
+            'get_all_hosts',
+            query_params={'effective_attributes': effective_attributes},
+            deadline=deadline,
+        ))
+
+    async def discover_services(self,
+                                hostname: str,
+                                mode: DiscoverMode = DiscoverMode.NEW,
+                                deadline: Optional[Deadline] = None):
+        """
+        Discovers the services of a specific host
+
+        # Arguments
+        hostname (str): Name of host to discover services for
+        mode (DiscoverMode): see #WebApi.DiscoverMode
+        deadline (Deadline): if given, give up when it passes
+        """
+        result = await self.make_request(
+            'discover_services',
+            data={'hostname': hostname},
+            query_params={'mode': mode.value},
+            deadline=deadline,
+        )
+
+        return self._parse_discovery_result(result)
+
+    def iter_discover_services(self,
+                               hostnames: Optional[Iterable[str]] = None,
+                               mode: DiscoverMode = DiscoverMode.NEW,
+                               workers: int = 4,
+                               rate: Optional[float] = None,
+                               deadline: Optional[Deadline] = None):
+        """
+        Discovers the services of many hosts concurrently, yielding results as each discovery completes.
+
+        This is an extension not present in the Check_MK API; it returns
+        an asynchronous iterator, to be used with ``async for``.  Call its
+        `aclose()` coroutine to cancel the discoveries still running when
+        stopping early.
+
+        # Arguments
+        hostnames (list): names of hosts to discover services for; if `None`, all hosts
+        mode (DiscoverMode): see #WebApi.DiscoverMode
+        workers (int): maximum number of discoveries running at the same time
+        rate (float): maximum number of discoveries started per second; `None` means no limit
+        deadline (Deadline): if given, stop starting discoveries once it has passed;
+            those already started yield #DeadlineExceeded if they run out of time
+
+        # Yields
+        `(hostname, result)` pairs, where `result` is either the dict returned
+        by #WebApi.discover_services or the exception it raised
+
+        # Raises
+        DeadlineExceeded: after the last result, if `deadline` passed before all hosts were started
+        """
+        return _Discoveries(self, hostnames, mode, workers, rate, deadline)
+
+    async def discover_services_for_all_hosts(self,
+                                              mode: DiscoverMode = DiscoverMode.NEW,
+                                              workers: int = 1,
+                                              rate: Optional[float] = None,
+                                              deadline: Optional[Deadline] = None):
+        """
+        Discovers the services of all hosts.
+
+        This is an extension not present in the Check_MK API.
+
+        Stops at the first error and re-raises it; use
+        #AsyncWebApi.iter_discover_services to collect errors as well.
+
+        # Arguments
+        mode (DiscoverMode): see #WebApi.DiscoverMode
+        workers (int): maximum number of discoveries running at the same time
+        rate (float): maximum number of discoveries started per second; `None` means no limit
+        deadline (Deadline): if given, stop once it has passed
+
+        # Returns
+        dict mapping each host name to the result of #WebApi.discover_services
+
+        # Raises
+        DeadlineExceeded: when `deadline` passes; its `outcome` holds the results collected so far
+        """
+        results = {}
+        discoveries = self.iter_discover_services(None, mode, workers, rate, deadline)
+        try:
+            async for host, result in discoveries:
+                if isinstance(result, Exception):
+                    raise result
+                results[host] = result
+        except DeadlineExceeded as err:
+            err.outcome = results
+            raise
+        finally:
+            await discoveries.aclose()
+        return results
+
+    async def get_contactgroup(self, groupname: str):
+        """
+        Gets one contact group
+
+        # Arguments
+        group (str): name of contact group to get
+        """
+        return (await self.get_all_contactgroups())[groupname]
+
+    async def delete_all_contactgroups(self):
+        """
+        Deletes all contact groups
+        """
+        await asyncio.gather(*[
+            self.delete_contactgroup(groupname) for groupname in await self.get_all_contactgroups()])
+
+    async def get_hostgroup(self, groupname: str):
+        """
+        Gets one host group
+
+        # Arguments
+        group (str): name of host group to get
+        """
+        return (await self.get_all_hostgroups())[groupname]
+
+    async def delete_all_hostgroups(self):
+        """
+        Deletes all host groups
+        """
+        await asyncio.gather(*[
+            self.delete_hostgroup(groupname) for groupname in await self.get_all_hostgroups()])
+
+    async def get_servicegroup(self, groupname: str):
+        """
+        Gets one service group
+
+        # Arguments
+        group (str): name of service group to get
+        """
+        return (await self.get_all_servicegroups())[groupname]
+
+    async def delete_all_servicegroups(self):
+        """
+        Deletes all service groups
+        """
+        await asyncio.gather(*[
+            self.delete_servicegroup(groupname) for groupname in await self.get_all_servicegroups()])
+
+    async def get_user(self, user_id: str):
+        """
+        Gets a single user
+
+        # Arguments
+        user_id (str): ID of user to get
+        """
+        return (await self.get_all_users())[user_id]
@@ -0,0 +1,183 @@
+"""
+Run many Web API calls read as newline-delimited JSON, over a single client.
+
+Each input line is a JSON object naming a #WebApi method and its arguments::
+
+    {"id": 1, "method": "add_host", "args": ["host00"], "kwargs": {"folder": "web"}}
+    {"id": 2, "method": "discover_services", "kwargs": {"hostname": "host00", "mode": "refresh"}}
+
+``id`` is optional (it defaults to the line number) and is copied to the
+result, which is written as one JSON line per command::
+
+    {"id": 1, "method": "add_host", "ok": true, "result": null, "elapsed": 0.021}
+    {"id": 2, "method": "discover_services", "ok": false, "elapsed": 0.002,
+     "error": {"type": "ResultError", "message": "...", "result_code": 1}}
+
+Strings are converted to enumeration members (such as #DiscoverMode)
+where the method expects one.
+
+This is an extension not present in the Check_MK API.
+"""
+
+import enum
+import inspect
+import json
+import time
+from typing import Any, Dict, Iterable, Iterator, TextIO
+
+from cmkclient import WebApi
+from cmkclient.exception import ResponseError, ResultError
+
+
+__all__ = ['run_batch', 'run_command']
+
+
+# methods that take callbacks or would recurse, and so make no sense in a batch
+_EXCLUDED = frozenset([
+    'add_change_listener',
+    'remove_change_listener',
+    'add_request_hook',
+    'remove_request_hook',
+    'batch',
+])
+
+
+def _method(name):
+    """
+    Return the #WebApi function called `name`, if it may be run in a batch.
+    """
+    if not isinstance(name, str) or name.startswith('_') or name in _EXCLUDED:
+        raise ValueError("Unknown method {0!r}".format(name))
+    function = getattr(WebApi, name, None)
+    if not inspect.isfunction(function):
+        raise ValueError("Unknown method {0!r}".format(name))
+    return function
+
+
+def _convert_arguments(function, args, kwargs):
+    """
+    Bind `args` and `kwargs` to `function`, turning strings into enumeration members where annotated so.
+    """
+    signature = inspect.signature(function)
+    bound = signature.bind(None, *args, **kwargs)
+    for name, value in bound.arguments.items():
+        annotation = signature.parameters[name].annotation
+        if isinstance(annotation, type) and issubclass(annotation, enum.Enum) and isinstance(value, str):
+            bound.arguments[name] = annotation(value)
+    return bound.args[1:], bound.kwargs
+
+
+def _describe_error(err):
+    error = {'type': type(err).__name__, 'message': str(err)}  # type: Dict[str, Any]
+    if isinstance(err, ResultError):
+        error['message'] = str(err.result_body)
+        error['result_code'] = err.result_code
+    elif isinstance(err, ResponseError):
+        error['status'] = getattr(err.response, 'status', None)
+        error['message'] = getattr(err.response, 'reason', '')
+    return error
+
+
+def run_command(api: WebApi, command_id: Any, command: Any) -> Dict[str, Any]:
+    """
+    Run one batch command on `api`, and return its result record.
+
+    Errors, including malformed commands, are reported in the record
+    rather than raised.
+    """
+    started = time.monotonic()
+    record = {'id': command_id}  # type: Dict[str, Any]
+    try:
+        if not isinstance(command, dict):
+            raise ValueError("Command must be a JSON object")
+        record['id'] = command.get('id', command_id)
+        record['method'] = command.get('method')
+        function = _method(record['method'])
+        args, kwargs = _convert_arguments(function, command.get('args') or [], command.get('kwargs') or {})
+        result = getattr(api, function.__name__)(*args, **kwargs)
+        if isinstance(result, Iterator):
+            result = list(result)
+    except Exception as err:  # pylint: disable=broad-except
+        record['ok'] = False
+        record['error'] = _describe_error(err)
+    else:
+        record['ok'] = True
+        record['result'] = result
+    record['elapsed'] = round(time.monotonic() - started, 6)
+    return record
+
+
+def _commands(lines):
+    """
+    Yield `(line_number, command)` for each non-blank line; malformed JSON yields the exception.
+    """
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as err:
+            yield number, err
+
+
+def _run(api, command_id, command):
+    if isinstance(command, Exception):
+        return {'id': command_id, 'ok': False, 'error': _describe_error(command), 'elapsed': 0.0}
+    return run_command(api, command_id, command)
+
+
+def run_batch(api: WebApi, lines: Iterable[str], output: TextIO, workers: int = 1) -> Dict[str, int]:
+    """
+    Run the commands in `lines` on `api`, writing one JSON result line per command to `output`.
+
+    With a single worker, commands run one after another and results
+    come in input order; with more, up to `workers` commands run at the
+    same time and results are written as they complete.  Input is read
+    only a few commands ahead, so `lines` can be an endless stream.
+
+    # Arguments
+    api (WebApi): client to run the commands on
+    lines (iterable): JSON commands, one per item (e.g., an open file)
+    output (file): where to write results
+    workers (int): maximum number of commands running at the same time
+
+    # Returns
+    dict with the number of commands that succeeded (``ok``) and failed (``failed``)
+
+    # Examples
+    ```python
+    with open('commands.jsonl') as commands:
+        run_batch(api, commands, sys.stdout, workers=4)
+    ```
+    """
+    counts = {'ok': 0, 'failed': 0}
+
+    def emit(record):
+        counts['ok' if record['ok'] else 'failed'] += 1
+        output.write(json.dumps(record, default=str) + '\n')
+        output.flush()
+
+    commands = _commands(lines)
+    if workers <= 1:
+        for command_id, command in commands:
+            emit(_run(api, command_id, command))
+        return counts
+
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+    pending = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while True:
+                for command_id, command in commands:
+                    pending.add(executor.submit(_run, api, command_id, command))
+                    if len(pending) >= 2 * workers:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    emit(future.result())
+        finally:
+            for future in pending:
+                future.cancel()
+    return counts
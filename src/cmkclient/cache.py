@@ -0,0 +1,385 @@
+"""
+Caching of Check_MK Web API responses, in memory or on disk.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional
+
+# `json` is only needed by #SQLiteCache, and so imported by its methods
+
+
+class TTLCache:
+    """
+    Thread-safe mapping whose entries expire `ttl` seconds after being stored.
+
+    When more than `maxsize` entries are stored, the least recently
+    used ones are evicted.
+
+    # Arguments
+    ttl (float): number of seconds an entry stays valid
+    maxsize (int): maximum number of entries
+
+    # Examples
+    ```python
+    api = WebApi('http://checkmk.company.com/monitor', 'automation', 'secret', cache=TTLCache(ttl=30))
+    ```
+    """
+
+    def __init__(self, ttl: float = 60.0, maxsize: int = 32):
+        self.ttl = ttl
+        self.maxsize = maxsize
+
+        #: number of lookups that found a valid entry
+        self.hits = 0
+        #: number of lookups that found no entry, or an expired one
+        self.misses = 0
+        #: number of entries removed to make room for new ones
+        self.evictions = 0
+
+        self._data = OrderedDict()  # type: OrderedDict
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        """
+        Return a dictionary with the cache counters and current size.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+            }
+
+    def get(self, key: Hashable, default: Any = None):
+        """
+        Return the value stored under `key`, or `default` if missing or expired.
+        """
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Store `value` under `key`, evicting the least recently used entries if needed.
+        """
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None):
+        """
+        Remove all entries whose key satisfies `predicate`, or all entries if `predicate` is `None`.
+        """
+        with self._lock:
+            if predicate is None:
+                self._data.clear()
+            else:
+                for key in [key for key in self._data if predicate(key)]:
+                    del self._data[key]
+
+
+class SQLiteCache:
+    """
+    Cache like #TTLCache, but stored in an SQLite database file, so that it outlives the process.
+
+    A short-lived script can then start from the responses fetched by
+    an earlier run, instead of downloading them again: entries stay
+    valid `ttl` seconds after they were fetched, whichever process
+    fetched them.  Writes made through a #WebApi using this cache drop
+    the entries they make stale, for all processes sharing the file.
+
+    Values must be JSON data, as Web API results are.  Decoding a
+    large value, such as the result of #WebApi.get_all_users, takes
+    longer than reading it, so the last `maxsize` values stored or
+    decoded are also kept in memory: as with #TTLCache, lookups then
+    return the same object, as long as no process stored a newer value.
+    Safe to share among threads and processes.
+
+    This is an extension not present in the Check_MK API.
+
+    # Arguments
+    path (str): name of the database file; it is created if needed
+    ttl (float): number of seconds an entry stays valid
+    maxsize (int): maximum number of entries; the least recently used ones are evicted
+
+    # Examples
+    ```python
+    api = WebApi(url, 'automation', 'secret', cache=SQLiteCache('/var/tmp/cmkclient.sqlite', ttl=300))
+    hosts = api.get_all_hosts()  # only requested if not fetched in the last 5 minutes
+    ```
+    """
+
+    def __init__(self, path: str, ttl: float = 300.0, maxsize: int = 256):
+        import sqlite3  # only needed, and so only imported, when caching on disk
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+
+        #: number of lookups that found a valid entry
+        self.hits = 0
+        #: number of lookups that found no entry, or an expired one
+        self.misses = 0
+        #: number of entries removed to make room for new ones
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        # database key -> (time stored, decoded value)
+        self._decoded = OrderedDict()  # type: OrderedDict
+        # autocommit mode: every statement is a transaction of its own
+        self._db = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                ' key TEXT PRIMARY KEY,'
+                ' stored REAL NOT NULL,'
+                ' used REAL NOT NULL,'
+                ' value TEXT NOT NULL)')
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def _key(key):
+        # keys made by #WebApi are tuples of strings, which JSON keeps apart
+        import json
+        return json.dumps(list(key) if isinstance(key, tuple) else key)
+
+    def stats(self):
+        """
+        Return a dictionary with the cache counters and current size.
+        """
+        size = len(self)
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': size,
+            }
+
+    def get(self, key: Hashable, default: Any = None):
+        """
+        Return the value stored under `key`, or `default` if missing or expired.
+        """
+        db_key = self._key(key)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT stored FROM responses WHERE key = ?', (db_key,)).fetchone()
+            decoded = (self._decoded.get(db_key) if row is not None else None)
+            if decoded is None or decoded[0] != row[0]:
+                # not decoded yet: read the value, with its time stored, as
+                # another process may have replaced it in the meantime
+                row = self._db.execute('SELECT stored, value FROM responses WHERE key = ?', (db_key,)).fetchone()
+                decoded = None
+            if row is None or row[0] + self.ttl < now:
+                if row is not None:
+                    self._db.execute('DELETE FROM responses WHERE key = ? AND stored = ?', (db_key, row[0]))
+                self._decoded.pop(db_key, None)
+                self.misses += 1
+                return default
+            self._db.execute('UPDATE responses SET used = ? WHERE key = ?', (now, db_key))
+            self.hits += 1
+            if decoded is not None:
+                self._decoded.move_to_end(db_key)
+                return decoded[1]
+        import json
+        value = json.loads(row[1])
+        self._remember(db_key, row[0], value)
+        return value
+
+    def _remember(self, db_key, stored, value):
+        with self._lock:
+            decoded = self._decoded.get(db_key)
+            if decoded is not None and decoded[0] > stored:
+                return
+            self._decoded[db_key] = (stored, value)
+            self._decoded.move_to_end(db_key)
+            while len(self._decoded) > self.maxsize:
+                self._decoded.popitem(last=False)
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Store `value` under `key`, evicting the least recently used entries if needed.
+        """
+        import json
+        text = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses (key, stored, used, value) VALUES (?, ?, ?, ?)',
+                (self._key(key), now, now, text))
+            evicted = self._db.execute(
+                'DELETE FROM responses WHERE key IN'
+                ' (SELECT key FROM responses ORDER BY used DESC LIMIT -1 OFFSET ?)', (self.maxsize,)).rowcount
+            self.evictions += max(evicted, 0)
+        self._remember(self._key(key), now, value)
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None):
+        """
+        Remove all entries whose key satisfies `predicate`, or all entries if `predicate` is `None`.
+        """
+        import json
+        with self._lock:
+            if predicate is None:
+                self._db.execute('DELETE FROM responses')
+                self._decoded.clear()
+                return
+            for (db_key,) in self._db.execute('SELECT key FROM responses').fetchall():
+                key = json.loads(db_key)
+                if predicate(tuple(key) if isinstance(key, list) else key):
+                    self._db.execute('DELETE FROM responses WHERE key = ?', (db_key,))
+                    self._decoded.pop(db_key, None)
+
+    def close(self):
+        """
+        Close the database file.
+        """
+        with self._lock:
+            self._db.close()
+
+
+class RulesetCache:
+    """
+    Rule sets fetched by #WebApi.get_ruleset, kept with their configuration hash.
+
+    For `ttl` seconds after being fetched, a rule set is returned
+    without asking the server.  After that, it is downloaded again, but
+    if its configuration hash has not changed, the cached rule set is
+    returned instead of parsing the response, which for large rule sets
+    takes much longer than the download.  #WebApi.set_ruleset drops the
+    rule set from the cache and, when called with ``use_cached_hash=True``,
+    sends the cached hash, so that the server refuses changes based on an
+    outdated copy.
+
+    Cached rule sets are shared, so they must not be modified.  Safe to
+    share among threads, and among clients of different sites or users,
+    whose rule sets are kept apart.
+
+    This is an extension not present in the Check_MK API.
+
+    # Arguments
+    ttl (float): number of seconds a rule set is used without asking the server;
+        with 0, it is checked for changes on each use
+    maxsize (int): maximum number of rule sets; the least recently used ones are evicted
+
+    # Examples
+    ```python
+    api = WebApi(url, 'automation', 'secret', ruleset_cache=RulesetCache(ttl=0))
+    ```
+    """
+
+    def __init__(self, ttl: float = 60.0, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+
+        #: number of lookups answered without asking the server
+        self.hits = 0
+        #: number of downloads whose configuration hash was unchanged, so were not parsed
+        self.unchanged = 0
+        #: number of lookups that found no rule set, or an expired one
+        self.misses = 0
+
+        # key -> (time fetched or found unchanged, configuration hash, result)
+        self._data = OrderedDict()  # type: OrderedDict
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        """
+        Return a dictionary with the cache counters and current size.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'unchanged': self.unchanged,
+                'misses': self.misses,
+                'size': len(self._data),
+            }
+
+    def get(self, key: Hashable, default: Any = None):
+        """
+        Return the result of #WebApi.get_ruleset stored under `key`, or `default`.
+
+        Rule sets fetched or found unchanged `ttl` or more seconds ago are not returned.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] + self.ttl <= time.monotonic():
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def configuration_hash(self, key: Hashable) -> Optional[str]:
+        """
+        Return the configuration hash of the rule set stored under `key`, however old, or `None`.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            return (entry[1] if entry is not None else None)
+
+    def revalidate(self, key: Hashable, configuration_hash: str):
+        """
+        Return the rule set stored under `key` if it has hash `configuration_hash`, else `None`.
+
+        A rule set that is returned has its time to live restarted.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] != configuration_hash:
+                return None
+            self._data[key] = (time.monotonic(), configuration_hash, entry[2])
+            self._data.move_to_end(key)
+            self.unchanged += 1
+            return entry[2]
+
+    def set(self, key: Hashable, result: Any):
+        """
+        Store `result` of #WebApi.get_ruleset under `key`, with the configuration hash it contains.
+        """
+        configuration_hash = result.get('configuration_hash') if isinstance(result, dict) else None
+        with self._lock:
+            if configuration_hash is None:
+                self._data.pop(key, None)
+                return
+            self._data[key] = (time.monotonic(), configuration_hash, result)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None):
+        """
+        Remove all rule sets whose key satisfies `predicate`, or all rule sets if `predicate` is `None`.
+        """
+        with self._lock:
+            if predicate is None:
+                self._data.clear()
+            else:
+                for key in [key for key in self._data if predicate(key)]:
+                    del self._data[key]
@@ -0,0 +1,308 @@
+"""
+Record Web API traffic to a file, and replay it without a Check_MK server.
+
+A cassette is a JSON Lines file (gzip-compressed if its name ends with
+``.gz``) with one entry per request: the action, the query parameters
+(without the ``_secret``), the request body, the response status and
+body, and the request's start offset and duration.  Passwords and
+automation secrets in request and response bodies (as sent by
+#WebApi.add_user or #WebApi.add_automation_user, for example) are
+replaced with ``<redacted>``.
+
+This is an extension not present in the Check_MK API.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+import gzip
+import io
+import json
+import re
+import socket
+import threading
+import time
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from cmkclient.deadline import split_timeout
+from cmkclient.exception import CassetteMismatchError
+
+
+__all__ = ['RecordingPool', 'ReplayPool', 'recording']
+
+
+#: query parameters that identify the client, not the request
+_CREDENTIALS = ('_username', '_secret')
+
+#: fields of request and response bodies whose values are not written to cassettes
+_SECRET_FIELDS = ('password', 'automation_secret', 'secret')
+
+# a secret field and its string value, in JSON or Python literal syntax
+_SECRET_REGEX = re.compile(
+    r"""(["'](?:{0})["']\s*:\s*)u?("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')""".format('|'.join(_SECRET_FIELDS)))
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _query_params(url):
+    return dict(parse_qsl(urlsplit(url).query, keep_blank_values=True))
+
+
+def _text(data):
+    # `surrogateescape` lets arbitrary bytes round-trip through JSON
+    return (None if data is None else data.decode('utf-8', 'surrogateescape'))
+
+
+def _bytes(text):
+    return (None if text is None else text.encode('utf-8', 'surrogateescape'))
+
+
+def _redact(text, quoted=False):
+    """
+    Return body `text` with the values of secret fields replaced.
+
+    A `quoted` (URL-encoded) request body is decoded if, and only if, it
+    contains secrets, so that other requests are recorded verbatim.
+    """
+    if text is None or not any(field in text for field in _SECRET_FIELDS):
+        return text
+    if quoted:
+        text = unquote(text, errors='surrogateescape')
+    return _SECRET_REGEX.sub(r'\1"<redacted>"', text)
+
+
+class RecordingPool:
+    """
+    Connection pool wrapper that records every request and response to a cassette.
+
+    Responses are read in full before being handed to the client, so
+    streaming methods like #WebApi.iter_all_hosts lose their memory
+    advantage while recording.
+
+    # Arguments
+    pool (ConnectionPool): pool to send requests through
+    path (str): name of the cassette file to write; it is compressed if the name ends with ``.gz``
+
+    # Examples
+    ```python
+    api = WebApi(url, 'automation', 'secret', pool=RecordingPool(ConnectionPool(), 'traffic.jsonl.gz'))
+    ...
+    api.pool.close()
+    ```
+    """
+
+    def __init__(self, pool, path: str):
+        self.pool = pool
+        self.path = path
+        #: number of requests recorded
+        self.recorded = 0
+        self._file = _open(path, 'w')
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stats(self):
+        """
+        Return the statistics of the wrapped pool, plus the number of recorded requests.
+        """
+        return dict(self.pool.stats(), recorded=self.recorded)
+
+    @contextmanager
+    def request(self,
+                url: str,
+                data: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None,
+                timeout=None):
+        """
+        Send a request through the wrapped pool, record it, and yield the response.
+        """
+        started = time.monotonic()
+        with self.pool.request(url, data, headers, timeout) as response:
+            body = response.read()
+            status, reason = response.status, response.reason
+        elapsed = time.monotonic() - started
+
+        params = _query_params(url)
+        params.pop('_secret', None)
+        entry = {
+            'offset': round(started - self._start, 6),
+            'elapsed': round(elapsed, 6),
+            'action': params.get('action'),
+            'params': params,
+            'request': _redact(_text(data), quoted=True),
+            'status': status,
+            'reason': reason,
+            'response': _redact(_text(body)),
+        }
+        line = json.dumps(entry, separators=(',', ':'), sort_keys=True)
+        with self._lock:
+            self._file.write(line + '\n')
+            self.recorded += 1
+
+        yield ReplayResponse(status, reason, body)
+
+    def finish(self):
+        """
+        Finish writing the cassette, leaving the wrapped pool open.
+        """
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def close(self):
+        """
+        Finish writing the cassette and close the wrapped pool.
+        """
+        self.finish()
+        self.pool.close()
+
+
+@contextmanager
+def recording(api, path: str):
+    """
+    Record all requests made through `api` to cassette `path` while the `with` block runs.
+
+    # Examples
+    ```python
+    with recording(api, 'traffic.jsonl.gz'):
+        api.get_all_hosts()
+    ```
+    """
+    recorder = RecordingPool(api.pool, path)
+    api.pool = recorder
+    try:
+        yield recorder
+    finally:
+        api.pool = recorder.pool
+        recorder.finish()
+
+
+class ReplayResponse:
+    """
+    HTTP response served from a cassette; has the same interface as `http.client.HTTPResponse`.
+    """
+
+    def __init__(self, status: int, reason: str, body: bytes):
+        self.status = status
+        self.reason = reason
+        self.headers = {}  # type: Dict[str, str]
+        self._body = io.BytesIO(body)
+
+    def getheader(self, name, default=None):
+        return default
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        return self._body.read(amt)
+
+
+class ReplayPool:
+    """
+    Stand-in for #ConnectionPool that answers requests with the responses recorded in a cassette.
+
+    A request is answered with the next unused response recorded for
+    the same action, query parameters and body (credentials, including
+    secrets in the body, are ignored); the order of requests with different parameters does not
+    matter, so concurrent clients replay correctly.
+
+    # Arguments
+    path (str): name of the cassette file
+    timing (str): ``original`` to delay each response by the recorded
+        duration of its request, or ``fast`` to answer immediately
+    speed (float): with ``original`` timing, divide recorded durations by this factor
+    loop (bool): if True, start over with the first matching response once all have been used;
+        otherwise raise #CassetteMismatchError
+
+    # Examples
+    ```python
+    api = WebApi('http://replay/cmk', 'automation', 'unused', pool=ReplayPool('traffic.jsonl.gz', timing='fast'))
+    ```
+    """
+
+    def __init__(self, path: str, timing: str = 'original', speed: float = 1.0, loop: bool = False):
+        if timing not in ('original', 'fast'):
+            raise ValueError("timing must be 'original' or 'fast', not {0!r}".format(timing))
+        self.path = path
+        self.timing = timing
+        self.speed = speed
+        self.loop = loop
+
+        #: number of requests answered from the cassette
+        self.replayed = 0
+        #: number of requests without a matching recorded response
+        self.missing = 0
+
+        self._entries = {}  # type: Dict[Tuple, Deque[dict]]
+        self._lock = threading.Lock()
+        with _open(path, 'r') as cassette:
+            for line in cassette:
+                if line.strip():
+                    entry = json.loads(line)
+                    key = self._key(entry['params'], entry['request'])
+                    self._entries.setdefault(key, deque()).append(entry)
+
+    @staticmethod
+    def _key(params, request):
+        return (
+            tuple(sorted((name, value) for name, value in params.items() if name not in _CREDENTIALS)),
+            request,
+        )
+
+    def stats(self):
+        """
+        Return a dictionary with the replay counters.
+        """
+        with self._lock:
+            return {
+                'replayed': self.replayed,
+                'missing': self.missing,
+                'remaining': sum(len(entries) for entries in self._entries.values()),
+            }
+
+    @contextmanager
+    def request(self,
+                url: str,
+                data: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None,
+                timeout=None):
+        """
+        Yield the recorded response to a request.
+
+        With ``original`` timing, a recorded duration longer than the
+        read timeout makes the request time out after that timeout.
+
+        # Raises
+        CassetteMismatchError: if no recorded response matches
+        socket.timeout: if the recorded duration exceeds the read timeout
+        """
+        params = _query_params(url)
+        key = self._key(params, _redact(_text(data), quoted=True))
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.missing += 1
+                raise CassetteMismatchError(params.get('action'))
+            entry = entries.popleft()
+            if self.loop:
+                entries.append(entry)
+            self.replayed += 1
+
+        if self.timing == 'original':
+            delay = entry['elapsed'] / self.speed
+            _, read_timeout = split_timeout(timeout)
+            if read_timeout is not None and delay > read_timeout:
+                time.sleep(read_timeout)
+                raise socket.timeout('timed out')
+            time.sleep(delay)
+        yield ReplayResponse(entry['status'], entry['reason'], _bytes(entry['response']))
+
+    def close(self):
+        pass
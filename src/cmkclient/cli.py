@@ -15,15 +15,56 @@ Module that contains the command line app.
 #   Also see (1) from http://click.pocoo.org/5/setuptools/#setuptools-integration
 
 import os
+import sys
 
-from . import WebApi
+from . import SQLiteCache, WebApi
 
-from fire import Fire
+# `fire` (and `cmkclient.batch` or `cmkclient.export`) take longer to import
+# than most calls take to run, so they are imported only when needed; see `main()`
 
 
 __all__ = ['Cli', 'main']
 
 
+#: Commands that `main()` runs without Fire, with the number of string
+#: arguments each takes, in the order of the method's parameters
+_FAST_COMMANDS = {
+    'activate_changes': 0,
+    'add_host': 2,
+    'bake_agents': 0,
+    'batch': 1,
+    'delete_folder': 1,
+    'delete_host': 1,
+    'delete_user': 1,
+    'discover_services': 1,
+    'export_hosts': 1,
+    'get_all_contactgroups': 0,
+    'get_all_folders': 0,
+    'get_all_hostgroups': 0,
+    'get_all_hosts': 0,
+    'get_all_servicegroups': 0,
+    'get_all_users': 0,
+    'get_contactgroup': 1,
+    'get_folder': 1,
+    'get_host': 1,
+    'get_hostgroup': 1,
+    'get_hosts_by_folder': 1,
+    'get_hosttags': 0,
+    'get_ruleset': 1,
+    'get_rulesets_info': 0,
+    'get_servicegroup': 1,
+    'get_site': 1,
+    'get_user': 1,
+}
+
+#: options of the `Cli`:class: constructor
+_OPTIONS = ('url', 'username', 'secret', 'cache')
+
+#: arguments that Fire passes on as they are: bare words and paths, which
+#: are neither Python literals nor containers
+_PLAIN_ARGUMENT = r'[A-Za-z_/][A-Za-z0-9_./:-]*\Z'
+
+
 def _param(value: str, what: str, paramname: str, varname: str) -> str:
     if value:
         return value
@@ -50,15 +91,147 @@ class Cli(WebApi):
     invocation to provide the CheckMK endpoint and authentication values; if
     omitted, the corresponding values will be taken from environment variables
     ``CHECK_MK_URL``, ``CHECK_MK_USER`` and ``CHECK_MK_SECRET`` (respectively).
+
+    Option ``--cache`` (or environment variable ``CHECK_MK_CACHE``) names an
+    SQLite file in which the lists of hosts, folders, groups and users, and
+    the host tags, are kept for five minutes, so that invocations in quick
+    succession do not download them again.
     """
     def __init__(self,
                  url: str = None,
                  username: str = None,
-                 secret: str = None):
+                 secret: str = None,
+                 cache: str = None):
         url = _param(url, "CheckMK API URL", "url", "CHECK_MK_URL")
         username = _param(username, "CheckMK automation user name", "username", "CHECK_MK_USER")
         secret = _param(secret, "CheckMK automation secret", "secret", "CHECK_MK_SECRET")
-        super(Cli, self).__init__(url, username, secret)
+        cache = cache or os.environ.get('CHECK_MK_CACHE')
+        super(Cli, self).__init__(url, username, secret, cache=(SQLiteCache(cache) if cache else None))
+
+    def batch(self, commands: str = '-', workers: int = 1):
+        """
+        Run many Web API calls over a single connection, reading them as newline-delimited JSON.
+
+        Each line of `commands` is a JSON object like
+        ``{"id": 1, "method": "add_host", "args": ["host00"], "kwargs": {"folder": "web"}}``;
+        one JSON result line per command is written to standard output,
+        see `cmkclient.batch` for the format.
+
+        This is an extension not present in the Check_MK API.
+
+        # Arguments
+        commands (str): file to read commands from; ``-`` means standard input
+        workers (int): maximum number of commands running at the same time;
+            with more than one, results are written in completion order
+        """
+        from .batch import run_batch
+        if commands == '-':
+            run_batch(self, sys.stdin, sys.stdout, workers)
+        else:
+            with open(commands) as lines:
+                run_batch(self, lines, sys.stdout, workers)
+
+    def export_hosts(self,
+                     format: str = 'ndjson',  # pylint: disable=redefined-builtin
+                     columns=None,
+                     effective_attributes: bool = False,
+                     header: bool = True):
+        """
+        Write all hosts to standard output as they are received, one per line.
+
+        Unlike ``get_all_hosts``, hosts are written while the response is
+        still being downloaded, and never all held in memory, so the
+        output can be piped into tools like ``jq`` or ``cut``.
+
+        This is an extension not present in the Check_MK API.
+
+        # Arguments
+        format (str): ``ndjson`` for one JSON object per host, or ``csv`` or ``tsv``
+        columns (str): comma-separated CSV or TSV columns: ``hostname``, ``path``,
+            or any host attribute; default ``hostname,path,ipaddress,alias``
+        effective_attributes (bool): If True attributes with default values will be returned
+        header (bool): if True, start CSV and TSV output with a row of column names
+        """
+        from .export import write_hosts
+        try:
+            write_hosts(self.iter_all_hosts(effective_attributes), sys.stdout, format, columns, header)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # the reader (e.g., `head`) has had enough: stop quietly, and keep
+            # Python from complaining again when flushing at exit
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+
+
+def _fast_command(argv):
+    """
+    Parse command-line arguments `argv`, if they are a simple call of one of the `_FAST_COMMANDS`.
+
+    Return a tuple `(options, command, args)`, or `None` if Fire is needed
+    to run `argv`: for help, flags other than ``--url``, ``--username``,
+    ``--secret`` and ``--cache``, or arguments that Fire would turn into numbers,
+    booleans or containers.  Option values are always taken as strings.
+    """
+    options = {}
+    words = []
+    argv = iter(argv)
+    for arg in argv:
+        if arg.startswith('-'):
+            name, equals, value = arg[2:].partition('=')
+            if not arg.startswith('--') or name not in _OPTIONS or name in options:
+                return None
+            if not equals:
+                value = next(argv, None)
+                if value is None or value.startswith('-'):
+                    return None
+            options[name] = value
+        else:
+            words.append(arg)
+    if not words or words[0] not in _FAST_COMMANDS:
+        return None
+    command, args = words[0], words[1:]
+    if len(args) > _FAST_COMMANDS[command]:
+        return None
+    import re
+    for arg in args:
+        if arg in ('True', 'False', 'None') or not re.match(_PLAIN_ARGUMENT, arg):
+            return None
+    return options, command, args
+
+
+def _one_line(value):
+    if isinstance(value, str):
+        return value.replace('\n', ' ')
+    import json
+    try:
+        return json.dumps(value, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return str(value).replace('\n', ' ')
+
+
+def _print_result(result):
+    """
+    Print the result of a command in the same format as Fire.
+    """
+    if result is None:
+        return
+    if isinstance(result, dict):
+        # like Fire, hide "private" keys
+        visible = [(key, value) for key, value in result.items()
+                   if not (isinstance(key, str) and key.startswith('_'))]
+        if not visible:
+            print('{}')
+            return
+        width = max(len(str(key)) for key, _ in visible) + 1
+        for key, value in visible:
+            print('{0:{1}s} {2}'.format('{0}:'.format(key), width, _one_line(value)))
+    elif isinstance(result, (list, set, frozenset)):
+        for item in result:
+            print(_one_line(item))
+    elif isinstance(result, tuple):
+        print(_one_line(result))
+    else:
+        print(result)
 
 
 def main():
@@ -69,8 +242,19 @@ def main():
     on the `Cli`:class: object.  Help text is also taken from that class'
     docstrings.
 
+    The most common commands, called with plain arguments, are parsed
+    and their results printed directly, in the same way as Fire does, so
+    that one-shot invocations do not have to wait for `fire` to load.
+
     .. __: https://github.com/google/python-fire/blob/master/docs/guide.md
     """
+    fast = _fast_command(sys.argv[1:])
+    if fast is not None:
+        options, command, args = fast
+        _print_result(getattr(Cli(**options), command)(*args))
+        return
+
+    from fire import Fire
     # there is no documented way of passing a command-line arguments to
     # `Fire()`, so this `main()` methods takes no arguments and just lets
     # `Fire()` consume `sys.argv`.
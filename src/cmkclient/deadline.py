@@ -0,0 +1,102 @@
+"""
+Time budgets shared by all requests of a job.
+"""
+
+import time
+from typing import Optional, Tuple
+
+from cmkclient.exception import DeadlineExceeded
+
+
+__all__ = ['Deadline', 'split_timeout']
+
+
+def split_timeout(timeout) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Return the `(connect, read)` timeouts in seconds described by `timeout`.
+
+    # Arguments
+    timeout: either a number of seconds used for both timeouts,
+        a `(connect, read)` pair, or `None` for no timeout at all
+    """
+    if timeout is None:
+        return None, None
+    if isinstance(timeout, (tuple, list)):
+        connect, read = timeout
+        return connect, read
+    return timeout, timeout
+
+
+class Deadline:
+    """
+    Point in time by which a whole job, possibly made of many requests, must be done.
+
+    Pass the same #Deadline to every call of the job: each request's
+    connect and read timeouts are shortened to the time left, and bulk
+    methods stop sending requests once it has run out, raising
+    #DeadlineExceeded with what they achieved so far.
+
+    This is an extension not present in the Check_MK API.
+
+    # Arguments
+    seconds (float): time budget, starting now
+
+    # Examples
+    ```python
+    deadline = Deadline(15 * 60)
+    try:
+        api.add_hosts(hosts, deadline=deadline)
+        api.discover_services_for_all_hosts(workers=8, deadline=deadline)
+    except DeadlineExceeded as err:
+        print('stopped during', err.action, 'with', err.outcome)
+    ```
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    def __repr__(self):
+        return 'Deadline({0:.3f} of {1} seconds left)'.format(self.remaining(), self.seconds)
+
+    def remaining(self) -> float:
+        """
+        Return the number of seconds left, or 0 if the deadline has passed.
+        """
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self) -> bool:
+        """
+        Return `True` if the deadline has passed.
+        """
+        return time.monotonic() >= self.expires
+
+    def check(self, action: Optional[str] = None):
+        """
+        Raise #DeadlineExceeded if the deadline has passed.
+
+        # Arguments
+        action (str): action about to be started, reported in the exception
+        """
+        if self.expired():
+            raise DeadlineExceeded(action)
+
+    def clip(self, timeout, action: Optional[str] = None) -> Tuple[Optional[float], Optional[float]]:
+        """
+        Return the `(connect, read)` timeouts of `timeout`, shortened to the time left.
+
+        # Arguments
+        timeout: as accepted by #split_timeout
+        action (str): action about to be started, reported in the exception
+
+        # Raises
+        DeadlineExceeded: if no time is left
+        """
+        remaining = self.expires - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(action)
+        connect, read = split_timeout(timeout)
+        return (
+            (remaining if connect is None else min(connect, remaining)),
+            (remaining if read is None else min(read, remaining)),
+        )
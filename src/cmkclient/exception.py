@@ -43,3 +43,45 @@ class AuthenticationError(Error):
     Raised when the Check_Mk Web API responds with an authentication error.
     """
     pass
+
+
+class CassetteMismatchError(Error):
+    """
+    Raised when a replayed request has no matching recorded response.
+
+    # Arguments
+    action (str): Web API action of the request
+    """
+    def __init__(self, action):
+        super().__init__("No recorded response left for action {0!r}".format(action))
+        self.action = action
+
+
+class DeadlineExceeded(Error):
+    """
+    Raised when the time budget given by a #Deadline runs out.
+
+    # Arguments
+    action (str): Web API action that was running, or about to be sent, when time ran out
+    outcome: what the interrupted bulk operation achieved so far, in the form of its
+        usual return value; `None` if the deadline expired on a single request
+    """
+    def __init__(self, action, outcome=None):
+        super().__init__("Deadline exceeded during action {0!r}".format(action))
+        self.action = action
+        self.outcome = outcome
+
+
+class MultiSiteError(Error):
+    """
+    Raised when a call made on several sites failed on some of them.
+
+    # Arguments
+    errors (dict): exception raised on each failed site, by site name
+    outcome (MultiSiteResult): outcome of the call on every site
+    """
+    def __init__(self, errors, outcome=None):
+        super().__init__("Failed on sites: {0}".format(', '.join(
+            '{0} ({1!r})'.format(site, error) for site, error in sorted(errors.items()))))
+        self.errors = errors
+        self.outcome = outcome
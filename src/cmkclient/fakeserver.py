@@ -0,0 +1,734 @@
+"""
+In-process stand-in for the Check_MK Web API, for tests and benchmarks.
+
+#FakeServer serves the ``webapi.py`` protocol over HTTP on localhost and
+keeps all configuration in memory (see #FakeSite), so the client can be
+tested and measured without a Check_MK installation.  Only the behaviour
+that matters to this client is modelled: hosts, folders, groups, users,
+rule sets, host tags, sites, service discovery, and change activation.
+
+This is an extension not present in the Check_MK API.
+"""
+
+from collections import Counter
+import copy
+import functools
+import gzip
+import hashlib
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import random
+import re
+from socketserver import ThreadingMixIn
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, unquote_plus, urlsplit
+import zlib
+
+from cmkclient import pyliteral
+
+
+__all__ = ['FakeSite', 'FakeServer']
+
+
+# `{add,edit,delete}_{contact,host,service}group` and `get_all_{contact,host,service}groups`
+_GROUP_ACTION = re.compile(r'(add|edit|delete|get_all)_(contact|host|service)groups?$')
+
+
+class _ActionError(Exception):
+    """
+    Raised by action handlers; reported with result code 1.
+    """
+    pass
+
+
+def _config_hash(obj):
+    return hashlib.md5(json.dumps(obj, sort_keys=True, default=repr).encode()).hexdigest()
+
+
+def _check_hash(request, current):
+    expected = request.get('configuration_hash')
+    if expected and expected != current:
+        raise _ActionError(
+            'Check_MK exception: The configuration has changed in the meantime. '
+            'You need to load the configuration and start another update.')
+
+
+class FakeSite:
+    """
+    In-memory configuration of a Check_MK site, and the Web API actions working on it.
+
+    The state is exposed as plain attributes (`hosts`, `folders`,
+    `groups`, `users`, `rulesets`, `hosttags`, `sites`), so that tests can
+    set it up or inspect it directly.
+
+    # Arguments
+    site_id (str): ID of the (local) site
+    username (str): name of the automation user
+    version (str): Check_MK version to emulate; bulk host actions are missing before 1.5.0
+    services_per_host (int): number of services found by the first discovery of a host
+    """
+
+    def __init__(self,
+                 site_id: str = 'cmk',
+                 username: str = 'automation',
+                 version: str = '1.6.0',
+                 services_per_host: int = 3):
+        self.site_id = site_id
+        self.username = username
+        self.version = tuple(int(part) for part in re.findall(r'\d+', version)[:3])
+        self.services_per_host = services_per_host
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """
+        Restore the configuration of a freshly created site.
+        """
+        with self.lock:
+            self.hosts = {}  # type: Dict[str, Dict[str, Any]]
+            self.folders = {'': {}}  # type: Dict[str, Dict[str, Any]]
+            self.groups = {
+                'contactgroup': {'all': {'alias': 'Everything'}},
+                'hostgroup': {},
+                'servicegroup': {},
+            }  # type: Dict[str, Dict[str, Dict[str, Any]]]
+            self.users = {
+                'cmkadmin': {'alias': 'cmkadmin', 'roles': ['admin'], 'contactgroups': ['all'], 'locked': False},
+                self.username: {
+                    'alias': 'Check_MK Automation - used for calling web services',
+                    'roles': ['admin'],
+                    'contactgroups': [],
+                    'locked': False,
+                },
+            }  # type: Dict[str, Dict[str, Any]]
+            self.rulesets = {
+                'checkgroup_parameters:hw_fans_perc': {
+                    '': [{'value': {'levels_lower': (10.0, 5.0)}, 'condition': {}, 'options': {}}],
+                },
+                'host_groups': {},
+                'extra_host_conf:notification_options': {},
+            }  # type: Dict[str, Dict[str, Any]]
+            self.hosttags = {
+                'tag_groups': [{
+                    'id': 'agent',
+                    'title': 'Agent type',
+                    'tags': [
+                        {'id': 'cmk-agent', 'title': 'Check_MK Agent (Server)', 'aux_tags': ['tcp']},
+                        {'id': 'no-agent', 'title': 'No agent', 'aux_tags': []},
+                    ],
+                }],
+                'aux_tags': [{'id': 'tcp', 'title': 'TCP'}],
+            }  # type: Dict[str, Any]
+            self.sites = {
+                self.site_id: {
+                    'alias': 'Local site ' + self.site_id,
+                    'socket': ('local', None),
+                    'disable_wato': True,
+                    'disabled': False,
+                    'insecure': False,
+                    'multisiteurl': '',
+                    'persist': False,
+                    'replicate_ec': False,
+                    'replication': None,
+                    'timeout': 5,
+                    'user_login': True,
+                },
+            }  # type: Dict[str, Dict[str, Any]]
+            #: number of services of each host, as of the last discovery
+            self.services = {}  # type: Dict[str, int]
+            #: sites with changes waiting to be activated
+            self.pending_sites = set()
+            #: number of successful `activate_changes` calls
+            self.activations = 0
+
+    def populate(self, hosts: int, folders: int = 0, attributes: Optional[Dict[str, Any]] = None):
+        """
+        Add `hosts` hosts named ``host000000``, ``host000001``, ..., spread over `folders` folders.
+
+        Unlike adding hosts through the Web API, this creates no pending changes.
+        """
+        with self.lock:
+            names = ['folder{0:04}'.format(n) for n in range(folders)] or ['']
+            for name in names:
+                self.folders.setdefault(name, {})
+            for n in range(hosts):
+                hostname = 'host{0:06}'.format(n)
+                self.hosts[hostname] = {
+                    'hostname': hostname,
+                    'path': names[n % len(names)],
+                    'attributes': dict(attributes or {}),
+                }
+
+    def handle(self, action: str, params: Dict[str, str], request: Any):
+        """
+        Run `action` and return its result.
+
+        # Raises
+        _ActionError: if the action fails
+        """
+        match = _GROUP_ACTION.match(action)
+        if match and (match.group(1) == 'get_all') == action.endswith('s'):
+            handler = functools.partial(self._group_action, *match.groups())
+        else:
+            handler = getattr(self, '_action_' + action, None)
+        if handler is None or (action in ('add_hosts', 'edit_hosts', 'delete_hosts') and self.version < (1, 5)):
+            raise _ActionError('Check_MK exception: Unknown API action ' + action)
+        with self.lock:
+            result = handler(params, request or {})
+            if action.startswith(('add_', 'edit_', 'delete_', 'set_')) or action == 'discover_services':
+                self.pending_sites.update(self._affected_sites(action, request or {}))
+            return result
+
+    def _affected_sites(self, action, request):
+        if action in ('add_host', 'edit_host') and request.get('attributes', {}).get('site'):
+            return [request['attributes']['site']]
+        return [self.site_id]
+
+    #
+    # hosts
+    #
+
+    def _effective_attributes(self, path, attributes):
+        result = {'site': self.site_id, 'tag_agent': 'cmk-agent'}
+        parts = path.split('/') if path else []
+        for depth in range(len(parts) + 1):
+            result.update(self.folders.get('/'.join(parts[:depth]), {}))
+        result.update(attributes)
+        return result
+
+    def _host_view(self, host, effective):
+        view = copy.deepcopy(host)
+        if effective:
+            view['attributes'] = self._effective_attributes(host['path'], host['attributes'])
+        return view
+
+    def _add_host(self, request):
+        hostname = request['hostname']
+        if hostname in self.hosts:
+            raise _ActionError('Check_MK exception: Host {0} already exists in the folder {1}'.format(
+                hostname, self.hosts[hostname]['path']))
+        folder = request.get('folder', '').strip('/')
+        self._create_folder(folder, parents=True, exist_ok=True)
+        self.hosts[hostname] = {
+            'hostname': hostname,
+            'path': folder,
+            'attributes': dict(request.get('attributes') or {}),
+        }
+
+    def _edit_host(self, request):
+        host = self._get_host(request['hostname'])
+        host['attributes'].update(request.get('attributes') or {})
+        for name in request.get('unset_attributes') or []:
+            host['attributes'].pop(name, None)
+
+    def _get_host(self, hostname):
+        try:
+            return self.hosts[hostname]
+        except KeyError:
+            raise _ActionError('Check_MK exception: No such host')
+
+    def _bulk(self, operation, hosts):
+        succeeded, failed = [], {}
+        for request in hosts:
+            try:
+                operation(request)
+                succeeded.append(request['hostname'])
+            except _ActionError as err:
+                failed[request['hostname']] = str(err)
+        return {'succeeded_hosts': succeeded, 'failed_hosts': failed}
+
+    def _action_add_host(self, params, request):
+        self._add_host(request)
+
+    def _action_add_hosts(self, params, request):
+        return self._bulk(self._add_host, request['hosts'])
+
+    def _action_edit_host(self, params, request):
+        self._edit_host(request)
+
+    def _action_edit_hosts(self, params, request):
+        return self._bulk(self._edit_host, request['hosts'])
+
+    def _action_get_host(self, params, request):
+        return self._host_view(self._get_host(request['hostname']), params.get('effective_attributes') == '1')
+
+    def _action_get_all_hosts(self, params, request):
+        effective = params.get('effective_attributes') == '1'
+        return {hostname: self._host_view(host, effective) for hostname, host in self.hosts.items()}
+
+    def _action_delete_host(self, params, request):
+        self._get_host(request['hostname'])
+        del self.hosts[request['hostname']]
+        self.services.pop(request['hostname'], None)
+
+    def _action_delete_hosts(self, params, request):
+        for hostname in request['hostnames']:
+            self._get_host(hostname)
+        for hostname in request['hostnames']:
+            del self.hosts[hostname]
+            self.services.pop(hostname, None)
+
+    def _action_discover_services(self, params, request):
+        self._get_host(request['hostname'])
+        mode = params.get('mode', 'new')
+        current = self.services.get(request['hostname'], 0)
+        found = self.services_per_host
+        if mode == 'refresh':
+            added, removed, kept = found, current, 0
+        elif mode == 'remove':
+            added, removed, kept = 0, max(current - found, 0), min(current, found)
+        else:
+            added, removed, kept = max(found - current, 0), 0, current
+            if mode == 'fixall':
+                removed, kept = max(current - found, 0), min(current, found)
+        total = added + kept
+        self.services[request['hostname']] = total
+        return ('Service discovery successful. Added {0}, removed {1}, kept {2}, '
+                'total {3} services and 0 new host labels'.format(added, removed, kept, total))
+
+    #
+    # folders
+    #
+
+    def _create_folder(self, folder, parents, exist_ok=False, attributes=None):
+        if folder in self.folders:
+            if exist_ok:
+                return
+            raise _ActionError('Check_MK exception: The folder {0} already exists'.format(folder))
+        parent = folder.rpartition('/')[0]
+        if parent not in self.folders:
+            if not parents:
+                raise _ActionError('Check_MK exception: The folder {0} does not exist'.format(parent))
+            self._create_folder(parent, parents, exist_ok=True)
+        self.folders[folder] = dict(attributes or {})
+
+    def _get_folder(self, folder):
+        folder = folder.strip('/')
+        if folder not in self.folders:
+            raise _ActionError('Check_MK exception: The folder {0} does not exist'.format(folder))
+        return folder
+
+    def _action_get_folder(self, params, request):
+        folder = self._get_folder(request['folder'])
+        attributes = self.folders[folder]
+        if params.get('effective_attributes') == '1':
+            attributes = self._effective_attributes(folder, {})
+        return {'attributes': copy.deepcopy(attributes), 'configuration_hash': _config_hash(self.folders[folder])}
+
+    def _action_get_all_folders(self, params, request):
+        return copy.deepcopy(self.folders)
+
+    def _action_add_folder(self, params, request):
+        self._create_folder(request['folder'].strip('/'), request.get('create_parent_folders', '1') == '1',
+                            attributes=request.get('attributes'))
+
+    def _action_edit_folder(self, params, request):
+        folder = self._get_folder(request['folder'])
+        _check_hash(request, _config_hash(self.folders[folder]))
+        self.folders[folder].update(request.get('attributes') or {})
+
+    def _action_delete_folder(self, params, request):
+        folder = self._get_folder(request['folder'])
+        if not folder:
+            raise _ActionError('Check_MK exception: You cannot delete the root folder')
+        for name in [name for name in self.folders if name == folder or name.startswith(folder + '/')]:
+            del self.folders[name]
+        for hostname in [hostname for hostname, host in self.hosts.items()
+                         if host['path'] == folder or host['path'].startswith(folder + '/')]:
+            del self.hosts[hostname]
+
+    #
+    # groups
+    #
+
+    def _group_action(self, operation, kind, params, request):
+        groups = self.groups[kind + 'group']
+        if operation == 'get_all':
+            return copy.deepcopy(groups)
+        name = request['groupname']
+        if operation == 'add':
+            if name in groups:
+                raise _ActionError('Check_MK exception: Group name {0} already exists'.format(name))
+            groups[name] = {'alias': request['alias']}
+        elif name not in groups:
+            raise _ActionError('Check_MK exception: Unknown group: {0}'.format(name))
+        elif operation == 'edit':
+            groups[name]['alias'] = request['alias']
+        else:
+            del groups[name]
+
+    #
+    # users
+    #
+
+    def _action_get_all_users(self, params, request):
+        return copy.deepcopy(self.users)
+
+    def _action_add_users(self, params, request):
+        for user_id in request['users']:
+            if user_id in self.users:
+                raise _ActionError('Check_MK exception: User {0} already exists'.format(user_id))
+        for user_id, attributes in request['users'].items():
+            attributes = dict(attributes)
+            # secrets are never reported back
+            attributes.pop('password', None)
+            attributes.pop('automation_secret', None)
+            self.users[user_id] = dict({'roles': ['user'], 'contactgroups': [], 'locked': False}, **attributes)
+
+    def _action_edit_users(self, params, request):
+        for user_id in request['users']:
+            if user_id not in self.users:
+                raise _ActionError('Check_MK exception: Unknown user: {0}'.format(user_id))
+        for user_id, changes in request['users'].items():
+            user = self.users[user_id]
+            user.update(changes.get('set_attributes') or {})
+            for name in changes.get('unset_attributes') or []:
+                user.pop(name, None)
+
+    def _action_delete_users(self, params, request):
+        for user_id in request['users']:
+            if user_id not in self.users:
+                raise _ActionError('Check_MK exception: Unknown user: {0}'.format(user_id))
+        for user_id in request['users']:
+            del self.users[user_id]
+
+    #
+    # rule sets
+    #
+
+    def _get_ruleset(self, name):
+        try:
+            return self.rulesets[name]
+        except KeyError:
+            raise _ActionError('Check_MK exception: Unknown ruleset: {0}'.format(name))
+
+    def _action_get_ruleset(self, params, request):
+        ruleset = self._get_ruleset(request['ruleset_name'])
+        return {'ruleset': copy.deepcopy(ruleset), 'configuration_hash': _config_hash(ruleset)}
+
+    def _action_get_rulesets_info(self, params, request):
+        return {
+            name: {
+                'title': name,
+                'help': None,
+                'number_of_rules': sum(len(rules) for rules in ruleset.values()),
+            }
+            for name, ruleset in self.rulesets.items()
+        }
+
+    def _action_set_ruleset(self, params, request):
+        name = request['ruleset_name']
+        _check_hash(request, _config_hash(self._get_ruleset(name)))
+        ruleset = dict(request.get('ruleset') or {})
+        _check_hash(ruleset, _config_hash(self.rulesets[name]))
+        ruleset.pop('configuration_hash', None)
+        for folder in ruleset:
+            self._get_folder(folder)
+        self.rulesets[name] = copy.deepcopy(ruleset)
+
+    #
+    # host tags
+    #
+
+    def _action_get_hosttags(self, params, request):
+        return dict(copy.deepcopy(self.hosttags), configuration_hash=_config_hash(self.hosttags))
+
+    def _action_set_hosttags(self, params, request):
+        _check_hash(request, _config_hash(self.hosttags))
+        if 'tag_groups' not in request or 'aux_tags' not in request:
+            raise _ActionError("Check_MK exception: Missing required key 'tag_groups' or 'aux_tags'")
+        ids = set()
+        for group in request['tag_groups']:
+            for item in [group] + list(group.get('tags') or []):
+                if not item.get('id') or item['id'] in ids:
+                    raise _ActionError('Check_MK exception: Invalid or duplicate tag ID {0!r}'.format(item.get('id')))
+                ids.add(item['id'])
+        self.hosttags = {'tag_groups': copy.deepcopy(request['tag_groups']),
+                         'aux_tags': copy.deepcopy(request['aux_tags'])}
+
+    #
+    # sites
+    #
+
+    def _get_site(self, site_id):
+        try:
+            return self.sites[site_id]
+        except KeyError:
+            raise _ActionError('Check_MK exception: Site {0} does not exist'.format(site_id))
+
+    def _action_get_site(self, params, request):
+        site = self._get_site(request['site_id'])
+        return {
+            'site_id': request['site_id'],
+            'site_config': copy.deepcopy(site),
+            'configuration_hash': _config_hash(site),
+        }
+
+    def _action_set_site(self, params, request):
+        if request['site_id'] in self.sites:
+            _check_hash(request, _config_hash(self.sites[request['site_id']]))
+        self.sites[request['site_id']] = copy.deepcopy(request['site_config'])
+
+    def _action_delete_site(self, params, request):
+        self._get_site(request['site_id'])
+        del self.sites[request['site_id']]
+
+    def _action_login_site(self, params, request):
+        self._get_site(request['site_id'])
+
+    def _action_logout_site(self, params, request):
+        self._get_site(request['site_id'])
+
+    #
+    # activation and agents
+    #
+
+    def _action_activate_changes(self, params, request):
+        mode = params.get('mode', 'dirty')
+        if mode == 'specific':
+            sites = set(request.get('sites') or [])
+            for site_id in sites:
+                self._get_site(site_id)
+        elif mode == 'all':
+            sites = set(self.sites)
+        else:
+            sites = set(self.pending_sites)
+        sites &= self.pending_sites
+        if not sites:
+            raise _ActionError('Check_MK exception: Currently there are no changes to activate.')
+        self.pending_sites -= sites
+        self.activations += 1
+        now = time.time()
+        return {
+            'sites': {
+                site_id: {
+                    '_site_id': site_id,
+                    '_phase': 'done',
+                    '_state': 'success',
+                    '_status_text': 'Success',
+                    '_status_details': '',
+                    '_time_started': now,
+                    '_time_ended': now,
+                    '_warnings': [],
+                }
+                for site_id in sorted(sites)
+            },
+        }
+
+    def _action_bake_agents(self, params, request):
+        return None
+
+
+class _HTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # many concurrent clients connect at once in benchmarks
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            # the client gave up waiting, e.g. because of a timeout
+            return
+        super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeCheckMK'
+    # headers and body are written separately: avoid delayed-ACK stalls
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.fake.serve(self, b'')
+
+    def do_POST(self):
+        self.server.fake.serve(self, self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeServer:
+    """
+    Serve a #FakeSite over HTTP on localhost, in a background thread.
+
+    Besides the site's behaviour, latency and errors can be injected:
+
+    * `latency` seconds are added to every request, and `action_latency`
+      adds per-action delays (e.g., ``{'discover_services': 0.5}``);
+    * with probability `error_rate`, a request fails with HTTP status 500;
+    * #FakeServer.fail_next makes the next requests of an action fail.
+
+    # Arguments
+    site (FakeSite): configuration to serve; a new #FakeSite is created if `None`
+    username (str): name of the automation user accepted by the server
+    secret (str): secret of the automation user
+    latency (float): seconds to wait before answering each request
+    action_latency (dict): additional seconds to wait, by action
+    error_rate (float): probability (0 to 1) that a request fails with HTTP status 500
+    seed (int): seed for the random error injection
+    compress (bool): if True, compress responses when the client accepts it
+
+    # Examples
+    ```python
+    with FakeServer() as server:
+        api = server.api()
+        api.add_host('host00')
+        assert 'host00' in server.site.hosts
+    ```
+    """
+
+    def __init__(self,
+                 site: Optional[FakeSite] = None,
+                 username: str = 'automation',
+                 secret: str = 'automation-secret',
+                 latency: float = 0.0,
+                 action_latency: Optional[Dict[str, float]] = None,
+                 error_rate: float = 0.0,
+                 seed: Optional[int] = None,
+                 compress: bool = True):
+        self.site = (site if site is not None else FakeSite(username=username))
+        self.username = username
+        self.secret = secret
+        self.latency = latency
+        self.action_latency = dict(action_latency or {})
+        self.error_rate = error_rate
+        self.compress = compress
+
+        #: number of requests served, by action
+        self.requests = Counter()  # type: Counter
+
+        self._random = random.Random(seed)
+        self._failures = {}  # type: Dict[str, list]
+        self._lock = threading.Lock()
+        self._server = None  # type: Optional[_HTTPServer]
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """
+        Start serving on a free port of 127.0.0.1; return `self`.
+        """
+        self._server = _HTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.fake = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={'poll_interval': 0.05}, name='cmkclient-fakeserver', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = self._thread = None
+
+    @property
+    def url(self):
+        """
+        URL of the site, to be passed to #WebApi.
+        """
+        return 'http://127.0.0.1:{0}/{1}'.format(self._server.server_port, self.site.site_id)
+
+    def api(self, **kwargs):
+        """
+        Return a #WebApi for this server; `kwargs` are passed on to its constructor.
+        """
+        from cmkclient import WebApi
+        return WebApi(self.url, self.username, self.secret, **kwargs)
+
+    def fail_next(self, action: str, count: int = 1, status: Optional[int] = None, message: Optional[str] = None):
+        """
+        Make the next `count` requests for `action` fail.
+
+        # Arguments
+        action (str): name of the action
+        count (int): number of requests to fail
+        status (int): HTTP status code to answer with; if `None`, answer
+            with result code 1 (a #ResultError on the client side)
+        message (str): error message
+        """
+        with self._lock:
+            self._failures.setdefault(action, []).extend([(status, message or 'Injected error')] * count)
+
+    #
+    # request handling
+    #
+
+    def serve(self, handler, body):
+        """
+        Answer one request received by `handler`.
+        """
+        params = {name: values[0] for name, values in parse_qs(urlsplit(handler.path).query).items()}
+        action = params.get('action', '')
+
+        with self._lock:
+            self.requests[action] += 1
+            failures = self._failures.get(action)
+            failure = (failures.pop(0) if failures else None)
+            if failure is None and self.error_rate and self._random.random() < self.error_rate:
+                failure = (500, 'Injected error')
+
+        delay = self.latency + self.action_latency.get(action, 0.0)
+        if delay:
+            time.sleep(delay)
+
+        if params.get('_username') != self.username or params.get('_secret') != self.secret:
+            return self._reply(handler, 200, 'Authentication error: Invalid automation secret for user {0}'.format(
+                params.get('_username')).encode())
+        if failure is not None and failure[0] is not None:
+            return self._reply(handler, failure[0], failure[1].encode())
+
+        if failure is not None:
+            result, result_code = failure[1], 1
+        else:
+            try:
+                request = self._parse_request(body, params.get('request_format', 'json'))
+                result, result_code = self.site.handle(action, params, request), 0
+            except _ActionError as err:
+                result, result_code = str(err), 1
+            except (KeyError, TypeError, ValueError) as err:
+                result, result_code = 'Check_MK exception: Invalid request: {0!r}'.format(err), 1
+
+        reply = {'result': result, 'result_code': result_code}
+        if params.get('output_format') == 'python':
+            data = repr(reply).encode()
+        else:
+            data = json.dumps(reply).encode()
+        self._reply(handler, 200, data)
+
+    @staticmethod
+    def _parse_request(body, request_format):
+        if not body:
+            return None
+        text = unquote_plus(body.decode())
+        if not text.startswith('request='):
+            raise ValueError('missing request parameter')
+        text = text[len('request='):]
+        if request_format == 'python':
+            return pyliteral.loads(text)
+        return json.loads(text)
+
+    def _reply(self, handler, status, data):
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'text/plain; charset=utf-8')
+        accepted = handler.headers.get('Accept-Encoding', '')
+        if self.compress and 'gzip' in accepted:
+            data = gzip.compress(data, compresslevel=1)
+            handler.send_header('Content-Encoding', 'gzip')
+        elif self.compress and 'deflate' in accepted:
+            data = zlib.compress(data, 1)
+            handler.send_header('Content-Encoding', 'deflate')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
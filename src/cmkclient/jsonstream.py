@@ -0,0 +1,157 @@
+"""
+Incremental decoding of large JSON responses from the Check_MK Web API.
+
+The Web API wraps every answer in an object like
+``{"result": ..., "result_code": 0}``; when ``result`` is itself a large
+object (e.g., the output of ``get_all_hosts``), its members can be decoded
+and handed out one by one while the response is still being received,
+without ever holding the whole document in memory.
+"""
+
+import codecs
+import json
+from typing import Any, Iterable, Iterator, Tuple
+
+from cmkclient.exception import ResultError
+
+
+__all__ = ['iter_result_items']
+
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _Reader:
+    """
+    Buffer over an iterable of byte chunks, decoded as UTF-8.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._decode = json.JSONDecoder().raw_decode
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """
+        Append the next chunk to the buffer; return `False` at end of input.
+        """
+        if self.eof:
+            return False
+        try:
+            chunk = next(self._chunks)
+            text = self._decoder.decode(chunk)
+        except StopIteration:
+            text = self._decoder.decode(b'', final=True)
+            self.eof = True
+        # drop the already-consumed part of the buffer
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Skip whitespace and return the next character, or '' at end of input.
+        """
+        while True:
+            buf, pos = self.buf, self.pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        """
+        Consume the next non-whitespace character, which must be one of `chars`.
+        """
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError("Expected one of {0!r} at offset {1}, got {2!r}".format(chars, self.pos, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """
+        Decode and consume the next JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decode(self.buf, self.pos)
+            except ValueError:
+                # the value may be incomplete: read more and retry
+                if self.fill():
+                    continue
+                raise
+            if end == len(self.buf) and not self.eof:
+                # a number at the end of the buffer may continue in the next chunk
+                if self.fill():
+                    continue
+            self.pos = end
+            return value
+
+
+def iter_result_items(chunks: Iterable[bytes]) -> Iterator[Tuple[str, Any]]:
+    """
+    Yield the members of the ``result`` object of a Web API response, as they are decoded.
+
+    The ``result_code`` is checked as soon as it is seen: if it comes
+    after ``result``, an error is only raised after all members have
+    been yielded.
+
+    # Arguments
+    chunks (iterable): the response body, as a sequence of byte strings
+
+    # Raises
+    ResultError: when CheckMK's own result code is != 0
+    ValueError: when the body is not valid JSON or lacks ``result`` or ``result_code``
+    """
+    reader = _Reader(chunks)
+    reader.expect('{')
+    result = None
+    have_result = False
+    result_code = None
+    have_code = False
+
+    if reader.peek() != '}':
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            if key == 'result' and reader.peek() == '{' and (not have_code or result_code == 0):
+                reader.expect('{')
+                if reader.peek() != '}':
+                    while True:
+                        name = reader.value()
+                        reader.expect(':')
+                        yield name, reader.value()
+                        if reader.expect(',}') == '}':
+                            break
+                else:
+                    reader.expect('}')
+                have_result = True
+            elif key == 'result':
+                result = reader.value()
+                have_result = True
+            elif key == 'result_code':
+                result_code = reader.value()
+                have_code = True
+            else:
+                reader.value()
+            if reader.expect(',}') == '}':
+                break
+    else:
+        reader.expect('}')
+
+    if reader.peek():
+        raise ValueError("Extra data after JSON object at offset {0}".format(reader.pos))
+    if not (have_result and have_code):
+        raise ValueError("Response lacks 'result' or 'result_code'")
+    if result_code != 0:
+        raise ResultError(result_code, result)
+    if result is not None and not isinstance(result, dict):
+        raise ValueError("Result is not a JSON object")
@@ -0,0 +1,266 @@
+"""
+Request hooks data and latency metrics for the Check_MK Web API client.
+
+This is an extension not present in the Check_MK API.
+"""
+
+from bisect import bisect_left
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+
+__all__ = ['RequestInfo', 'LatencyHistogram', 'MetricsCollector']
+
+
+class RequestInfo:
+    """
+    Details of one request sent to the Check_MK Web API, as passed to request hooks.
+
+    Hooks registered with #WebApi.add_request_hook as `before` only see
+    the fields known before the request is sent; the others are `None`.
+
+    # Attributes
+    web_api_base (str): URL of the ``webapi.py`` the request was sent to
+    action (str): name of the Web API action
+    request_bytes (int): size of the request body
+    response_bytes (int): size of the (decompressed) response body
+    status (int): HTTP status code
+    result_code (int): Check_MK's own result code; 0 on success
+    started (float): `time.monotonic()` when the request was started
+    elapsed (float): wall time of the request, in seconds
+    error (Exception): exception raised by the request, if any
+    """
+
+    __slots__ = (
+        'web_api_base', 'action', 'request_bytes', 'response_bytes',
+        'status', 'result_code', 'started', 'elapsed', 'error',
+    )
+
+    def __init__(self, web_api_base: str, action: str, request_bytes: int):
+        self.web_api_base = web_api_base
+        self.action = action
+        self.request_bytes = request_bytes
+        self.response_bytes = None  # type: Optional[int]
+        self.status = None  # type: Optional[int]
+        self.result_code = None  # type: Optional[int]
+        self.started = time.monotonic()
+        self.elapsed = None  # type: Optional[float]
+        self.error = None  # type: Optional[Exception]
+
+    def __repr__(self):
+        return '<RequestInfo {0} status={1} result_code={2} elapsed={3}>'.format(
+            self.action, self.status, self.result_code, self.elapsed)
+
+
+#: default upper bounds (in seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+
+class LatencyHistogram:
+    """
+    Histogram of durations with fixed bucket boundaries.
+
+    Quantiles are estimated by linear interpolation within the bucket
+    they fall in, so memory use does not grow with the number of
+    observations.
+
+    # Arguments
+    buckets (list): increasing upper bounds of the buckets, in seconds;
+        a last bucket for larger values is always added
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None  # type: Optional[float]
+        self.max = None  # type: Optional[float]
+
+    def observe(self, value: float):
+        """
+        Add one duration to the histogram.
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Return an estimate of the `q`-quantile (e.g., 0.95), or `None` if the histogram is empty.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = (self.bounds[index - 1] if index else 0.0)
+                upper = (self.bounds[index] if index < len(self.bounds) else self.max)
+                lower = max(lower, self.min)
+                upper = min(upper, self.max)
+                return lower + (upper - lower) * max(rank - seen, 0) / count
+            seen += count
+        return self.max
+
+
+class _ActionStats:
+
+    def __init__(self, buckets):
+        self.latency = LatencyHistogram(buckets)
+        self.errors = 0
+        self.result_errors = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsCollector:
+    """
+    Collect per-action request counts, error counts, sizes and latency histograms.
+
+    # Arguments
+    buckets (list): upper bounds of the latency histogram buckets, in seconds
+
+    # Examples
+    ```python
+    metrics = MetricsCollector()
+    metrics.attach(api)
+    api.get_all_hosts()
+    print(metrics.as_dict()['get_all_hosts']['p95'])
+    metrics.write_openmetrics('/var/lib/node_exporter/cmkclient.prom')
+    ```
+    """
+
+    #: prefix of the metric names in the OpenMetrics output
+    namespace = 'cmkclient'
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._actions = {}  # type: Dict[str, _ActionStats]
+        self._lock = threading.Lock()
+
+    def attach(self, api):
+        """
+        Record the requests made through `api`.
+        """
+        api.add_request_hook(after=self.record)
+
+    def detach(self, api):
+        """
+        Stop recording the requests made through `api`.
+        """
+        api.remove_request_hook(after=self.record)
+
+    def record(self, info: RequestInfo):
+        """
+        Account for a finished request.
+
+        This is the `after` hook installed by #MetricsCollector.attach.
+        """
+        with self._lock:
+            stats = self._actions.get(info.action)
+            if stats is None:
+                stats = self._actions[info.action] = _ActionStats(self.buckets)
+            stats.latency.observe(info.elapsed)
+            if info.error is not None:
+                stats.errors += 1
+                if info.result_code:
+                    stats.result_errors += 1
+            stats.request_bytes += info.request_bytes
+            stats.response_bytes += (info.response_bytes or 0)
+
+    def reset(self):
+        """
+        Forget all recorded requests.
+        """
+        with self._lock:
+            self._actions = {}
+
+    def as_dict(self):
+        """
+        Return the collected metrics as a dictionary keyed by action name.
+
+        For each action, the value is a dictionary with the number of
+        requests (``count``), the number of failed ones (``errors``, of
+        which ``result_errors`` had a non-zero Check_MK result code),
+        the total (``seconds``), estimated ``p50``, ``p95`` and ``p99``,
+        and ``max`` latency in seconds, and the total request and response
+        sizes in bytes.
+        """
+        with self._lock:
+            return {
+                action: {
+                    'count': stats.latency.count,
+                    'errors': stats.errors,
+                    'result_errors': stats.result_errors,
+                    'seconds': stats.latency.sum,
+                    'p50': stats.latency.quantile(0.50),
+                    'p95': stats.latency.quantile(0.95),
+                    'p99': stats.latency.quantile(0.99),
+                    'max': stats.latency.max,
+                    'request_bytes': stats.request_bytes,
+                    'response_bytes': stats.response_bytes,
+                }
+                for action, stats in sorted(self._actions.items())
+            }
+
+    def to_openmetrics(self) -> str:
+        """
+        Return the collected metrics in the OpenMetrics text format.
+        """
+        name = self.namespace + '_request_duration_seconds'
+        lines = [
+            '# TYPE {0} histogram'.format(name),
+            '# UNIT {0} seconds'.format(name),
+            '# HELP {0} Wall time of Check_MK Web API requests.'.format(name),
+        ]
+        counters = [
+            ('requests', 'Number of Check_MK Web API requests.', lambda stats: stats.latency.count),
+            ('request_errors', 'Number of failed Check_MK Web API requests.', lambda stats: stats.errors),
+            ('request_bytes', 'Size of Check_MK Web API request bodies.', lambda stats: stats.request_bytes),
+            ('response_bytes', 'Size of Check_MK Web API response bodies.', lambda stats: stats.response_bytes),
+        ]
+        with self._lock:
+            actions = sorted(self._actions.items())
+            for action, stats in actions:
+                label = 'action="{0}"'.format(_escape_label(action))
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), stats.latency.counts):
+                    cumulative += count
+                    lines.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(
+                        name, label, ('+Inf' if bound == float('inf') else repr(float(bound))), cumulative))
+                lines.append('{0}_count{{{1}}} {2}'.format(name, label, stats.latency.count))
+                lines.append('{0}_sum{{{1}}} {2!r}'.format(name, label, stats.latency.sum))
+            for suffix, help_text, value in counters:
+                counter = '{0}_{1}'.format(self.namespace, suffix)
+                lines.append('# TYPE {0} counter'.format(counter))
+                lines.append('# HELP {0} {1}'.format(counter, help_text))
+                for action, stats in actions:
+                    lines.append('{0}_total{{action="{1}"}} {2}'.format(counter, _escape_label(action), value(stats)))
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write_openmetrics(self, path: str):
+        """
+        Write the collected metrics in the OpenMetrics text format to file `path`.
+
+        The file is replaced atomically, so that it can be read at any
+        time, e.g., by the textfile collector of the Prometheus node exporter.
+        """
+        tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as output:
+            output.write(self.to_openmetrics())
+        os.replace(tmp_path, path)
@@ -0,0 +1,278 @@
+"""
+Run the same Web API call on many independent Check_MK sites at once.
+
+This is an extension not present in the Check_MK API.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import time
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional
+
+from cmkclient import WebApi
+from cmkclient.exception import MultiSiteError
+from cmkclient.pool import ConnectionPool
+
+
+__all__ = ['MultiSiteResult', 'MultiSiteWebApi', 'SiteResult']
+
+
+class SiteResult:
+    """
+    Outcome of a call on one site.
+
+    # Attributes
+    site (str): name of the site
+    result: return value of the call, or `None` if it failed
+    error (Exception): exception raised by the call, or `None` if it succeeded
+    elapsed (float): seconds the call took
+    """
+    __slots__ = ('site', 'result', 'error', 'elapsed')
+
+    def __init__(self, site: str, result: Any = None, error: Optional[Exception] = None, elapsed: float = 0.0):
+        self.site = site
+        self.result = result
+        self.error = error
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        outcome = ('error={0!r}'.format(self.error) if self.error is not None else 'ok')
+        return '<SiteResult {0} {1} in {2:.3f}s>'.format(self.site, outcome, self.elapsed)
+
+    @property
+    def ok(self) -> bool:
+        """
+        `True` if the call succeeded.
+        """
+        return self.error is None
+
+    def get(self):
+        """
+        Return the result of the call, or raise the exception it raised.
+        """
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class MultiSiteResult(dict):
+    """
+    Outcomes of a call on several sites: a dict mapping each site name to its #SiteResult.
+
+    # Attributes
+    elapsed (float): wall-clock seconds the whole call took
+    """
+
+    def __init__(self, outcomes: Iterable[SiteResult] = (), elapsed: float = 0.0):
+        super(MultiSiteResult, self).__init__((outcome.site, outcome) for outcome in outcomes)
+        self.elapsed = elapsed
+
+    @property
+    def results(self) -> Dict[str, Any]:
+        """
+        Results of the sites where the call succeeded, by site.
+        """
+        return {site: outcome.result for site, outcome in self.items() if outcome.error is None}
+
+    @property
+    def errors(self) -> Dict[str, Exception]:
+        """
+        Exceptions of the sites where the call failed, by site.
+        """
+        return {site: outcome.error for site, outcome in self.items() if outcome.error is not None}
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        """
+        Seconds the call took on each site.
+        """
+        return {site: outcome.elapsed for site, outcome in self.items()}
+
+    def raise_errors(self):
+        """
+        Raise #MultiSiteError if the call failed on any site.
+        """
+        errors = self.errors
+        if errors:
+            raise MultiSiteError(errors, self)
+
+    def merged(self, partial: bool = False) -> Dict[Any, Dict[str, Any]]:
+        """
+        Merge dict results of all sites into one dict, mapping each key to its values by site.
+
+        For instance, merging the results of #WebApi.get_all_hosts gives
+        a global host index: each host name maps to the host's data on
+        each site it is defined on.
+
+        # Arguments
+        partial (bool): if True, merge the results of the sites where the call
+            succeeded; otherwise, raise #MultiSiteError if it failed anywhere
+
+        # Examples
+        ```python
+        index = multi.get_all_hosts().merged()
+        duplicates = {hostname: sorted(sites) for hostname, sites in index.items() if len(sites) > 1}
+        ```
+        """
+        if not partial:
+            self.raise_errors()
+        merged = {}  # type: Dict[Any, Dict[str, Any]]
+        for site in sorted(self):
+            outcome = self[site]
+            if outcome.error is None:
+                for key, value in outcome.result.items():
+                    merged.setdefault(key, {})[site] = value
+        return merged
+
+
+class MultiSiteWebApi:
+    """
+    Client for many independent Check_MK sites, running each call on all of them concurrently.
+
+    Any #WebApi method can be called on this object with the same
+    arguments; the call runs on every site in its own thread, so it
+    takes about as long as on the slowest site, and returns a
+    #MultiSiteResult with the result or error and the timing of each
+    site.  An error on one site does not affect the others.  Methods
+    returning iterators, like #WebApi.iter_all_hosts, are consumed into
+    lists.
+
+    # Arguments
+    apis (dict): #WebApi client of each site, by site name
+    workers (int): maximum number of sites called at the same time; defaults to the number of sites
+
+    # Examples
+    ```python
+    multi = MultiSiteWebApi.from_urls({
+        'berlin': 'https://cmk-berlin.example.org/berlin',
+        'paris': 'https://cmk-paris.example.org/paris',
+    }, 'automation', 'secret')
+    users = multi.get_all_users()
+    for site, error in users.errors.items():
+        print(site, 'failed:', error)
+    index = multi.host_index()
+    ```
+    """
+
+    def __init__(self, apis: Mapping[str, WebApi], workers: Optional[int] = None):
+        if not apis:
+            raise ValueError("at least one site is needed")
+        self.apis = dict(apis)
+        self.workers = workers or len(self.apis)
+
+    @classmethod
+    def from_urls(cls, urls: Mapping[str, str], username: str, secret: str, workers: Optional[int] = None, **kwargs):
+        """
+        Create a client for the sites at `urls`, all sharing one #ConnectionPool.
+
+        # Arguments
+        urls (dict): URL of each site, by site name; see #WebApi for the supported formats
+        username (str): name of the automation user, the same on all sites
+        secret (str): secret of the automation user, the same on all sites
+        workers (int): see #MultiSiteWebApi
+        kwargs: additional arguments for each #WebApi, such as `timeout`
+        """
+        if 'pool' not in kwargs:
+            kwargs['pool'] = ConnectionPool(maxsize=max(10, 2 * len(urls)))
+        return cls({site: WebApi(url, username, secret, **kwargs) for site, url in urls.items()}, workers)
+
+    @property
+    def sites(self):
+        """
+        Names of the sites, sorted.
+        """
+        return sorted(self.apis)
+
+    def __getattr__(self, name):
+        if name.startswith('_') or not callable(getattr(WebApi, name, None)):
+            raise AttributeError(name)
+
+        def fan_out(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+
+        fan_out.__name__ = name
+        fan_out.__doc__ = getattr(WebApi, name).__doc__
+        return fan_out
+
+    def iter_call(self,
+                  method: str,
+                  *args,
+                  site_names: Optional[Iterable[str]] = None,
+                  **kwargs) -> Iterator[SiteResult]:
+        """
+        Call #WebApi method `method` on the sites, yielding each #SiteResult as soon as it is ready.
+
+        # Arguments
+        method (str): name of the #WebApi method to call
+        site_names (list): names of the sites to call; `None` means all of them
+        args, kwargs: arguments for the method
+        """
+        apis = self.apis
+        if site_names is not None:
+            unknown = set(site_names) - set(apis)
+            if unknown:
+                raise KeyError("unknown sites: {0}".format(', '.join(sorted(unknown))))
+            apis = {site: apis[site] for site in site_names}
+
+        def run(site, api):
+            started = time.monotonic()
+            try:
+                result = getattr(api, method)(*args, **kwargs)
+                if isinstance(result, Iterator):
+                    # generator methods like `iter_all_hosts` do their work while being consumed
+                    result = list(result)
+            except Exception as err:  # pylint: disable=broad-except
+                return SiteResult(site, error=err, elapsed=time.monotonic() - started)
+            return SiteResult(site, result, elapsed=time.monotonic() - started)
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(apis))) as executor:
+            pending = {executor.submit(run, site, api) for site, api in apis.items()}
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def call(self, method: str, *args, site_names: Optional[Iterable[str]] = None, **kwargs) -> MultiSiteResult:
+        """
+        Call #WebApi method `method` on the sites concurrently, and return the #MultiSiteResult.
+
+        # Arguments
+        method (str): name of the #WebApi method to call
+        site_names (list): names of the sites to call; `None` means all of them
+        args, kwargs: arguments for the method
+
+        # Examples
+        ```python
+        multi.call('bake_agents', site_names=['berlin', 'paris'])
+        ```
+        """
+        started = time.monotonic()
+        outcomes = list(self.iter_call(method, *args, site_names=site_names, **kwargs))
+        return MultiSiteResult(outcomes, time.monotonic() - started)
+
+    def host_index(self, effective_attributes: bool = False, partial: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Return a global host index: each host name, mapped to the host's data on each site it is defined on.
+
+        # Arguments
+        effective_attributes (bool): If True attributes with default values will be returned
+        partial (bool): if True, index the sites that answered; otherwise,
+            raise #MultiSiteError if any site failed
+
+        # Examples
+        ```python
+        for hostname, sites in multi.host_index().items():
+            print(hostname, 'is on', ', '.join(sites))
+        ```
+        """
+        return self.get_all_hosts(effective_attributes).merged(partial)
+
+    def close(self):
+        """
+        Close the idle connections of all sites.
+        """
+        for api in self.apis.values():
+            api.pool.close()
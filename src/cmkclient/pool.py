@@ -0,0 +1,449 @@
+"""
+Persistent (keep-alive) HTTP and HTTPS connections to the Check_MK Web API.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+import http.client
+import os
+import select
+import threading
+import time
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+import zlib
+
+from cmkclient.deadline import split_timeout
+
+
+# errors signalling that the server closed a kept-alive connection
+# while it was sitting idle in the pool
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+#: value of the ``Accept-Encoding`` header sent by pools that accept compressed responses
+ACCEPT_ENCODING = 'gzip, deflate'
+
+
+class _Decoder:
+    """
+    Incremental decoder for a ``gzip`` or ``deflate`` content coding.
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        self._started = False
+        self._obj = zlib.decompressobj((16 + zlib.MAX_WBITS) if encoding == 'gzip' else zlib.MAX_WBITS)
+
+    @property
+    def unconsumed_tail(self):
+        return self._obj.unconsumed_tail
+
+    def decompress(self, data: bytes, max_length: int = 0):
+        try:
+            return self._obj.decompress(data, max_length)
+        except zlib.error:
+            if self.encoding != 'deflate' or self._started:
+                raise
+            # some servers send "deflate" bodies without the zlib header
+            self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._obj.decompress(data, max_length)
+        finally:
+            self._started = True
+
+    def flush(self):
+        return self._obj.flush()
+
+
+def _decoder(headers) -> Optional[_Decoder]:
+    """
+    Return a decoder for the ``Content-Encoding`` of a response, or `None` if it is not encoded.
+    """
+    # `http.client` headers are case-insensitive, #AsyncResponse headers are lowercased
+    encoding = (headers.get('content-encoding') or '').strip().lower()
+    if encoding in ('gzip', 'x-gzip'):
+        return _Decoder('gzip')
+    elif encoding == 'deflate':
+        return _Decoder('deflate')
+    return None
+
+
+def environment_proxies() -> Dict[str, str]:
+    """
+    Return the proxies set in ``http_proxy``, ``https_proxy`` and ``no_proxy`` environment variables.
+
+    The result maps URL schemes to proxy URLs, plus ``no`` to the
+    ``no_proxy`` list, like `urllib.request.getproxies_environment`.
+    """
+    if not any(name.lower().endswith('_proxy') for name in os.environ):
+        return {}
+    # only worth its import time when there are proxies to look up
+    import urllib.request
+    return urllib.request.getproxies_environment()
+
+
+def select_proxy(proxies: Dict[str, str], scheme: str, host: str):
+    """
+    Return the URL of the proxy to reach `host` through, split by `urlsplit`, or `None` to connect directly.
+
+    # Arguments
+    proxies (dict): proxies by URL scheme, as returned by #environment_proxies
+    scheme (str): scheme of the URL requested, ``http`` or ``https``
+    host (str): host name of the URL requested
+    """
+    proxy = proxies.get(scheme)
+    if not proxy:
+        return None
+    if 'no' in proxies:
+        import urllib.request
+        if urllib.request.proxy_bypass_environment(host, proxies):
+            return None
+    if '://' not in proxy:
+        proxy = 'http://' + proxy
+    return urlsplit(proxy)
+
+
+def proxy_headers(proxy) -> Dict[str, str]:
+    """
+    Return the headers authenticating with `proxy`, as returned by #select_proxy.
+    """
+    if proxy.username is None:
+        return {}
+    import base64
+    credentials = '{0}:{1}'.format(unquote(proxy.username), unquote(proxy.password or ''))
+    return {'Proxy-Authorization': 'Basic ' + base64.b64encode(credentials.encode()).decode('ascii')}
+
+
+def decode_body(body: bytes, headers) -> bytes:
+    """
+    Decompress a complete response `body` according to the ``Content-Encoding`` in `headers`.
+    """
+    decoder = _decoder(headers)
+    if decoder is None:
+        return body
+    return decoder.decompress(body) + decoder.flush()
+
+
+class _DecodingResponse:
+    """
+    Wrapper around `http.client.HTTPResponse` whose `read` returns the decompressed body.
+
+    Decompression is incremental: ``read(amt)`` decodes at most one
+    chunk of `amt` bytes off the wire at a time.  Other attributes are
+    those of the wrapped response.
+    """
+
+    def __init__(self, response: http.client.HTTPResponse):
+        self._response = response
+        self._decoder = _decoder(response.headers)
+        self._eof = False
+        #: number of body bytes received (before decoding)
+        self.wire_bytes = 0
+        #: number of body bytes after decoding
+        self.decoded_bytes = 0
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        decoder = self._decoder
+        if decoder is None:
+            data = self._response.read(amt)
+            self.wire_bytes += len(data)
+        elif amt is None:
+            raw = self._response.read()
+            self.wire_bytes += len(raw)
+            data = decoder.decompress(decoder.unconsumed_tail + raw) + decoder.flush()
+            self._eof = True
+        else:
+            data = b''
+            while not data:
+                if decoder.unconsumed_tail:
+                    data = decoder.decompress(decoder.unconsumed_tail, amt)
+                elif self._eof:
+                    data = decoder.flush()
+                    break
+                else:
+                    raw = self._response.read(amt)
+                    self.wire_bytes += len(raw)
+                    if raw:
+                        data = decoder.decompress(raw, amt)
+                    else:
+                        self._eof = True
+        self.decoded_bytes += len(data)
+        return data
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of keep-alive HTTP(S) connections.
+
+    Connections are keyed by scheme, host and port, so a single pool can be
+    shared by several #WebApi objects, even if they talk to different sites.
+
+    # Arguments
+    maxsize (int): maximum number of idle connections kept open (across all hosts)
+    max_per_host (int): maximum number of connections in use towards a single host at any time;
+        additional requests block until a connection is given back to the pool
+    idle_timeout (float): number of seconds after which an idle connection is closed instead of being reused
+    ssl_context (ssl.SSLContext): context used for HTTPS connections; if `None`, use Python's defaults
+    compress (bool): if True, ask for gzip- or deflate-compressed responses and decompress them transparently
+    proxies (dict): proxy URL to go through, by URL scheme (``http`` or ``https``),
+        plus an optional ``no`` entry listing hosts to reach directly, as in ``no_proxy``;
+        if `None`, taken from the environment (see #environment_proxies); pass ``{}`` to connect directly
+
+    Redirects are not followed: the response is returned as is.
+
+    # Examples
+    ```python
+    pool = ConnectionPool(maxsize=20, max_per_host=4)
+    api = WebApi('https://checkmk.company.com/monitor', 'automation', 'secret', pool=pool)
+    ...
+    print(pool.hits, pool.misses)
+    ```
+    """
+
+    def __init__(self,
+                 maxsize: int = 10,
+                 max_per_host: int = 10,
+                 idle_timeout: float = 30.0,
+                 ssl_context=None,
+                 compress: bool = True,
+                 proxies: Optional[Dict[str, str]] = None):
+        self.maxsize = maxsize
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.ssl_context = ssl_context
+        self.compress = compress
+        self.proxies = (proxies if proxies is not None else environment_proxies())
+
+        #: number of requests served over an already-open connection
+        self.hits = 0
+        #: number of requests that required opening a new connection
+        self.misses = 0
+        #: number of reused connections found closed by the server
+        self.stale = 0
+        #: number of response body bytes received, as sent by the server
+        self.wire_bytes = 0
+        #: number of response body bytes after decompression
+        self.decoded_bytes = 0
+
+        self._lock = threading.Lock()
+        self._idle = {}  # type: Dict[Tuple[str, str, int], Deque[Tuple[float, http.client.HTTPConnection]]]
+        self._idle_count = 0
+        self._slots = {}  # type: Dict[Tuple[str, str, int], threading.BoundedSemaphore]
+
+    def stats(self):
+        """
+        Return a dictionary with the pool counters.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'idle': self._idle_count,
+                'wire_bytes': self.wire_bytes,
+                'decoded_bytes': self.decoded_bytes,
+            }
+
+    @contextmanager
+    def request(self,
+                url: str,
+                data: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None,
+                timeout=None):
+        """
+        Send a request and yield the response.
+
+        The response behaves like an `http.client.HTTPResponse`, except
+        that `read` returns the decompressed body if the server sent a
+        compressed one.
+
+        The request is a POST if `data` is given, and a GET otherwise.
+        The connection goes back to the pool when the `with` block
+        exits, provided the response body was read in full.
+
+        # Arguments
+        url (str): absolute URL to request
+        data (bytes): request body
+        headers (dict): additional HTTP headers
+        timeout: connect and read timeouts, as accepted by #split_timeout;
+            the read timeout applies to each read from the socket, including
+            those made while the body is read inside the `with` block
+
+        # Raises
+        socket.timeout: if connecting or reading takes longer than allowed
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        method = ('GET' if data is None else 'POST')
+        headers = dict(headers or {})
+        if self.compress:
+            headers.setdefault('Accept-Encoding', ACCEPT_ENCODING)
+        proxy = select_proxy(self.proxies, parts.scheme, parts.hostname)
+        if proxy is not None and parts.scheme == 'http':
+            # plain HTTP goes through the proxy, which needs the whole URL
+            path = '{0}://{1}{2}'.format(parts.scheme, parts.netloc, path)
+            headers.update(proxy_headers(proxy))
+        timeout = split_timeout(timeout)
+
+        slot = self.__slot(key)
+        slot.acquire()
+        try:
+            conn, reused = self.__checkout(key)
+            conn, response = self.__exchange(key, conn, reused, method, path, data, headers, timeout)
+
+            response = _DecodingResponse(response)
+            try:
+                yield response
+            except BaseException:
+                conn.close()
+                raise
+            finally:
+                with self._lock:
+                    self.wire_bytes += response.wire_bytes
+                    self.decoded_bytes += response.decoded_bytes
+
+            if response.will_close or not response.isclosed():
+                # cannot reuse a connection with unread data on it
+                conn.close()
+            else:
+                self.__checkin(key, conn)
+        finally:
+            slot.release()
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+            self._idle_count = 0
+        for conns in idle.values():
+            for _, conn in conns:
+                conn.close()
+
+    #
+    # internal tooling
+    #
+
+    def __slot(self, key):
+        with self._lock:
+            try:
+                return self._slots[key]
+            except KeyError:
+                slot = self._slots[key] = threading.BoundedSemaphore(self.max_per_host)
+                return slot
+
+    def __checkout(self, key):
+        expired = []
+        conn = None
+        now = time.monotonic()
+        with self._lock:
+            conns = self._idle.get(key)
+            while conns:
+                last_used, candidate = conns.pop()
+                self._idle_count -= 1
+                if now - last_used > self.idle_timeout:
+                    expired.append(candidate)
+                elif self.__dropped(candidate):
+                    self.stale += 1
+                    expired.append(candidate)
+                else:
+                    conn = candidate
+                    break
+            if conn is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        for old in expired:
+            old.close()
+        if conn is None:
+            return self.__connect(key), False
+        return conn, True
+
+    @staticmethod
+    def __dropped(conn):
+        """
+        Return `True` if the server has closed idle connection `conn` (or sent something unexpected on it).
+        """
+        try:
+            return bool(select.select([conn.sock], [], [], 0)[0])
+        except (OSError, ValueError):
+            return True
+
+    def __checkin(self, key, conn):
+        with self._lock:
+            if self._idle_count < self.maxsize:
+                self._idle.setdefault(key, deque()).append((time.monotonic(), conn))
+                self._idle_count += 1
+                return
+        conn.close()
+
+    def __connect(self, key):
+        scheme, host, port = key
+        proxy = select_proxy(self.proxies, scheme, host)
+        if proxy is None:
+            if scheme == 'https':
+                return http.client.HTTPSConnection(host, port, context=self.ssl_context)
+            return http.client.HTTPConnection(host, port)
+        # like `urllib`, talk to the proxy itself in plain HTTP
+        proxy_port = proxy.port or 80
+        if scheme == 'https':
+            # HTTPS is tunnelled through the proxy with CONNECT
+            conn = http.client.HTTPSConnection(proxy.hostname, proxy_port, context=self.ssl_context)
+            conn.set_tunnel(host, port, headers=proxy_headers(proxy))
+            return conn
+        return http.client.HTTPConnection(proxy.hostname, proxy_port)
+
+    def __exchange(self, key, conn, reused, method, path, data, headers, timeout):
+        """
+        Send a request over `conn` and return `(conn, response)`.
+
+        If `conn` was reused and turns out to have been closed by the
+        server, the request is sent again over a new connection, but
+        only if that cannot make the server act on it twice: when it
+        could not be sent in full, or when it is a GET.
+        """
+        sent = False
+        try:
+            self.__send(conn, method, path, data, headers, timeout)
+            sent = True
+            return conn, conn.getresponse()
+        except _STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused or (sent and method != 'GET'):
+                raise
+        except BaseException:
+            conn.close()
+            raise
+
+        # the server dropped the connection while idle: retry once on a fresh one
+        with self._lock:
+            self.stale += 1
+            self.misses += 1
+        conn = self.__connect(key)
+        try:
+            self.__send(conn, method, path, data, headers, timeout)
+            return conn, conn.getresponse()
+        except BaseException:
+            conn.close()
+            raise
+
+    @staticmethod
+    def __send(conn, method, path, data, headers, timeout):
+        connect_timeout, read_timeout = timeout
+        if conn.sock is None:
+            if connect_timeout is not None:
+                conn.timeout = connect_timeout
+            conn.connect()
+        conn.sock.settimeout(read_timeout)
+        conn.request(method, path, body=data, headers=headers)
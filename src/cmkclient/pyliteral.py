@@ -0,0 +1,156 @@
+"""
+Parser for the Python literals that the Check_MK Web API returns with ``output_format=python``.
+
+Check_MK serializes its answers with Python's `repr()`, so they only
+contain a small subset of the Python syntax: dicts, lists, tuples, strings
+(possibly with ``u``, ``b`` or ``r`` prefixes), numbers (including Python
+2 longs like ``10L``), ``True``, ``False``, and ``None``.  Parsing this
+subset directly is faster and needs much less memory than
+`ast.literal_eval`, which first builds a full syntax tree; the resulting
+objects are the same.
+"""
+
+from ast import literal_eval
+import re
+from typing import Any
+
+
+__all__ = ['loads']
+
+
+_TOKEN = re.compile(r"""
+    \s*
+    (?:
+        (?P<key>'[^'\\\n]*'|"[^"\\\n]*")\s*:
+      | (?P<str>'[^'\\\n]*'|"[^"\\\n]*")
+      | (?P<xstr>[uUbBrR]{0,2}(?:'[^'\\\n]*(?:\\.[^'\\\n]*)*'|"[^"\\\n]*(?:\\.[^"\\\n]*)*"))
+      | (?P<sep>[,:])
+      | (?P<open>[\[{(])
+      | (?P<close>[\]})])
+      | (?P<num>[-+]?(?:\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)[lLjJ]?)
+      | (?P<name>True|False|None)
+      | (?P<invalid>\S)
+    )
+""", re.VERBOSE)
+
+# indices of the groups in `_TOKEN`, in order; the most frequent
+# tokens come first: plain strings (as dict keys or values) and
+# separators; `key` is a shortcut for the ubiquitous `'...':` sequence
+_KEY, _STR, _XSTR, _SEP, _OPEN, _CLOSE, _NUM, _NAME, _INVALID = range(1, 10)
+
+_CONSTANTS = {'True': True, 'False': False, 'None': None}
+
+_CLOSING = {']': '[', '}': '{', ')': '('}
+
+
+def _string(token):
+    """
+    Return the value of a string literal with a prefix or escape sequences.
+    """
+    if token[0] in 'uU' and token[1] in '\'"' and '\\' not in token:
+        return token[2:-1]
+    # let Python deal with the escapes in this (short) token
+    return literal_eval(token)
+
+
+def _number(token):
+    if token[-1] in 'lL':
+        token = token[:-1]
+    try:
+        return int(token)
+    except ValueError:
+        pass
+    if token[-1] in 'jJ':
+        return complex(token)
+    return float(token)
+
+
+# pylint: disable=too-many-branches,too-many-statements
+def loads(text: str) -> Any:
+    """
+    Parse `text`, the `repr()` of a Python object, and return the object.
+
+    # Raises
+    ValueError: if `text` is not a valid literal of the supported subset
+    """
+    # each stack frame is `[opening bracket, items, saw a comma]`;
+    # dict frames collect keys and values alternately, so an odd
+    # number of items means that a key is waiting for its value
+    stack = []  # type: list
+    items = None  # type: Any
+    result = None
+    have_result = False
+    expect_value = True
+
+    for m in _TOKEN.finditer(text):
+        kind = m.lastindex
+
+        if kind == _KEY:
+            if not expect_value or not stack or stack[-1][0] != '{' or len(items) % 2:
+                raise ValueError("Unexpected dictionary key at position {0}".format(m.start(kind)))
+            items.append(m.group(kind)[1:-1])
+            continue
+        elif kind == _STR:
+            value = m.group(kind)[1:-1]
+        elif kind == _SEP:
+            token = m.group(kind)
+            if expect_value or not stack:
+                raise ValueError("Unexpected {0!r} at position {1}".format(token, m.start(kind)))
+            frame = stack[-1]
+            if (token == ':') != (frame[0] == '{' and len(items) % 2 == 1):
+                raise ValueError("Unexpected {0!r} at position {1}".format(token, m.start(kind)))
+            if token == ',':
+                frame[2] = True
+            expect_value = True
+            continue
+        elif kind == _OPEN:
+            if not expect_value:
+                raise ValueError("Missing separator at position {0}".format(m.start(kind)))
+            items = []
+            stack.append([m.group(kind), items, False])
+            continue
+        elif kind == _CLOSE:
+            token = m.group(kind)
+            if not stack or stack[-1][0] != _CLOSING[token]:
+                raise ValueError("Unbalanced {0!r} at position {1}".format(token, m.start(kind)))
+            opening, _, saw_comma = stack.pop()
+            if opening == '[':
+                value = items
+            elif opening == '{':
+                if len(items) % 2:
+                    raise ValueError("Missing dictionary value at position {0}".format(m.start(kind)))
+                value = dict(zip(items[0::2], items[1::2]))
+            elif len(items) == 1 and not saw_comma:
+                # parenthesized expression, not a tuple
+                value = items[0]
+            else:
+                value = tuple(items)
+            items = (stack[-1][1] if stack else None)
+            expect_value = True  # the container itself is a value
+        elif kind == _XSTR:
+            value = _string(m.group(kind))
+        elif kind == _NUM:
+            value = _number(m.group(kind))
+        elif kind == _NAME:
+            value = _CONSTANTS[m.group(kind)]
+        else:
+            raise ValueError("Invalid Python literal at position {0}: {1!r}".format(
+                m.start(kind), text[m.start(kind):m.start(kind)+20]))
+
+        # a complete value has been parsed
+        if not expect_value:
+            raise ValueError("Missing separator at position {0}".format(m.start(kind)))
+        expect_value = False
+        if stack:
+            items.append(value)
+        elif have_result:
+            raise ValueError("Extra data at position {0}".format(m.start(kind)))
+        else:
+            result = value
+            have_result = True
+
+    if stack:
+        raise ValueError("Unterminated {0!r}".format(stack[-1][0]))
+    if not have_result:
+        raise ValueError("Empty Python literal")
+    return result
@@ -0,0 +1,393 @@
+"""
+Client-side limits on the rate and concurrency of requests to a Check_MK site.
+
+Apache worker slots and the WATO configuration lock are shared by all
+clients of a site, so when several jobs talk to the same site, they
+should share one #SiteLimiter as well.
+
+This is an extension not present in the Check_MK API.
+"""
+
+from collections import deque
+import threading
+import time
+from typing import Deque, Optional
+import weakref
+
+from cmkclient.exception import DeadlineExceeded, ResponseError
+
+
+__all__ = ['AdaptiveConcurrency', 'SiteLimiter', 'TokenBucket', 'is_overload', 'shared_limiter']
+
+
+#: HTTP status codes with which an overloaded server (or proxy in front of it) answers
+_OVERLOAD_STATUSES = (429, 500, 502, 503, 504)
+
+
+def is_overload(err: Optional[BaseException]) -> bool:
+    """
+    Return `True` if exception `err` hints at an overloaded server.
+
+    Timeouts, network errors and HTTP statuses 429 and 5xx count as
+    overload; errors reported by Check_MK itself (#ResultError) do not,
+    since the server had the capacity to process the request.
+    """
+    if isinstance(err, ResponseError):
+        return getattr(err.response, 'status', None) in _OVERLOAD_STATUSES
+    return isinstance(err, OSError)
+
+
+class TokenBucket:
+    """
+    Allow on average `rate` requests per second, with bursts of up to `burst` requests.
+
+    Safe to share among threads and event loops.
+
+    # Arguments
+    rate (float): number of tokens added to the bucket per second
+    burst (float): capacity of the bucket; the default of 1 spaces requests evenly
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive, not {0!r}".format(rate))
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        Take `tokens` out of the bucket, and return the number of seconds to wait before using them.
+
+        # Arguments
+        tokens (float): number of tokens to take
+        max_wait (float): if waiting would take longer than this, take nothing and return `None`
+        """
+        with self._lock:
+            now = time.monotonic()
+            available = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            delay = max(0.0, (tokens - available) / self.rate)
+            if max_wait is not None and delay > max_wait:
+                self._tokens = available
+                return None
+            # going into debt makes later callers queue up behind this one
+            self._tokens = available - tokens
+            return delay
+
+    def acquire(self, tokens: float = 1.0):
+        """
+        Take `tokens` out of the bucket, sleeping until they are available.
+        """
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+
+
+class _Waiter:
+    """
+    Request queued by #AdaptiveConcurrency until a slot frees up.
+    """
+    __slots__ = ('wake', 'granted')
+
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+
+def _set_result(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveConcurrency:
+    """
+    Limit on the number of requests in flight, adapted to the server's response.
+
+    The limit follows additive increase / multiplicative decrease
+    (AIMD): each request that completes within `latency_target`
+    seconds, and without an overload error (see #is_overload), while
+    the limit was fully used, raises the limit by ``1 / limit`` (so by
+    about 1 per round of requests); a slow or overloaded request
+    multiplies it by `backoff`, at most once per round, since the
+    requests started before a decrease do not reflect it yet.
+
+    Requests over the limit wait in first-in, first-out order.  Safe to
+    share among threads and event loops.
+
+    # Arguments
+    initial (int): starting limit
+    minimum (int): lowest limit
+    maximum (int): highest limit
+    latency_target (float): requests taking longer than this many seconds decrease the limit
+    backoff (float): factor applied to the limit on decrease
+
+    # Examples
+    A fixed limit of 4 concurrent requests:
+    ```python
+    AdaptiveConcurrency(4, minimum=4, maximum=4)
+    ```
+    """
+
+    def __init__(self,
+                 initial: int = 4,
+                 minimum: int = 1,
+                 maximum: int = 64,
+                 latency_target: float = 2.0,
+                 backoff: float = 0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.backoff = backoff
+        #: current limit; the number of requests allowed in flight is its integer part
+        self.limit = float(min(max(initial, minimum), maximum))
+        #: number of times the limit was decreased
+        self.decreases = 0
+
+        self._in_flight = 0
+        self._waiters = deque()  # type: Deque[_Waiter]
+        self._last_decrease = float('-inf')
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        """
+        Number of requests holding a slot.
+        """
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        """
+        Number of requests waiting for a slot.
+        """
+        return len(self._waiters)
+
+    def _capacity(self):
+        return max(self.minimum, int(self.limit))
+
+    def _take(self):
+        # with `_lock` held
+        if self._in_flight < self._capacity() and not self._waiters:
+            self._in_flight += 1
+            return True
+        return False
+
+    def _withdraw(self, waiter):
+        """
+        Dequeue a waiter that gave up; return `True` if it was granted a slot in the meantime.
+        """
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a slot, and return `True` once one is held, or `False` after `timeout` seconds.
+        """
+        with self._lock:
+            if self._take():
+                return True
+            event = threading.Event()
+            waiter = _Waiter(event.set)
+            self._waiters.append(waiter)
+        if event.wait(timeout):
+            return True
+        return self._withdraw(waiter)
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> bool:
+        """
+        Coroutine version of #AdaptiveConcurrency.acquire.
+        """
+        import asyncio  # only needed, and so only imported, by asyncio clients
+        loop = asyncio.get_event_loop()
+        with self._lock:
+            if self._take():
+                return True
+            future = loop.create_future()
+            waiter = _Waiter(lambda: loop.call_soon_threadsafe(_set_result, future))
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return self._withdraw(waiter)
+        except BaseException:
+            if self._withdraw(waiter):
+                # cancelled right after being granted a slot: pass it on
+                with self._lock:
+                    self._in_flight -= 1
+                    self._dispatch()
+            raise
+
+    def release(self, started: float, elapsed: float, overloaded: bool):
+        """
+        Give back a slot, adjusting the limit to how the request went.
+
+        # Arguments
+        started (float): `time.monotonic()` when the request was sent
+        elapsed (float): seconds the request took
+        overloaded (bool): whether the request failed because of overload
+        """
+        with self._lock:
+            saturated = (self._in_flight >= self._capacity() or bool(self._waiters))
+            self._in_flight -= 1
+            if overloaded or elapsed > self.latency_target:
+                if started >= self._last_decrease:
+                    self.limit = max(float(self.minimum), self.limit * self.backoff)
+                    self._last_decrease = time.monotonic()
+                    self.decreases += 1
+            elif saturated:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._dispatch()
+
+    def _dispatch(self):
+        # with `_lock` held: hand free slots to waiters
+        while self._waiters and self._in_flight < self._capacity():
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self._in_flight += 1
+            waiter.wake()
+
+
+class SiteLimiter:
+    """
+    Gate through which every request of the #WebApi clients sharing it passes.
+
+    A request first takes a token from the rate limiter, then waits for
+    a concurrency slot; the slot is given back when the response has
+    been read.
+
+    # Arguments
+    rate (float): maximum number of requests started per second; `None` means no limit
+    burst (float): number of requests that may be started at once after a pause, see #TokenBucket
+    concurrency: maximum number of requests in flight, either as a fixed number,
+        or as an #AdaptiveConcurrency; `None` means no limit
+
+    # Examples
+    ```python
+    limiter = SiteLimiter(rate=20, concurrency=AdaptiveConcurrency(initial=4, maximum=16))
+    api = WebApi('https://checkmk.company.com/monitor', 'automation', 'secret', limiter=limiter)
+    ```
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: float = 1.0, concurrency=None):
+        self.bucket = (TokenBucket(rate, burst) if rate else None)
+        if isinstance(concurrency, int):
+            concurrency = AdaptiveConcurrency(concurrency, minimum=concurrency, maximum=concurrency)
+        self.concurrency = concurrency  # type: Optional[AdaptiveConcurrency]
+
+        #: number of requests let through
+        self.requests = 0
+        #: number of requests that failed because of overload
+        self.overloads = 0
+        #: total number of seconds requests spent waiting
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """
+        Return a dictionary with the limiter counters and the current concurrency limit.
+        """
+        concurrency = self.concurrency
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'overloads': self.overloads,
+                'waited': self.waited,
+                'limit': (concurrency.limit if concurrency is not None else None),
+                'in_flight': (concurrency.in_flight if concurrency is not None else None),
+            }
+
+    def _reserve(self, action, deadline):
+        if self.bucket is None:
+            return 0.0
+        delay = self.bucket.reserve(max_wait=(deadline.remaining() if deadline is not None else None))
+        if delay is None:
+            raise DeadlineExceeded(action)
+        return delay
+
+    def _started(self, requested):
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            self.waited += now - requested
+        return now
+
+    def acquire(self, action: Optional[str] = None, deadline=None) -> float:
+        """
+        Wait until a request may be sent, and return the `time.monotonic()` it was let through.
+
+        Pass the returned value to #SiteLimiter.release when the request is done.
+
+        # Arguments
+        action (str): Web API action of the request, reported in exceptions
+        deadline (Deadline): give up waiting when it passes
+
+        # Raises
+        DeadlineExceeded: if `deadline` passes before the request may be sent
+        """
+        requested = time.monotonic()
+        delay = self._reserve(action, deadline)
+        if delay:
+            time.sleep(delay)
+        if self.concurrency is not None:
+            if not self.concurrency.acquire(deadline.remaining() if deadline is not None else None):
+                raise DeadlineExceeded(action)
+        return self._started(requested)
+
+    async def acquire_async(self, action: Optional[str] = None, deadline=None) -> float:
+        """
+        Coroutine version of #SiteLimiter.acquire.
+        """
+        import asyncio
+        requested = time.monotonic()
+        delay = self._reserve(action, deadline)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.concurrency is not None:
+            if not await self.concurrency.acquire_async(deadline.remaining() if deadline is not None else None):
+                raise DeadlineExceeded(action)
+        return self._started(requested)
+
+    def release(self, started: float, error: Optional[BaseException] = None):
+        """
+        Report that a request let through at `started` is done, failing with `error` if not `None`.
+        """
+        overloaded = is_overload(error)
+        if overloaded:
+            with self._lock:
+                self.overloads += 1
+        if self.concurrency is not None:
+            self.concurrency.release(started, time.monotonic() - started, overloaded)
+
+
+_shared = weakref.WeakValueDictionary()  # type: weakref.WeakValueDictionary
+_shared_lock = threading.Lock()
+
+
+def shared_limiter(site: str, **kwargs) -> SiteLimiter:
+    """
+    Return the #SiteLimiter shared by all clients of `site`, creating it with `kwargs` if needed.
+
+    The limiter lives as long as something, such as a #WebApi, uses it.
+
+    # Arguments
+    site (str): key identifying the site, for instance #WebApi.web_api_base
+    kwargs: arguments for #SiteLimiter; ignored if the limiter exists already
+
+    # Examples
+    ```python
+    limiter = shared_limiter(url, rate=10, concurrency=AdaptiveConcurrency(maximum=8))
+    api = WebApi(url, 'automation', 'secret', limiter=limiter)
+    ```
+    """
+    with _shared_lock:
+        limiter = _shared.get(site)
+        if limiter is None:
+            limiter = _shared[site] = SiteLimiter(**kwargs)
+        return limiter
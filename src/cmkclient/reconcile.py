@@ -0,0 +1,434 @@
+"""
+Bring the Check_MK host inventory and rule sets in line with a desired state.
+
+This is an extension not present in the Check_MK API.
+"""
+
+from difflib import SequenceMatcher
+import json
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
+
+from cmkclient import WebApi, _batched
+
+
+class HostPlan:
+    """
+    Changes needed to bring the Check_MK host inventory to a desired state.
+
+    # Attributes
+    add (list): #WebApi.add_hosts items for hosts to create
+    edit (list): #WebApi.edit_hosts items for hosts whose attributes change
+    move (list): #WebApi.add_hosts items for hosts that must change folder;
+        Check_MK cannot move hosts through the Web API, so these are deleted and added back
+    move_from (dict): #WebApi.add_hosts items that put moved hosts back as they were,
+        by host name, used if adding them in their new folder fails
+    delete (list): names of hosts to delete
+    """
+
+    def __init__(self):
+        self.add = []  # type: List[Dict[str, Any]]
+        self.edit = []  # type: List[Dict[str, Any]]
+        self.move = []  # type: List[Dict[str, Any]]
+        self.move_from = {}  # type: Dict[str, Dict[str, Any]]
+        self.delete = []  # type: List[str]
+
+    def __bool__(self):
+        return bool(self.add or self.edit or self.move or self.delete)
+
+    def __repr__(self):
+        return '<HostPlan add={add} edit={edit} move={move} delete={delete}>'.format(**self.summary())
+
+    def summary(self):
+        """
+        Return the number of hosts to add, edit, move, and delete.
+        """
+        return {
+            'add': len(self.add),
+            'edit': len(self.edit),
+            'move': len(self.move),
+            'delete': len(self.delete),
+        }
+
+
+class HostReconciler:
+    """
+    Compute and apply the minimal set of changes that turns the current host inventory into a desired one.
+
+    The current inventory is fetched with a single #WebApi.get_all_hosts
+    call; changes are then sent with the batched #WebApi.add_hosts,
+    #WebApi.edit_hosts, and #WebApi.delete_hosts.
+
+    The Web API cannot move a host to another folder, and a host cannot
+    be added while one of the same name exists, so hosts are moved by
+    deleting them and adding them back.  This loses what Check_MK keeps
+    about a host besides its attributes, such as its discovered services
+    (run #WebApi.discover_services on moved hosts) and its ``meta_data``;
+    with `unset` false, attributes left out of the desired state are
+    carried over.  Hosts that cannot be added in their new folder are
+    added back in their old one.
+
+    # Arguments
+    api (WebApi): client for the Check_MK site to reconcile
+    delete (bool): if True, delete hosts that are not in the desired state
+    unset (bool): if True, unset host attributes that are not in the desired state
+    ignore_attributes (list): attributes that are never compared nor unset
+    batch_size (int): maximum number of hosts per request; defaults to #WebApi.batch_size
+
+    # Examples
+    ```python
+    reconciler = HostReconciler(api)
+    plan = reconciler.plan({
+        'host00': {'folder': 'web', 'attributes': {'ipaddress': '192.168.0.100'}, 'tags': {'agent': 'cmk-agent'}},
+        'host01': {},
+    })
+    print(plan.summary())
+    reconciler.apply(plan)
+    ```
+    """
+
+    def __init__(self,
+                 api,
+                 delete: bool = True,
+                 unset: bool = True,
+                 ignore_attributes: Iterable[str] = ('meta_data',),
+                 batch_size: Optional[int] = None):
+        self.api = api
+        self.delete = delete
+        self.unset = unset
+        self.ignore_attributes = frozenset(ignore_attributes)
+        self.batch_size = batch_size
+
+    def plan(self,
+             desired: Mapping[str, Optional[Mapping[str, Any]]],
+             current: Optional[Mapping[str, Mapping[str, Any]]] = None):
+        """
+        Compute the changes needed to reach the `desired` state.
+
+        # Arguments
+        desired (dict): maps host names to a dict with optional keys ``folder``,
+            ``attributes`` (a dict) and ``tags`` (a dict, prefix tag_ can be omitted)
+        current (dict): current hosts, in the format returned by #WebApi.get_all_hosts;
+            fetched from the server if `None`
+
+        # Returns
+        #HostPlan
+        """
+        if current is None:
+            current = self.api.get_all_hosts()
+
+        plan = HostPlan()
+        for hostname, spec in desired.items():
+            spec = spec or {}
+            folder = self._normalize_folder(spec.get('folder', ''))
+            attributes = self._normalize_attributes(spec.get('attributes') or {}, spec.get('tags'))
+
+            try:
+                host = current[hostname]
+            except KeyError:
+                plan.add.append(dict(attributes, hostname=hostname, folder=folder))
+                continue
+
+            present = host.get('attributes') or {}
+            if self._normalize_folder(host.get('path', '')) != folder:
+                kept = {
+                    name: value
+                    for name, value in present.items() if name not in self.ignore_attributes
+                }
+                if self.unset:
+                    plan.move.append(dict(attributes, hostname=hostname, folder=folder))
+                else:
+                    plan.move.append(dict(kept, **dict(attributes, hostname=hostname, folder=folder)))
+                plan.move_from[hostname] = dict(kept, hostname=hostname, folder=host.get('path', ''))
+                continue
+
+            changed = {
+                name: value
+                for name, value in attributes.items()
+                if name not in self.ignore_attributes and present.get(name) != value
+            }
+            unset = []  # type: List[str]
+            if self.unset:
+                unset = sorted(
+                    name for name in present
+                    if name not in attributes and name not in self.ignore_attributes)
+            if changed or unset:
+                edit = dict(changed, hostname=hostname)
+                if unset:
+                    edit['unset_attributes'] = unset
+                plan.edit.append(edit)
+
+        if self.delete:
+            plan.delete = sorted(hostname for hostname in current if hostname not in desired)
+
+        return plan
+
+    def apply(self, plan: HostPlan):
+        """
+        Execute `plan` with batched requests.
+
+        Deletions go first, then additions, then moves, then edits.
+        Moves are done one batch at a time: the hosts of a batch are
+        deleted, then added in their new folder, and those that could
+        not be added are added back in their old folder, so that a
+        failure leaves as few hosts as possible deleted.
+
+        # Returns
+        dict with keys ``deleted`` (list of host names), ``added``, ``moved``
+        and ``edited`` (reports like those returned by #WebApi.add_hosts and
+        #WebApi.edit_hosts), and ``restored`` (list of names of hosts that
+        could not be moved and were put back in their old folder)
+        """
+        result = {
+            'deleted': [],
+            'added': {'succeeded_hosts': [], 'failed_hosts': {}},
+            'moved': {'succeeded_hosts': [], 'failed_hosts': {}},
+            'restored': [],
+            'edited': {'succeeded_hosts': [], 'failed_hosts': {}},
+        }  # type: Dict[str, Any]
+
+        if plan.delete:
+            self.api.delete_hosts(plan.delete, self.batch_size)
+            result['deleted'] = list(plan.delete)
+        if plan.add:
+            result['added'] = self.api.add_hosts(plan.add, self.batch_size)
+        for batch in _batched(plan.move, self.batch_size or self.api.batch_size):
+            self._move(plan, batch, result)
+        if plan.edit:
+            result['edited'] = self.api.edit_hosts(plan.edit, self.batch_size)
+        return result
+
+    def _move(self, plan, batch, result):
+        """
+        Move the hosts of `batch` to their new folder, adding back in their old folder those that cannot be moved.
+        """
+        self.api.delete_hosts([host['hostname'] for host in batch], self.batch_size)
+        moved = self.api.add_hosts(batch, self.batch_size)
+        result['moved']['succeeded_hosts'].extend(moved['succeeded_hosts'])
+        result['moved']['failed_hosts'].update(moved['failed_hosts'])
+        if moved['failed_hosts']:
+            restored = self.api.add_hosts(
+                [plan.move_from[hostname] for hostname in moved['failed_hosts']], self.batch_size)
+            result['restored'].extend(restored['succeeded_hosts'])
+
+    def reconcile(self,
+                  desired: Mapping[str, Optional[Mapping[str, Any]]],
+                  dry_run: bool = False):
+        """
+        Compute the plan to reach the `desired` state and (unless `dry_run` is true) apply it.
+
+        # Returns
+        tuple `(plan, result)`, where `result` is the return value of
+        #HostReconciler.apply, or `None` in a dry run
+        """
+        plan = self.plan(desired)
+        if dry_run or not plan:
+            return plan, None
+        return plan, self.apply(plan)
+
+    @staticmethod
+    def _normalize_folder(folder):
+        return folder.strip('/')
+
+    @staticmethod
+    def _normalize_attributes(attributes, tags=None):
+        """
+        Return attributes as Check_MK reports them back.
+
+        Tags are turned into ``tag_*`` attributes, `None` values are
+        dropped, booleans become ``1`` or ``0``, and tuples become lists
+        (as they would after a round-trip through JSON).
+        """
+        result = {}
+        for name, value in WebApi._host_attributes(tags=tags, **attributes).items():
+            if value is None:
+                continue
+            if value is True or value is False:
+                value = ('1' if value else '0')
+            elif isinstance(value, (list, tuple, dict)):
+                value = json.loads(json.dumps(value))
+            result[name] = value
+        return result
+
+
+def _normalize_rule(rule):
+    """
+    Return `rule` with an empty ``condition`` and ``options`` where they are missing.
+    """
+    return dict(rule, condition=rule.get('condition') or {}, options=rule.get('options') or {})
+
+
+def _rule_key(value):
+    """
+    Return a hashable form of a rule (or part of one) for comparison.
+
+    Tuples and lists are kept apart, since Check_MK rule values tell them apart.
+    """
+    if isinstance(value, dict):
+        return ('dict', tuple(sorted((repr(key), _rule_key(item)) for key, item in value.items())))
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, tuple(_rule_key(item) for item in value))
+    return ('value', type(value).__name__, repr(value))
+
+
+def _diff_rules(current, desired):
+    """
+    Return the numbers of rules added, removed and changed to turn list `current` into `desired`.
+    """
+    counts = {'added': 0, 'removed': 0, 'changed': 0}
+    matcher = SequenceMatcher(None, [_rule_key(rule) for rule in current], [_rule_key(rule) for rule in desired],
+                              autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        old, new = i2 - i1, j2 - j1
+        counts['changed'] += min(old, new)
+        counts['added'] += max(0, new - old)
+        counts['removed'] += max(0, old - new)
+    return counts
+
+
+class RulesetPlan:
+    """
+    Changes needed to bring a Check_MK rule set to a desired state.
+
+    # Attributes
+    ruleset_name (str): name of the rule set
+    ruleset (dict): the whole rule set to write, by folder, as expected by #WebApi.set_ruleset
+    configuration_hash (str): hash of the rule set the plan is based on; Check_MK
+        refuses the write if the rule set has changed since
+    folders (dict): for each folder whose rules change, the number of rules
+        ``added``, ``removed`` and ``changed``
+    """
+
+    def __init__(self, ruleset_name: str, ruleset: Dict[str, List[Dict[str, Any]]],
+                 configuration_hash: Optional[str] = None):
+        self.ruleset_name = ruleset_name
+        self.ruleset = ruleset
+        self.configuration_hash = configuration_hash
+        self.folders = {}  # type: Dict[str, Dict[str, int]]
+
+    def __bool__(self):
+        return bool(self.folders)
+
+    def __repr__(self):
+        return '<RulesetPlan {0} folders={folders} added={added} removed={removed} changed={changed}>'.format(
+            self.ruleset_name, **self.summary())
+
+    def summary(self):
+        """
+        Return the number of folders whose rules change, and the numbers of rules added, removed, and changed.
+        """
+        summary = {'folders': len(self.folders), 'added': 0, 'removed': 0, 'changed': 0}
+        for counts in self.folders.values():
+            for name, count in counts.items():
+                summary[name] += count
+        return summary
+
+
+class RulesetReconciler:
+    """
+    Compare desired rule sets with the current ones, and write only those that differ.
+
+    Rules are compared per folder and in order, since Check_MK applies
+    the first matching rule; a missing ``condition`` or ``options``
+    equals an empty one.  A rule set that is already as desired is not
+    written, so a full sync creates no pending changes when nothing
+    changed.  Current rule sets are read with #WebApi.get_ruleset, so a
+    client with a #RulesetCache makes repeated syncs cheap.
+
+    # Arguments
+    api (WebApi): client for the Check_MK site to reconcile
+    delete (bool): if True, remove the rules of folders that are not in the desired rule set;
+        otherwise, leave them as they are.  Either way, a folder desired with
+        an empty list of rules loses its rules.
+
+    # Examples
+    ```python
+    reconciler = RulesetReconciler(api)
+    plans, written = reconciler.reconcile({
+        'host_groups': {'web': [{'value': 'webservers', 'condition': {}}]},
+    })
+    for name, plan in plans.items():
+        print(name, plan.summary())
+    ```
+    """
+
+    def __init__(self, api, delete: bool = False):
+        self.api = api
+        self.delete = delete
+
+    def plan(self,
+             ruleset_name: str,
+             desired: Mapping[str, Sequence[Mapping[str, Any]]],
+             current: Optional[Mapping[str, Any]] = None):
+        """
+        Compute the changes needed to bring rule set `ruleset_name` to the `desired` state.
+
+        # Arguments
+        ruleset_name (str): name of the rule set
+        desired (dict): maps folder names (``''`` for the main folder) to their list of rules
+        current (dict): current rule set, as returned by #WebApi.get_ruleset (with
+            keys ``ruleset`` and ``configuration_hash``); fetched from the server if `None`
+
+        # Returns
+        #RulesetPlan
+        """
+        if current is None:
+            current = self.api.get_ruleset(ruleset_name)
+        present = {
+            folder.strip('/'): [_normalize_rule(rule) for rule in rules]
+            for folder, rules in (current.get('ruleset') or {}).items() if rules
+        }
+        wanted = {
+            folder.strip('/'): [_normalize_rule(rule) for rule in rules]
+            for folder, rules in desired.items()
+        }
+
+        ruleset = ({} if self.delete else dict(present))
+        for folder, rules in wanted.items():
+            if rules:
+                ruleset[folder] = rules
+            else:
+                ruleset.pop(folder, None)
+        plan = RulesetPlan(ruleset_name, ruleset, current.get('configuration_hash'))
+        for folder in sorted(set(present) | set(ruleset)):
+            counts = _diff_rules(present.get(folder, []), ruleset.get(folder, []))
+            if any(counts.values()):
+                plan.folders[folder] = counts
+        return plan
+
+    def apply(self, plan: RulesetPlan):
+        """
+        Write the rule set of `plan`, unless it changes nothing.
+
+        # Returns
+        `True` if the rule set was written
+
+        # Raises
+        ResultError: if the rule set has changed since the plan was made
+        """
+        if not plan:
+            return False
+        self.api.set_ruleset(plan.ruleset_name, plan.ruleset, plan.configuration_hash)
+        return True
+
+    def reconcile(self,
+                  desired: Mapping[str, Mapping[str, Sequence[Mapping[str, Any]]]],
+                  dry_run: bool = False):
+        """
+        Compute the plan of each desired rule set and (unless `dry_run` is true) apply those with changes.
+
+        # Arguments
+        desired (dict): maps rule set names to their desired rules, as for #RulesetReconciler.plan
+
+        # Returns
+        tuple `(plans, written)`, where `plans` maps each rule set name to its
+        #RulesetPlan, and `written` lists the names of the rule sets written
+        """
+        plans = {name: self.plan(name, rules) for name, rules in desired.items()}
+        written = []  # type: List[str]
+        if not dry_run:
+            for name, plan in plans.items():
+                if self.apply(plan):
+                    written.append(name)
+        return plans, written
@@ -4,16 +4,27 @@ import string
 
 import pytest
 
-from cmkclient import WebApi, Error
-
-api = WebApi(
-    os.environ['CHECK_MK_URL'],
-    os.environ['CHECK_MK_USER'],
-    os.environ['CHECK_MK_SECRET']
-)
-
-
-def setup():
+from cmkclient import WebApi, Error, ResultError, TTLCache
+from cmkclient.fakeserver import FakeServer
+from cmkclient.metrics import MetricsCollector
+
+
+@pytest.fixture(scope='module')
+def api():
+    if 'CHECK_MK_URL' in os.environ:
+        yield WebApi(
+            os.environ['CHECK_MK_URL'],
+            os.environ['CHECK_MK_USER'],
+            os.environ['CHECK_MK_SECRET']
+        )
+    else:
+        # no live site configured: run against the in-process stand-in
+        with FakeServer() as server:
+            yield server.api()
+
+
+@pytest.fixture(autouse=True)
+def clean_site(api):
     api.delete_all_hosts()
     api.delete_all_hostgroups()
     api.delete_all_servicegroups()
@@ -23,7 +34,7 @@ def setup():
             api.delete_contactgroup(group)
 
     for user_id in api.get_all_users():
-        if user_id != 'cmkadmin' and user_id != os.environ['CHECK_MK_USER']:
+        if user_id != 'cmkadmin' and user_id != api.username:
             api.delete_user(user_id)
 
     for folder in api.get_all_folders():
@@ -31,18 +42,43 @@ def setup():
             api.delete_folder(folder)
 
 
-def test_add_host():
+def test_add_host(api):
     api.add_host('host00')
     assert 'host00' in api.get_all_hosts()
 
 
-def test_add_duplicate_host():
+def test_add_duplicate_host(api):
     with pytest.raises(Error):
         api.add_host('host00')
         api.add_host('host00')
 
 
-def test_edit_host():
+def test_add_hosts(api):
+    result = api.add_hosts(['host00', {'hostname': 'host01', 'ipaddress': '192.168.0.101'}], batch_size=1)
+    assert sorted(result['succeeded_hosts']) == ['host00', 'host01']
+    assert not result['failed_hosts']
+    assert api.get_host('host01')['attributes']['ipaddress'] == '192.168.0.101'
+
+
+def test_add_hosts_reports_failures(api):
+    api.add_host('host00')
+    result = api.add_hosts(['host00', 'host01'])
+    assert result['succeeded_hosts'] == ['host01']
+    assert 'host00' in result['failed_hosts']
+
+
+def test_edit_hosts(api):
+    api.add_hosts(['host00', 'host01'])
+    result = api.edit_hosts([
+        {'hostname': 'host00', 'ipaddress': '192.168.0.100'},
+        {'hostname': 'host02', 'ipaddress': '192.168.0.102'},
+    ])
+    assert result['succeeded_hosts'] == ['host00']
+    assert 'host02' in result['failed_hosts']
+    assert api.get_host('host00')['attributes']['ipaddress'] == '192.168.0.100'
+
+
+def test_edit_host(api):
     api.add_host('host00', ipaddress='192.168.0.100')
     assert api.get_host('host00')['attributes']['ipaddress'] == '192.168.0.100'
 
@@ -50,29 +86,29 @@ def test_edit_host():
     assert api.get_host('host00')['attributes']['ipaddress'] == '192.168.0.101'
 
 
-def test_unset_host_attribute():
+def test_unset_host_attribute(api):
     api.add_host('host00', ipaddress='192.168.0.100')
     assert api.get_host('host00')['attributes']['ipaddress'] == '192.168.0.100'
     api.edit_host('host00', unset_attributes=['ipaddress'])
     assert 'ipaddress' not in api.get_host('host00')['attributes']
 
 
-def test_edit_nonexistent_host():
+def test_edit_nonexistent_host(api):
     with pytest.raises(Error):
         api.edit_host('host00', ipaddress='192.168.0.101')
 
 
-def test_get_host():
+def test_get_host(api):
     api.add_host('host00')
     assert api.get_host('host00')['hostname'] == 'host00'
 
 
-def test_get_nonexistent_host():
+def test_get_nonexistent_host(api):
     with pytest.raises(Error):
         api.get_host('host00')
 
 
-def test_get_all_hosts():
+def test_get_all_hosts(api):
     api.add_host('host00')
     api.add_host('host01')
 
@@ -82,7 +118,49 @@ def test_get_all_hosts():
     assert 'host01' in all_hosts
 
 
-def test_get_hosts_by_folder():
+def test_iter_all_hosts(api):
+    api.add_host('host00')
+    api.add_host('host01')
+
+    assert dict(api.iter_all_hosts()) == api.get_all_hosts()
+
+
+def test_request_hooks(api):
+    metrics = MetricsCollector()
+    metrics.attach(api)
+    try:
+        api.add_host('host00')
+        with pytest.raises(ResultError):
+            api.add_host('host00')
+        dict(api.iter_all_hosts())
+    finally:
+        metrics.detach(api)
+
+    stats = metrics.as_dict()
+    assert stats['add_host']['count'] == 2
+    assert stats['add_host']['result_errors'] == 1
+    assert stats['get_all_hosts']['count'] == 1
+    assert stats['get_all_hosts']['response_bytes'] > 0
+
+
+def test_get_all_hosts_cached(api):
+    cached_api = WebApi(api.web_api_base, api.username, api.secret, cache=TTLCache())
+    cached_api.add_host('host00')
+    all_hosts = cached_api.get_all_hosts()
+    assert cached_api.get_all_hosts() is all_hosts
+
+    # changes made through the same client invalidate the cache
+    cached_api.add_host('host01')
+    assert 'host01' in cached_api.get_all_hosts()
+
+    # ... but changes made through other clients do not
+    api.delete_host('host01')
+    assert 'host01' in cached_api.get_all_hosts()
+    cached_api.invalidate_cache()
+    assert 'host01' not in cached_api.get_all_hosts()
+
+
+def test_get_hosts_by_folder(api):
     api.add_folder('test')
     api.add_host('host00', 'test')
     api.add_host('host01', 'test')
@@ -93,7 +171,7 @@ def test_get_hosts_by_folder():
     assert 'host01' in hosts
 
 
-def test_delete_host():
+def test_delete_host(api):
     api.add_host('host00')
     assert len(api.get_all_hosts()) == 1
 
@@ -101,12 +179,12 @@ def test_delete_host():
     assert len(api.get_all_hosts()) == 0
 
 
-def test_delete_nonexistent_host():
+def test_delete_nonexistent_host(api):
     with pytest.raises(Error):
         api.delete_host('host00')
 
 
-def test_delete_all_hosts():
+def test_delete_all_hosts(api):
     api.add_host('host00')
     api.add_host('host01')
     assert len(api.get_all_hosts()) == 2
@@ -115,7 +193,35 @@ def test_delete_all_hosts():
     assert len(api.get_all_hosts()) == 0
 
 
-def test_discover_services():
+def test_delete_hosts(api):
+    api.add_hosts(['host00', 'host01', 'host02'])
+    api.delete_hosts(['host00', 'host01'], batch_size=1)
+    assert list(api.get_all_hosts()) == ['host02']
+
+
+def test_delete_hosts_returns_result(api, monkeypatch):
+    monkeypatch.setattr(api, 'make_request', lambda action, data=None, **kwargs: {action: data['hostnames']})
+    assert api.delete_hosts(['host00', 'host01'], batch_size=1) == {'delete_hosts': ['host01']}
+
+
+def test_delete_hosts_by_folder(api):
+    api.add_folder('test')
+    api.add_host('host00', 'test')
+    api.add_host('host01')
+
+    assert api.delete_hosts_by_folder('test') == ['host00']
+    assert list(api.get_all_hosts()) == ['host01']
+
+
+def test_delete_hosts_matching(api):
+    api.add_hosts(['host00', 'host01', 'host10'])
+
+    deleted = api.delete_hosts_matching(lambda hostname, host: hostname.endswith('0'))
+    assert sorted(deleted) == ['host00', 'host10']
+    assert list(api.get_all_hosts()) == ['host01']
+
+
+def test_discover_services(api):
     api.add_host('localhost')
     result = api.discover_services('localhost')
 
@@ -125,17 +231,50 @@ def test_discover_services():
     assert int(result['new_count']) >= 0
 
 
-def test_discover_services_for_nonexistent_host():
+def test_discover_services_for_nonexistent_host(api):
     with pytest.raises(Error):
         api.discover_services('localhost')
 
 
-def test_get_user():
+def test_iter_discover_services(api):
+    api.add_host('localhost')
+    results = dict(api.iter_discover_services(['localhost', 'nonexistent'], workers=2))
+
+    assert int(results['localhost']['added']) >= 0
+    assert isinstance(results['nonexistent'], Error)
+
+
+def test_discover_services_for_all_hosts(api):
+    api.add_host('localhost')
+    results = api.discover_services_for_all_hosts(workers=2)
+
+    assert list(results) == ['localhost']
+    assert int(results['localhost']['added']) >= 0
+
+
+def test_get_user(api):
     api.add_user('user00', 'User 00', 'p4ssw0rd')
     assert api.get_user('user00')['alias'] == 'User 00'
 
 
-def test_get_all_users():
+def test_get_user_cached(api):
+    cached_api = WebApi(api.web_api_base, api.username, api.secret, cache=TTLCache())
+    cached_api.add_user('user00', 'User 00', 'p4ssw0rd')
+    cached_api.add_user('user01', 'User 01', 'p4ssw0rd')
+    assert cached_api.get_user('user00')['alias'] == 'User 00'
+    assert cached_api.get_user('user01')['alias'] == 'User 01'
+    assert cached_api.cache.hits == 1
+
+    cached_api.edit_user('user00', {'alias': 'User 0'})
+    assert cached_api.get_user('user00')['alias'] == 'User 0'
+
+    api.edit_user('user00', {'alias': 'User Zero'})
+    assert cached_api.get_user('user00')['alias'] == 'User 0'
+    cached_api.invalidate_cache('get_all_users')
+    assert cached_api.get_user('user00')['alias'] == 'User Zero'
+
+
+def test_get_all_users(api):
     api.add_user('user00', 'User 00', 'p4ssw0rd')
     api.add_user('user01', 'User 01', 'p4ssw0rd')
 
@@ -144,29 +283,29 @@ def test_get_all_users():
     assert 'user01' in users
 
 
-def test_add_user():
+def test_add_user(api):
     api.add_user('user00', 'User 00', 'p4ssw0rd')
     assert 'user00' in api.get_all_users()
 
 
-def test_add_automation_user():
+def test_add_automation_user(api):
     api.add_automation_user('automation00', 'Automation 00', 's3cr3t1234')
     assert 'automation00' in api.get_all_users()
 
 
-def test_add_duplicate_user():
+def test_add_duplicate_user(api):
     with pytest.raises(Error):
         api.add_user('user00', 'User 00', 'p4ssw0rd')
         api.add_user('user00', 'User 00', 'p4ssw0rd')
 
 
-def test_add_duplicate_automation_user():
+def test_add_duplicate_automation_user(api):
     with pytest.raises(Error):
         api.add_automation_user('automation00', 'Automation 00', 's3cr3t1234')
         api.add_automation_user('automation00', 'Automation 00', 's3cr3t1234')
 
 
-def test_edit_user():
+def test_edit_user(api):
     api.add_user('user00', 'User 00', 'p4ssw0rd')
     assert api.get_all_users()['user00']['alias'] == 'User 00'
 
@@ -174,19 +313,19 @@ def test_edit_user():
     assert api.get_all_users()['user00']['alias'] == 'User 0'
 
 
-def test_unset_user_attribute():
+def test_unset_user_attribute(api):
     api.add_user('user00', 'User 00', 'p4ssw0rd', pager='49123456789')
     assert api.get_all_users()['user00']['pager'] == '49123456789'
     api.edit_user('user00', {}, unset_attributes=['pager'])
     assert 'pager' not in api.get_all_users()['user00']
 
 
-def test_edit_nonexistent_user():
+def test_edit_nonexistent_user(api):
     with pytest.raises(Error):
         api.edit_user('user00', {})
 
 
-def test_delete_user():
+def test_delete_user(api):
     api.add_user('user00', 'User 00', 'p4ssw0rd')
     assert 'user00' in api.get_all_users()
 
@@ -194,22 +333,22 @@ def test_delete_user():
     assert 'user00' not in api.get_all_users()
 
 
-def test_delete_nonexistent_user():
+def test_delete_nonexistent_user(api):
     with pytest.raises(Error):
         api.delete_user('user00')
 
 
-def test_get_folder():
+def test_get_folder(api):
     api.add_folder('productive')
     assert api.get_folder('productive')
 
 
-def test_get_nonexistent_folder():
+def test_get_nonexistent_folder(api):
     with pytest.raises(Error):
         assert api.get_folder('productive')
 
 
-def test_get_all_folders():
+def test_get_all_folders(api):
     api.add_folder('productive')
     api.add_folder('testing')
 
@@ -218,12 +357,12 @@ def test_get_all_folders():
     assert 'testing' in folders
 
 
-def test_add_folder():
+def test_add_folder(api):
     api.add_folder('productive')
     assert 'productive' in api.get_all_folders()
 
 
-def test_edit_folder():
+def test_edit_folder(api):
     api.add_folder('productive', snmp_community='public')
     assert api.get_folder('productive')['attributes']['snmp_community'] == 'public'
 
@@ -231,12 +370,12 @@ def test_edit_folder():
     assert api.get_folder('productive')['attributes']['snmp_community'] == 'private'
 
 
-def test_edit_nonexistent_folder():
+def test_edit_nonexistent_folder(api):
     with pytest.raises(Error):
         assert api.edit_folder('productive')
 
 
-def test_delete_folder():
+def test_delete_folder(api):
     api.add_folder('productive')
     assert 'productive' in api.get_all_folders()
 
@@ -244,17 +383,17 @@ def test_delete_folder():
     assert 'productive' not in api.get_all_folders()
 
 
-def test_delete_nonexistent_folder():
+def test_delete_nonexistent_folder(api):
     with pytest.raises(Error):
         api.delete_folder('productive')
 
 
-def test_get_contactgroup():
+def test_get_contactgroup(api):
     api.add_contactgroup('user', 'User')
     assert api.get_contactgroup('user')
 
 
-def test_get_all_contactgroups():
+def test_get_all_contactgroups(api):
     api.add_contactgroup('user', 'User')
     api.add_contactgroup('admin', 'Admin')
     groups = api.get_all_contactgroups()
@@ -262,52 +401,52 @@ def test_get_all_contactgroups():
     assert 'admin' in groups
 
 
-def test_get_nonexistent_contactgroup():
+def test_get_nonexistent_contactgroup(api):
     with pytest.raises(KeyError):
         api.get_contactgroup('user')
 
 
-def test_add_contactgroup():
+def test_add_contactgroup(api):
     api.add_contactgroup('user', 'User')
     assert api.get_contactgroup('user')['alias'] == 'User'
 
 
-def test_add_duplicate_contactgroup():
+def test_add_duplicate_contactgroup(api):
     with pytest.raises(Error):
         api.add_contactgroup('user', 'User')
         api.add_contactgroup('user', 'User')
 
 
-def test_edit_contactgroup():
+def test_edit_contactgroup(api):
     api.add_contactgroup('user', 'User')
     assert api.get_contactgroup('user')['alias'] == 'User'
     api.edit_contactgroup('user', 'Users')
     assert api.get_contactgroup('user')['alias'] == 'Users'
 
 
-def test_edit_nonexisting_contactgroup():
+def test_edit_nonexisting_contactgroup(api):
     with pytest.raises(Error):
         api.edit_contactgroup('user', 'Users')
 
 
-def test_delete_contactgroup():
+def test_delete_contactgroup(api):
     api.add_contactgroup('user', 'User')
     assert 'user' in api.get_all_contactgroups()
     api.delete_contactgroup('user')
     assert 'user' not in api.get_all_contactgroups()
 
 
-def test_delete_nonexistent_contactgroup():
+def test_delete_nonexistent_contactgroup(api):
     with pytest.raises(Error):
         api.delete_contactgroup('user')
 
 
-def test_get_hostgroup():
+def test_get_hostgroup(api):
     api.add_hostgroup('vm', 'VM')
     api.get_hostgroup('vm')
 
 
-def test_get_all_hostgroups():
+def test_get_all_hostgroups(api):
     api.add_hostgroup('vm', 'VM')
     api.add_hostgroup('physical', 'Physical')
     groups = api.get_all_hostgroups()
@@ -315,52 +454,52 @@ def test_get_all_hostgroups():
     assert 'physical' in groups
 
 
-def test_get_nonexistent_hostgroup():
+def test_get_nonexistent_hostgroup(api):
     with pytest.raises(KeyError):
         api.get_hostgroup('vm')
 
 
-def test_add_hostgroup():
+def test_add_hostgroup(api):
     api.add_hostgroup('vm', 'VM')
     assert api.get_hostgroup('vm')['alias'] == 'VM'
 
 
-def test_add_duplicate_hostgroup():
+def test_add_duplicate_hostgroup(api):
     with pytest.raises(Error):
         api.add_hostgroup('vm', 'VM')
         api.add_hostgroup('vm', 'VM')
 
 
-def test_edit_hostgroup():
+def test_edit_hostgroup(api):
     api.add_hostgroup('vm', 'VM')
     assert api.get_hostgroup('vm')['alias'] == 'VM'
     api.edit_hostgroup('vm', 'VMs')
     assert api.get_hostgroup('vm')['alias'] == 'VMs'
 
 
-def test_edit_nonexisting_hostgroup():
+def test_edit_nonexisting_hostgroup(api):
     with pytest.raises(Error):
         api.edit_hostgroup('vm', 'VM')
 
 
-def test_delete_hostgroup():
+def test_delete_hostgroup(api):
     api.add_hostgroup('vm', 'VM')
     assert 'vm' in api.get_all_hostgroups()
     api.delete_hostgroup('vm')
     assert 'vm' not in api.get_all_hostgroups()
 
 
-def test_delete_nonexistent_hostgroup():
+def test_delete_nonexistent_hostgroup(api):
     with pytest.raises(Error):
         api.delete_hostgroup('vm')
 
 
-def test_get_servicegroup():
+def test_get_servicegroup(api):
     api.add_servicegroup('db', 'Database')
     assert api.get_servicegroup('db')
 
 
-def test_get_all_servicegroups():
+def test_get_all_servicegroups(api):
     api.add_servicegroup('db', 'Database')
     api.add_servicegroup('web', 'Webserver')
     groups = api.get_all_servicegroups()
@@ -368,51 +507,51 @@ def test_get_all_servicegroups():
     assert 'web' in groups
 
 
-def test_get_nonexistent_servicegroup():
+def test_get_nonexistent_servicegroup(api):
     with pytest.raises(KeyError):
         api.get_servicegroup('db')
 
 
-def test_add_servicegroup():
+def test_add_servicegroup(api):
     api.add_servicegroup('db', 'Database')
     assert api.get_servicegroup('db')['alias'] == 'Database'
 
 
-def test_add_duplicate_servicegroup():
+def test_add_duplicate_servicegroup(api):
     with pytest.raises(Error):
         api.add_servicegroup('db', 'Database')
         api.add_servicegroup('db', 'Database')
 
 
-def test_edit_servicegroup():
+def test_edit_servicegroup(api):
     api.add_servicegroup('db', 'Database')
     assert api.get_servicegroup('db')['alias'] == 'Database'
     api.edit_servicegroup('db', 'Databases')
     assert api.get_servicegroup('db')['alias'] == 'Databases'
 
 
-def test_edit_nonexisting_servicegroup():
+def test_edit_nonexisting_servicegroup(api):
     with pytest.raises(Error):
         api.edit_servicegroup('db', 'Database')
 
 
-def test_delete_servicegroup():
+def test_delete_servicegroup(api):
     api.add_servicegroup('db', 'Database')
     assert 'db' in api.get_all_servicegroups()
     api.delete_servicegroup('db')
     assert 'db' not in api.get_all_servicegroups()
 
 
-def test_delete_nonexistent_servicegroup():
+def test_delete_nonexistent_servicegroup(api):
     with pytest.raises(Error):
         api.delete_servicegroup('db')
 
 
-def test_get_hosttags():
+def test_get_hosttags(api):
     assert api.get_hosttags()
 
 
-def test_set_hosttags():
+def test_set_hosttags(api):
     current_tags = api.get_hosttags()
     current_tags["tag_groups"].append({
         "id": ''.join(random.choice(string.ascii_lowercase) for i in range(10)),
@@ -428,29 +567,29 @@ def test_set_hosttags():
     api.set_hosttags(current_tags)
 
 
-def test_get_ruleset():
+def test_get_ruleset(api):
     assert api.get_ruleset('checkgroup_parameters:hw_fans_perc')
 
 
-def test_get_nonexistent_rulesets():
+def test_get_nonexistent_rulesets(api):
     with pytest.raises(Error):
         api.get_ruleset('nonexistent')
 
 
-def test_set_nonexistent_rulesets():
+def test_set_nonexistent_rulesets(api):
     with pytest.raises(Error):
         api.set_ruleset('nonexistent', {})
 
 
-def test_get_rulesets_info():
+def test_get_rulesets_info(api):
     assert api.get_rulesets_info()
 
 
-def test_get_site():
+def test_get_site(api):
     assert api.get_site('cmk')
 
 
-def test_set_site():
+def test_set_site(api):
     random_alias = 'alias_' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
     config = api.get_site('cmk')['site_config']
     config['alias'] = random_alias
@@ -460,13 +599,13 @@ def test_set_site():
 
 
 @pytest.mark.skip(reason="bug in Check_Mk")
-def test_login_site():
+def test_login_site(api):
     api.add_user('user00', 'User 00', 'p4ssw0rd')
     api.login_site('cmk', 'user00', 'p4ssw0rd')
 
 
 @pytest.mark.skip(reason="bug in Check_Mk")
-def test_logout_site():
+def test_logout_site(api):
     api.add_user('user00', 'User 00', 'p4ssw0rd')
     api.login_site('cmk', 'user00', 'p4ssw0rd')
     api.logout_site('cmk')
@@ -0,0 +1,157 @@
+"""
+Tests for the coalescing activation scheduler.
+"""
+
+import threading
+import time
+
+from cmkclient import ActivateMode, ResultError, WebApi
+from cmkclient.activation import ActivationScheduler
+
+
+class _RecordingApi:
+    """
+    Stand-in for `WebApi` that records calls to `activate_changes`.
+    """
+
+    def __init__(self):
+        self.listeners = []
+        self.activations = []
+        #: set when `activate_changes` is called
+        self.activated = threading.Event()
+        #: `activate_changes` returns once this is set
+        self.proceed = threading.Event()
+        self.proceed.set()
+        self.running = 0
+        self.max_running = 0
+        #: exceptions raised by the next calls to `activate_changes`
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def add_change_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_change_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def write(self, action, data=None):
+        for listener in self.listeners:
+            listener(action, data)
+
+    def activate_changes(self, mode=ActivateMode.DIRTY, sites=None, allow_foreign_changes=False):
+        with self._lock:
+            self.activations.append((mode, sites))
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        self.activated.set()
+        self.proceed.wait(5)
+        with self._lock:
+            self.running -= 1
+            if self.errors:
+                raise self.errors.pop(0)
+
+
+def test_changes_are_coalesced():
+    api = _RecordingApi()
+    with ActivationScheduler(api, quiet_period=0.1) as scheduler:
+        for _ in range(10):
+            api.write('edit_host', {'hostname': 'host00'})
+        assert api.activated.wait(5)
+        assert api.activations == [(ActivateMode.DIRTY, None)]
+        assert scheduler.changes == 10
+        assert not scheduler.pending
+    assert api.listeners == []
+
+
+def test_max_delay():
+    api = _RecordingApi()
+    with ActivationScheduler(api, quiet_period=60, max_delay=0.1):
+        # changes keep coming, but activation is not put off for longer than `max_delay`
+        started = time.monotonic()
+        api.write('edit_host', {'hostname': 'host00'})
+        while not api.activated.wait(0.01):
+            assert time.monotonic() - started < 5
+            api.write('edit_host', {'hostname': 'host00'})
+        assert len(api.activations) == 1
+
+
+def test_flush_waits_for_running_activation():
+    api = _RecordingApi()
+    api.proceed.clear()
+    with ActivationScheduler(api, quiet_period=0) as scheduler:
+        api.write('edit_host', {'hostname': 'host00'})
+        assert api.activated.wait(5)
+        api.write('edit_host', {'hostname': 'host01'})
+        flusher = threading.Thread(target=scheduler.flush)
+        flusher.start()
+        # still waiting for the activation started in the background
+        flusher.join(0.1)
+        assert flusher.is_alive()
+        api.proceed.set()
+        flusher.join()
+    assert len(api.activations) == 2
+    assert api.max_running == 1
+
+
+def test_specific_sites():
+    api = _RecordingApi()
+    with ActivationScheduler(api, quiet_period=60):
+        api.write('add_host', {'hostname': 'host00', 'attributes': {'site': 'b'}})
+        api.write('add_hosts', {'hosts': [{'hostname': 'host01', 'attributes': {'site': 'a'}}]})
+    assert api.activations == [(ActivateMode.SPECIFIC, ['a', 'b'])]
+
+
+def test_failed_activation_is_retried():
+    api = _RecordingApi()
+    api.errors.append(ResultError(1, 'Check_MK exception: There is an activation already running.'))
+    errors = []
+    with ActivationScheduler(api, quiet_period=60, on_error=errors.append) as scheduler:
+        api.write('add_host', {'hostname': 'host00', 'attributes': {'site': 'a'}})
+        scheduler.flush()
+        assert errors == [scheduler.last_error]
+        assert scheduler.pending
+        api.write('add_host', {'hostname': 'host01', 'attributes': {'site': 'b'}})
+    assert api.activations == [(ActivateMode.SPECIFIC, ['a']), (ActivateMode.SPECIFIC, ['a', 'b'])]
+    assert scheduler.last_error is None
+    assert not scheduler.pending
+
+
+def test_failed_activation_is_retried_in_background():
+    api = _RecordingApi()
+    api.errors.append(ResultError(1, 'Check_MK exception: There is an activation already running.'))
+    with ActivationScheduler(api, quiet_period=0.05):
+        api.write('edit_host', {'hostname': 'host00'})
+        started = time.monotonic()
+        while len(api.activations) < 2:
+            assert time.monotonic() - started < 5
+            time.sleep(0.01)
+        assert api.activations == [(ActivateMode.DIRTY, None)] * 2
+
+
+def test_nothing_to_activate_is_not_retried():
+    api = _RecordingApi()
+    api.errors.append(ResultError(1, 'Check_MK exception: Currently there are no changes to activate.'))
+    with ActivationScheduler(api, quiet_period=60) as scheduler:
+        api.write('edit_host', {'hostname': 'host00'})
+        scheduler.flush()
+        assert not scheduler.pending
+    assert len(api.activations) == 1
+
+
+def test_flush_on_close():
+    api = _RecordingApi()
+    scheduler = ActivationScheduler(api, quiet_period=60)
+    scheduler.close()
+    assert api.activations == []
+    scheduler = ActivationScheduler(api, quiet_period=60)
+    api.write('delete_host', {'hostname': 'host00'})
+    scheduler.close()
+    assert api.activations == [(ActivateMode.DIRTY, None)]
+
+
+def test_change_actions():
+    assert WebApi._is_change_action('add_hosts')
+    assert WebApi._is_change_action('set_ruleset')
+    assert WebApi._is_change_action('discover_services')
+    assert not WebApi._is_change_action('get_all_hosts')
+    assert not WebApi._is_change_action('activate_changes')
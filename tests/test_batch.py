@@ -0,0 +1,67 @@
+"""
+Tests for running Web API calls in batch.
+"""
+
+import io
+import json
+import sys
+
+from cmkclient.batch import run_batch
+from cmkclient.cli import main
+from cmkclient.fakeserver import FakeServer
+
+
+COMMANDS = [
+    {'id': 'a', 'method': 'add_host', 'args': ['host00'], 'kwargs': {'ipaddress': '10.0.0.1'}},
+    {'method': 'discover_services', 'kwargs': {'hostname': 'host00', 'mode': 'refresh'}},
+    {'method': 'add_host', 'args': ['host00']},
+    {'method': '_prepare_request', 'args': ['get_all_hosts']},
+    {'method': 'get_host', 'kwargs': {'unknown': 1}},
+    {'method': 'iter_all_hosts'},
+]
+
+
+def _lines(commands):
+    return [json.dumps(command) + '\n' for command in commands] + ['\n', 'not json\n']
+
+
+def _results(output):
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def test_run_batch():
+    with FakeServer() as server:
+        output = io.StringIO()
+        counts = run_batch(server.api(), _lines(COMMANDS), output)
+    assert counts == {'ok': 3, 'failed': 4}
+    results = _results(output)
+    assert [result['id'] for result in results] == ['a', 2, 3, 4, 5, 6, 8]
+    assert [result['ok'] for result in results] == [True, True, False, False, False, True, False]
+    assert results[1]['result']['added'] == '3'
+    assert results[2]['error']['type'] == 'ResultError'
+    assert results[2]['error']['result_code'] == 1
+    assert results[3]['error'] == {'type': 'ValueError', 'message': "Unknown method '_prepare_request'"}
+    assert results[4]['error']['type'] == 'TypeError'
+    assert results[5]['result'][0][0] == 'host00'
+    assert results[6]['error']['type'] == 'JSONDecodeError'
+    assert all(result['elapsed'] >= 0 for result in results)
+
+
+def test_run_batch_concurrently():
+    commands = [{'id': n, 'method': 'add_host', 'args': ['host{0:02}'.format(n)]} for n in range(20)]
+    with FakeServer(latency=0.01) as server:
+        output = io.StringIO()
+        counts = run_batch(server.api(), _lines(commands)[:-2], output, workers=4)
+        assert len(server.site.hosts) == 20
+    assert counts == {'ok': 20, 'failed': 0}
+    assert sorted(result['id'] for result in _results(output)) == list(range(20))
+
+
+def test_cli_batch(monkeypatch, capsys):
+    with FakeServer() as server:
+        monkeypatch.setattr(sys, 'argv', [
+            'cmkclient', '--url', server.url, '--username', server.username, '--secret', server.secret, 'batch'])
+        monkeypatch.setattr(sys, 'stdin', io.StringIO(''.join(_lines(COMMANDS[:2]))))
+        main()
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [result['ok'] for result in results] == [True, True, False]
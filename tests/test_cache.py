@@ -0,0 +1,241 @@
+"""
+Tests for the response and rule set caches.
+"""
+
+import json
+import time
+
+import pytest
+
+from cmkclient import WebApi, _MISSING
+from cmkclient.cache import RulesetCache, SQLiteCache, TTLCache
+from cmkclient.exception import AuthenticationError, ResultError
+from cmkclient.fakeserver import FakeServer
+
+
+def test_get_set():
+    cache = TTLCache()
+    assert cache.get('key') is None
+    cache.set('key', 42)
+    assert cache.get('key') == 42
+
+
+def test_expiry():
+    cache = TTLCache(ttl=0.01)
+    cache.set('key', 42)
+    time.sleep(0.02)
+    assert cache.get('key', 'missing') == 'missing'
+    assert len(cache) == 0
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_invalidate():
+    cache = TTLCache()
+    cache.set(('x', 1), 1)
+    cache.set(('y', 2), 2)
+    cache.invalidate(lambda key: key[0] == 'x')
+    assert cache.get(('x', 1)) is None
+    assert cache.get(('y', 2)) == 2
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_stats():
+    cache = TTLCache(maxsize=1)
+    cache.get('a')
+    cache.set('a', 1)
+    cache.get('a')
+    cache.set('b', 2)
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'evictions': 1, 'size': 1}
+
+
+def test_sqlite_cache(tmpdir):
+    path = str(tmpdir.join('cache.sqlite'))
+    cache = SQLiteCache(path)
+    assert cache.get(('site', 'get_all_hosts')) is None
+    cache.set(('site', 'get_all_hosts'), {'host00': {'path': ''}})
+    assert cache.get(('site', 'get_all_hosts')) == {'host00': {'path': ''}}
+    cache.close()
+
+    # entries outlive the process that stored them
+    cache = SQLiteCache(path)
+    assert cache.get(('site', 'get_all_hosts')) == {'host00': {'path': ''}}
+    cache.set(('other', 'get_all_hosts'), {})
+    cache.invalidate(lambda key: key[0] == 'site')
+    assert cache.get(('site', 'get_all_hosts')) is None
+    assert cache.get(('other', 'get_all_hosts')) == {}
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'evictions': 0, 'size': 1}
+
+
+def test_sqlite_cache_decodes_once(tmpdir, monkeypatch):
+    path = str(tmpdir.join('cache.sqlite'))
+    cache = SQLiteCache(path)
+    SQLiteCache(path).set('users', {'automation': {}})
+    loads = []
+    decode = json.loads
+
+    def counting_loads(text):
+        loads.append(text)
+        return decode(text)
+
+    monkeypatch.setattr(json, 'loads', counting_loads)
+    first = cache.get('users')
+    assert cache.get('users') is first
+    assert len(loads) == 1
+
+    # a value stored by another process is seen, and decoded again
+    time.sleep(0.01)
+    SQLiteCache(path).set('users', {'guest': {}})
+    assert cache.get('users') == {'guest': {}}
+    assert len(loads) == 2
+    assert cache.stats()['hits'] == 3
+
+
+def test_sqlite_cache_expiry_and_eviction(tmpdir):
+    cache = SQLiteCache(str(tmpdir.join('cache.sqlite')), ttl=0.05, maxsize=2)
+    cache.set('a', 1)
+    time.sleep(0.01)
+    cache.set('b', 2)
+    time.sleep(0.01)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.evictions == 1
+    assert cache.get('b') is None
+    time.sleep(0.06)
+    assert cache.get('a', 'missing') == 'missing'
+    assert len(cache) == 1
+
+
+def test_sqlite_cache_warm_start(tmpdir):
+    path = str(tmpdir.join('cache.sqlite'))
+    with FakeServer() as server:
+        server.api().add_host('host00')
+        first = WebApi(server.url, server.username, server.secret, cache=SQLiteCache(path))
+        assert list(first.get_all_hosts()) == ['host00']
+        first.get_hosttags()
+
+        second = WebApi(server.url, server.username, server.secret, cache=SQLiteCache(path))
+        requests = []
+        second.add_request_hook(before=lambda info: requests.append(info.action))
+        assert list(second.get_all_hosts()) == ['host00']
+        second.get_hosttags()
+        assert requests == []
+
+        # writes drop the entries they make stale, for every process
+        first.add_host('host01', 'web')
+        assert sorted(second.get_all_hosts()) == ['host00', 'host01']
+        assert 'web' in second.get_all_folders()
+        second.get_hosttags()
+        assert requests == ['get_all_hosts', 'get_all_folders']
+
+
+def test_sqlite_cache_keeps_users_apart(tmpdir):
+    path = str(tmpdir.join('cache.sqlite'))
+    with FakeServer() as server:
+        server.api().add_host('host00')
+        WebApi(server.url, server.username, server.secret, cache=SQLiteCache(path)).get_all_hosts()
+
+        # another user must not be served what the first one was allowed to see
+        other = WebApi(server.url, 'guest', 'guest-secret', cache=SQLiteCache(path))
+        with pytest.raises(AuthenticationError):
+            other.get_all_hosts()
+
+
+RULESET = 'checkgroup_parameters:hw_fans_perc'
+
+
+def test_ruleset_cache(monkeypatch):
+    parsed = []
+    parse_response = WebApi._parse_response
+    monkeypatch.setattr(WebApi, '_parse_response', staticmethod(
+        lambda response, body, output_format: parsed.append(body) or parse_response(response, body, output_format)))
+
+    with FakeServer() as server:
+        api = WebApi(server.url, server.username, server.secret, ruleset_cache=RulesetCache(ttl=0))
+        requests = []
+        api.add_request_hook(before=lambda info: requests.append(info.action))
+
+        first = api.get_ruleset(RULESET)
+        assert api.get_ruleset(RULESET) is first
+        # downloaded twice, parsed once
+        assert requests == ['get_ruleset', 'get_ruleset']
+        assert len(parsed) == 1
+        assert api.ruleset_cache.stats() == {'hits': 0, 'unchanged': 1, 'misses': 2, 'size': 1}
+
+        # changed elsewhere: parsed again
+        server.site.rulesets[RULESET][''][0]['value'] = {'levels_lower': (20.0, 10.0)}
+        second = api.get_ruleset(RULESET)
+        assert second['ruleset'][''][0]['value'] == {'levels_lower': (20.0, 10.0)}
+        assert second['configuration_hash'] != first['configuration_hash']
+        assert len(parsed) == 2
+
+
+def test_ruleset_cache_ttl():
+    with FakeServer() as server:
+        api = WebApi(server.url, server.username, server.secret, ruleset_cache=RulesetCache(ttl=60))
+        requests = []
+        api.add_request_hook(before=lambda info: requests.append(info.action))
+        api.get_ruleset(RULESET)
+        api.get_ruleset(RULESET)
+        assert requests == ['get_ruleset']
+
+
+class _Response:
+    status = 200
+
+
+@pytest.mark.parametrize('body, error', [
+    (b'{"result": "Check_MK exception: {\'configuration_hash\': \'abc\'}", "result_code": 1}', ResultError),
+    (b'Authentication error: {"configuration_hash": "abc", "result_code": 0}', AuthenticationError),
+])
+def test_ruleset_cache_checks_errors_first(body, error):
+    api = WebApi('http://cmk.example/site', 'automation', 'secret', ruleset_cache=RulesetCache())
+    api.ruleset_cache.set(api._ruleset_key(RULESET), {'ruleset': {}, 'configuration_hash': 'abc'})
+    with pytest.raises(error):
+        api._parse_result('get_ruleset', {'ruleset_name': RULESET}, _Response(), body, 'json')
+
+
+def test_ruleset_cache_keeps_users_apart():
+    cache = RulesetCache()
+    api = WebApi('http://cmk.example/site', 'automation', 'secret', ruleset_cache=cache)
+    other = WebApi('http://cmk.example/site', 'admin', 'secret', ruleset_cache=cache)
+    result = {'ruleset': {}, 'configuration_hash': 'abc'}
+    cache.set(api._ruleset_key(RULESET), result)
+    assert api._cached_result('get_ruleset', {'ruleset_name': RULESET}, None) is result
+    assert other._cached_result('get_ruleset', {'ruleset_name': RULESET}, None) is _MISSING
+
+    # a change made by any user drops every copy
+    cache.set(other._ruleset_key(RULESET), result)
+    other._invalidate_cache('set_ruleset', {'ruleset_name': RULESET})
+    assert len(cache) == 0
+
+
+def test_set_ruleset_uses_cached_hash():
+    with FakeServer() as server:
+        api = WebApi(server.url, server.username, server.secret, ruleset_cache=RulesetCache(ttl=60))
+        other = server.api()
+        ruleset = api.get_ruleset(RULESET)['ruleset']
+        api.set_ruleset(RULESET, ruleset)
+        # setting the rule set dropped it from the cache
+        assert len(api.ruleset_cache) == 0
+
+        ruleset = api.get_ruleset(RULESET)['ruleset']
+        other.set_ruleset(RULESET, {})
+        with pytest.raises(ResultError):
+            api.set_ruleset(RULESET, ruleset, use_cached_hash=True)
+        assert api.get_ruleset(RULESET)['ruleset'] == {}
+
+        # the cached hash is only sent when asked for
+        other.set_ruleset(RULESET, ruleset)
+        api.set_ruleset(RULESET, {})
+        assert api.get_ruleset(RULESET)['ruleset'] == {}
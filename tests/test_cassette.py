@@ -0,0 +1,92 @@
+"""
+Tests for recording and replaying Web API traffic.
+"""
+
+import gzip
+import time
+
+import pytest
+
+from cmkclient import WebApi
+from cmkclient.cassette import RecordingPool, ReplayPool, recording
+from cmkclient.exception import CassetteMismatchError
+from cmkclient.fakeserver import FakeServer
+
+
+@pytest.fixture
+def cassette(tmp_path):
+    path = str(tmp_path / 'traffic.jsonl.gz')
+    with FakeServer(action_latency={'get_all_hosts': 0.05}) as server:
+        api = server.api()
+        with recording(api, path) as recorder:
+            api.add_host('host00', ipaddress='10.0.0.1')
+            api.add_host('host01')
+            api.get_all_hosts()
+            api.get_host('host00')
+        assert recorder.recorded == 4
+        assert api.pool is recorder.pool
+        secret = server.secret
+    with gzip.open(path, 'rt') as cassette_file:
+        assert secret not in cassette_file.read()
+    return path
+
+
+def test_replay(cassette):
+    api = WebApi('http://replay/cmk', 'automation', 'other-secret', pool=ReplayPool(cassette, timing='fast'))
+    # order of distinct requests does not matter
+    assert api.get_host('host00')['attributes']['ipaddress'] == '10.0.0.1'
+    assert sorted(api.get_all_hosts()) == ['host00', 'host01']
+    api.add_host('host01')
+    api.add_host('host00', ipaddress='10.0.0.1')
+    assert api.pool.stats() == {'replayed': 4, 'missing': 0, 'remaining': 0}
+
+    with pytest.raises(CassetteMismatchError) as excinfo:
+        api.get_all_hosts()
+    assert excinfo.value.action == 'get_all_hosts'
+
+
+def test_replay_timing(cassette):
+    api = WebApi('http://replay/cmk', 'automation', 'secret', pool=ReplayPool(cassette, loop=True))
+    for _ in range(2):
+        started = time.monotonic()
+        api.get_all_hosts()
+        assert time.monotonic() - started >= 0.05
+    api.pool.speed = 1000
+    started = time.monotonic()
+    api.get_all_hosts()
+    assert time.monotonic() - started < 0.05
+
+
+def test_recording_pool(tmp_path):
+    path = str(tmp_path / 'traffic.jsonl')
+    with FakeServer() as server:
+        pool = RecordingPool(server.api().pool, path)
+        api = WebApi(server.url, server.username, server.secret, pool=pool)
+        assert list(api.iter_all_hosts()) == []
+        pool.close()
+    api = WebApi('http://replay/cmk', 'automation', 'secret', pool=ReplayPool(path, timing='fast'))
+    assert list(api.iter_all_hosts()) == []
+
+
+def test_secrets_are_not_recorded(tmp_path):
+    path = str(tmp_path / 'traffic.jsonl')
+    with FakeServer() as server:
+        api = server.api()
+        with recording(api, path):
+            api.add_user('alice', 'Alice', 'pa$$ "w0rd"')
+            api.add_automation_user('robot', 'Robot', 'r0b0t-s3cr3t')
+            api.edit_user('alice', {'password': 'n3w-pa$$'})
+        # the wrapped pool is still usable
+        assert 'alice' in api.get_all_users()
+    with open(path) as cassette_file:
+        text = cassette_file.read()
+    for secret in ('pa$$', 'w0rd', 'r0b0t-s3cr3t', 'n3w-pa$$'):
+        assert secret not in text
+    assert '<redacted>' in text
+
+    # a replayed request matches whatever secret it carries
+    api = WebApi('http://replay/cmk', 'automation', 'secret', pool=ReplayPool(path, timing='fast'))
+    api.add_automation_user('robot', 'Robot', 'another-secret')
+    api.add_user('alice', 'Alice', 'pa$$ "w0rd"')
+    api.edit_user('alice', {'password': 'n3w-pa$$'})
+    assert api.pool.stats()['missing'] == 0
@@ -2,9 +2,14 @@
 Smoke tests for the command-line client.
 """
 
+import json
+import subprocess
 import sys
 
-from cmkclient.cli import main
+import pytest
+
+from cmkclient.cli import _fast_command, main
+from cmkclient.fakeserver import FakeServer
 
 
 def test_main():
@@ -18,3 +23,130 @@ def test_main():
         assert ex.code == 0
     finally:
         sys.argv = saved_argv
+
+
+def _run_main(monkeypatch, capsys, argv, fire):
+    from cmkclient import cli
+    with monkeypatch.context() as patch:
+        if fire:
+            patch.setattr(cli, '_fast_command', lambda argv: None)
+        patch.setattr(sys, 'argv', ['cmkclient'] + argv)
+        main()
+    return capsys.readouterr().out
+
+
+@pytest.mark.parametrize('command', [
+    ['get_host', 'host00'],
+    ['get_all_hosts'],
+    ['get_hosts_by_folder', 'web/sub'],
+    ['get_folder', 'web'],
+    ['get_all_folders'],
+    ['get_all_users'],
+    ['get_hosttags'],
+    ['get_all_hostgroups'],
+    ['get_ruleset', 'checkgroup_parameters:hw_fans_perc'],
+    ['get_rulesets_info'],
+    ['get_site', 'cmk'],
+])
+def test_fast_path_prints_like_fire(monkeypatch, capsys, command):
+    with FakeServer() as server:
+        api = server.api()
+        api.add_folder('web')
+        api.add_folder('web/sub')
+        api.add_host('host00', 'web/sub', ipaddress='10.0.0.1', alias='first\nline')
+        api.add_host('host01')
+        api.add_hostgroup('webservers', 'Web servers')
+        options = ['--url', server.url, '--username=' + server.username, '--secret', server.secret]
+        fast = _run_main(monkeypatch, capsys, options + command, fire=False)
+        fired = _run_main(monkeypatch, capsys, command + options, fire=True)
+    assert fast == fired
+    assert fast
+
+
+def test_fast_path_runs_commands(monkeypatch, capsys):
+    with FakeServer() as server:
+        monkeypatch.setenv('CHECK_MK_URL', server.url)
+        monkeypatch.setenv('CHECK_MK_USER', server.username)
+        monkeypatch.setenv('CHECK_MK_SECRET', server.secret)
+        assert _run_main(monkeypatch, capsys, ['add_host', 'host00', 'web'], fire=False) == ''
+        assert server.site.hosts['host00']['path'] == 'web'
+        _run_main(monkeypatch, capsys, ['delete_host', 'host00'], fire=False)
+        assert 'host00' not in server.site.hosts
+
+
+@pytest.mark.parametrize('argv', [
+    [],
+    ['--help'],
+    ['get_host', '--help'],
+    ['get_host', 'host00', '--effective_attributes'],
+    ['get_host', '123'],
+    ['get_host', 'True'],
+    ['get_host', '[host00]'],
+    ['get_host', 'host00', 'extra'],
+    ['add_hosts', 'host00'],
+    ['--url'],
+    ['--url', 'http://a', '--url', 'http://b', 'get_all_hosts'],
+])
+def test_fast_path_leaves_the_rest_to_fire(argv):
+    assert _fast_command(argv) is None
+
+
+def test_fast_path_parses_options():
+    assert _fast_command(['--url=http://cmk/site', 'get_host', 'host-01.example.org', '--secret', 's3cr=t']) == (
+        {'url': 'http://cmk/site', 'secret': 's3cr=t'}, 'get_host', ['host-01.example.org'])
+
+
+def test_import_is_lazy():
+    # `fire` and friends are not needed by one-shot calls, so must not be loaded by them
+    code = 'import sys, cmkclient.cli; print(" ".join(sorted(sys.modules)))'
+    modules = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True).split()
+    for module in ('fire', 'asyncio', 'concurrent.futures', 'ast', 'inspect', 'sqlite3', 'cmkclient.batch'):
+        assert module not in modules
+
+
+def test_package_import_is_lazy():
+    # the HTTP transport and JSON parsing are loaded by the first request, not by `import cmkclient`
+    code = 'import sys, cmkclient.cli; print(" ".join(sorted(sys.modules)))'
+    modules = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True).split()
+    for module in ('http.client', 'ssl', 'json', 'urllib.parse',
+                   'cmkclient.pool', 'cmkclient.jsonstream', 'cmkclient.metrics', 'cmkclient.ratelimit'):
+        assert module not in modules
+
+
+def test_fast_commands_match_signatures():
+    # each fast command takes as many arguments as its method has leading `str` parameters
+    import inspect
+    from cmkclient.cli import _FAST_COMMANDS, Cli
+    for command, count in _FAST_COMMANDS.items():
+        parameters = list(inspect.signature(getattr(Cli, command)).parameters.values())[1:]
+        strings = 0
+        for parameter in parameters:
+            if parameter.annotation is not str:
+                break
+            strings += 1
+        assert count == strings, command
+
+
+def _export(monkeypatch, capsys, server, *args):
+    return _run_main(monkeypatch, capsys, [
+        '--url', server.url, '--username', server.username, '--secret', server.secret, 'export_hosts'] + list(args),
+        fire=False)
+
+
+def test_export_hosts(monkeypatch, capsys):
+    with FakeServer() as server:
+        api = server.api()
+        api.add_host('host00', 'web', ipaddress='10.0.0.1', alias='Web, "primary"')
+        api.add_host('host01')
+        ndjson = _export(monkeypatch, capsys, server)
+        csv = _export(monkeypatch, capsys, server, 'csv')
+        tsv = _export(monkeypatch, capsys, server, 'tsv', '--columns=hostname,tag_agent', '--effective_attributes')
+    hosts = [json.loads(line) for line in ndjson.splitlines()]
+    assert [host['hostname'] for host in hosts] == ['host00', 'host01']
+    assert hosts[0]['attributes']['ipaddress'] == '10.0.0.1'
+    assert csv.splitlines() == [
+        'hostname,path,ipaddress,alias',
+        'host00,web,10.0.0.1,"Web, ""primary"""',
+        'host01,,,',
+    ]
+    assert tsv.splitlines() == ['hostname\ttag_agent', 'host00\tcmk-agent', 'host01\tcmk-agent']
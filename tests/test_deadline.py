@@ -0,0 +1,134 @@
+"""
+Tests for request timeouts and deadlines.
+"""
+
+import asyncio
+import socket
+import time
+
+import pytest
+
+from cmkclient import WebApi
+from cmkclient.aio import AsyncWebApi
+from cmkclient.deadline import Deadline, split_timeout
+from cmkclient.exception import DeadlineExceeded
+from cmkclient.fakeserver import FakeServer
+
+
+def _run(coroutine):
+    """
+    Run `coroutine` in a new event loop, like `asyncio.run`, which needs Python 3.7.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_split_timeout():
+    assert split_timeout(None) == (None, None)
+    assert split_timeout(5) == (5, 5)
+    assert split_timeout((1, 30)) == (1, 30)
+
+
+def test_deadline():
+    deadline = Deadline(10)
+    assert 9 < deadline.remaining() <= 10
+    assert not deadline.expired()
+    connect, read = deadline.clip((1, 60))
+    assert connect == 1 and 9 < read <= 10
+    assert deadline.clip(None)[0] <= 10
+
+    deadline = Deadline(0)
+    assert deadline.expired()
+    assert deadline.remaining() == 0
+    with pytest.raises(DeadlineExceeded) as excinfo:
+        deadline.check('add_host')
+    assert excinfo.value.action == 'add_host'
+    with pytest.raises(DeadlineExceeded):
+        deadline.clip(5)
+
+
+def test_timeouts_by_action():
+    api = WebApi('http://localhost/cmk', 'automation', 'secret',
+                 timeout=5, action_timeouts={'get_all_hosts': (1, 2)})
+    assert api._timeout('add_host') == 5
+    assert api._timeout('get_all_hosts') == (1, 2)
+    assert api._timeout('bake_agents') == WebApi.default_action_timeouts['bake_agents']
+    assert api._timeout('get_all_hosts', timeout=7) == 7
+    assert WebApi('http://localhost/cmk', 'automation', 'secret').timeout == WebApi.default_timeout
+
+
+def test_read_timeout():
+    with FakeServer(action_latency={'get_all_hosts': 0.3}) as server:
+        api = server.api(action_timeouts={'get_all_hosts': (1, 0.1)})
+        with pytest.raises(socket.timeout):
+            api.get_all_hosts()
+        with pytest.raises(socket.timeout):
+            list(api.iter_all_hosts())
+        assert 'automation' in api.get_all_users()
+        assert api.make_request('get_all_hosts', timeout=5) == {}
+
+
+def test_deadline_stops_bulk_requests():
+    with FakeServer(latency=0.05) as server:
+        api = server.api()
+        with pytest.raises(DeadlineExceeded) as excinfo:
+            api.add_hosts(['host{0:02}'.format(n) for n in range(20)], batch_size=1, deadline=Deadline(0.22))
+        added = excinfo.value.outcome['succeeded_hosts']
+        assert 1 <= len(added) < 20
+        assert set(added) <= set(server.site.hosts)
+
+        with pytest.raises(DeadlineExceeded) as excinfo:
+            api.delete_hosts(added, batch_size=1, deadline=Deadline(0.12))
+        assert 1 <= len(excinfo.value.outcome) < len(added)
+
+
+def test_deadline_stops_iter_all_hosts():
+    with FakeServer(action_latency={'get_all_hosts': 0.3}) as server:
+        server.site.populate(20)
+        api = server.api()
+        with pytest.raises(DeadlineExceeded) as excinfo:
+            list(api.iter_all_hosts(deadline=Deadline(0.1)))
+        assert excinfo.value.action == 'get_all_hosts'
+
+        server.action_latency['get_all_hosts'] = 0
+        api.stream_chunk_size = 64
+        deadline = Deadline(0.2)
+        hosts = api.iter_all_hosts(deadline=deadline)
+        next(hosts)
+        time.sleep(0.25)
+        with pytest.raises(DeadlineExceeded):
+            list(hosts)
+        assert len(list(api.iter_all_hosts(deadline=Deadline(5)))) == 20
+
+
+def test_deadline_stops_discovery():
+    with FakeServer(action_latency={'discover_services': 0.1}) as server:
+        server.site.populate(40)
+        api = server.api()
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded) as excinfo:
+            api.discover_services_for_all_hosts(workers=4, deadline=Deadline(0.25))
+        assert time.monotonic() - started < 1
+        assert 4 <= len(excinfo.value.outcome) < 40
+
+
+def test_async_timeout():
+    async def run(server):
+        api = AsyncWebApi(server.url, server.username, server.secret, action_timeouts={'get_all_hosts': 0.1})
+        with pytest.raises(socket.timeout):
+            await api.get_all_hosts()
+        with pytest.raises(DeadlineExceeded):
+            async for _ in api.iter_all_hosts(deadline=Deadline(0.05)):
+                pass
+        server.action_latency['get_all_hosts'] = 0
+        with pytest.raises(DeadlineExceeded) as excinfo:
+            await api.discover_services_for_all_hosts(workers=2, deadline=Deadline(0.25))
+        assert excinfo.value.outcome
+        api.pool.close()
+
+    with FakeServer(action_latency={'get_all_hosts': 0.3, 'discover_services': 0.1}) as server:
+        server.site.populate(20)
+        _run(run(server))
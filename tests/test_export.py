@@ -0,0 +1,45 @@
+"""
+Tests for writing hosts as NDJSON, CSV and TSV.
+"""
+
+import io
+
+import pytest
+
+from cmkclient.export import write_hosts
+
+
+HOSTS = [
+    ('host00', {'hostname': 'host00', 'path': 'web', 'attributes': {'ipaddress': '10.0.0.1', 'parents': ['gw']}}),
+    ('host01', {'hostname': 'host01', 'path': '', 'attributes': {'alias': 'tab\there'}}),
+]
+
+
+def test_write_hosts_streams():
+    output = io.StringIO()
+    written = []
+
+    def hosts():
+        for hostname, host in HOSTS:
+            yield hostname, host
+            written.append(output.getvalue().count('\n'))
+
+    assert write_hosts(hosts(), output) == 2
+    # each host is written before the next one is decoded
+    assert written == [1, 2]
+
+
+def test_write_hosts_columns():
+    output = io.StringIO()
+    write_hosts(HOSTS, output, 'tsv', columns=('hostname', 'folder', 'parents', 'alias'), header=False)
+    assert output.getvalue().splitlines() == [
+        'host00\tweb\t"[""gw""]"\t',
+        'host01\t\t\t"tab\there"',
+    ]
+
+
+def test_write_hosts_errors():
+    with pytest.raises(ValueError):
+        write_hosts(HOSTS, io.StringIO(), 'xml')
+    with pytest.raises(ValueError):
+        write_hosts(HOSTS, io.StringIO(), 'csv', columns='hostname,,path')
@@ -0,0 +1,94 @@
+"""
+Tests for the stand-in Check_MK Web API server.
+"""
+
+import time
+
+import pytest
+
+from cmkclient import ActivateMode, AuthenticationError, ResponseError, ResultError, WebApi
+from cmkclient.fakeserver import FakeServer, FakeSite
+
+
+@pytest.fixture
+def server():
+    with FakeServer() as server:
+        yield server
+
+
+def test_authentication(server):
+    api = WebApi(server.url, server.username, 'wrong')
+    with pytest.raises(AuthenticationError):
+        api.get_all_hosts()
+
+
+def test_fail_next(server):
+    api = server.api()
+    server.fail_next('get_all_hosts', status=503)
+    server.fail_next('get_all_hosts', message='Check_MK exception: busy')
+    with pytest.raises(ResponseError):
+        api.get_all_hosts()
+    with pytest.raises(ResultError) as excinfo:
+        api.get_all_hosts()
+    assert excinfo.value.result_body == 'Check_MK exception: busy'
+    assert api.get_all_hosts() == {}
+    assert server.requests['get_all_hosts'] == 3
+
+
+def test_error_rate():
+    with FakeServer(error_rate=0.5, seed=1) as server:
+        api = server.api()
+        failures = 0
+        for _ in range(40):
+            try:
+                api.get_all_users()
+            except ResponseError:
+                failures += 1
+        assert 5 < failures < 35
+
+
+def test_latency():
+    with FakeServer(action_latency={'get_all_hosts': 0.1}) as server:
+        api = server.api()
+        started = time.monotonic()
+        api.get_all_hosts()
+        assert time.monotonic() - started >= 0.1
+
+
+def test_populate_and_compression(server):
+    server.site.populate(1000, folders=10)
+    api = server.api()
+    assert len(api.get_hosts_by_folder('folder0003')) == 100
+    assert api.pool.wire_bytes * 5 < api.pool.decoded_bytes
+
+
+def test_old_version_lacks_bulk_actions():
+    with FakeServer(FakeSite(version='1.4.0p38')) as server:
+        api = server.api()
+        with pytest.raises(ResultError):
+            api.make_request('add_hosts', data={'hosts': []})
+        api.add_host('host00')
+        api.add_host('host01')
+        api.delete_hosts(['host00', 'host01'])
+        assert server.requests['delete_host'] == 2
+        assert not server.site.hosts
+
+
+def test_activation(server):
+    api = server.api()
+    with pytest.raises(ResultError):
+        api.activate_changes()
+    api.add_host('host00')
+    result = api.activate_changes(ActivateMode.SPECIFIC, ['cmk'])
+    assert result['sites']['cmk']['_state'] == 'success'
+    assert server.site.activations == 1
+    assert not server.site.pending_sites
+
+
+def test_configuration_hash(server):
+    api = server.api()
+    tags = api.get_hosttags()
+    api.set_hosttags(dict(tags, aux_tags=[]))
+    with pytest.raises(ResultError):
+        # outdated hash
+        api.set_hosttags(tags)
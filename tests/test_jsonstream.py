@@ -0,0 +1,61 @@
+"""
+Tests for the incremental decoder of Web API responses.
+"""
+
+import json
+
+import pytest
+
+from cmkclient.exception import ResultError
+from cmkclient.jsonstream import iter_result_items
+
+
+def _chunks(text, size):
+    data = text.encode()
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+_HOSTS = {
+    'host{0:02}'.format(n): {'path': 'folder', 'attributes': {'alias': 'Höst {0}'.format(n), 'n': 12345}}
+    for n in range(20)
+}
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 100000])
+@pytest.mark.parametrize('code_first', [False, True])
+def test_items(size, code_first):
+    if code_first:
+        text = '{"result_code": 0, "result": ' + json.dumps(_HOSTS) + '}'
+    else:
+        text = json.dumps({'result': _HOSTS, 'result_code': 0}, indent=1)
+    assert dict(iter_result_items(_chunks(text, size))) == _HOSTS
+
+
+def test_empty_result():
+    assert list(iter_result_items([b'{"result": {}, "result_code": 0}'])) == []
+
+
+@pytest.mark.parametrize('text', [
+    '{"result": "Check_MK exception: no such host", "result_code": 1}',
+    '{"result_code": 1, "result": "Check_MK exception: no such host"}',
+])
+def test_result_error(text):
+    with pytest.raises(ResultError) as excinfo:
+        list(iter_result_items(_chunks(text, 5)))
+    assert excinfo.value.result_code == 1
+    assert excinfo.value.result_body == 'Check_MK exception: no such host'
+
+
+@pytest.mark.parametrize('text', [
+    '',
+    'Authentication error: invalid secret',
+    '{"result": {"a": 1}}',
+    '{"result_code": 0}',
+    '{"result": {"a": 1,}, "result_code": 0}',
+    '{"result": {"a": 1}, "result_code": 0} {}',
+    '{"result": {"a": 1}, "result_code": 0',
+    '{"result": [1, 2], "result_code": 0}',
+])
+def test_malformed(text):
+    with pytest.raises(ValueError):
+        list(iter_result_items(_chunks(text, 3)))
@@ -0,0 +1,79 @@
+"""
+Tests for request metrics.
+"""
+
+from cmkclient import ResultError
+from cmkclient.metrics import LatencyHistogram, MetricsCollector, RequestInfo
+
+
+def _info(action, elapsed, error=None, result_code=0):
+    info = RequestInfo('http://localhost/cmk/check_mk/webapi.py', action, 10)
+    info.status = 200
+    info.response_bytes = 100
+    info.elapsed = elapsed
+    info.error = error
+    info.result_code = result_code
+    return info
+
+
+def test_histogram_quantiles():
+    histogram = LatencyHistogram(buckets=[0.1, 0.2, 0.5, 1.0])
+    for n in range(100):
+        histogram.observe(0.01 * (n + 1))  # 0.01 ... 1.0
+    assert histogram.count == 100
+    assert abs(histogram.quantile(0.5) - 0.5) < 0.05
+    assert abs(histogram.quantile(0.95) - 0.95) < 0.05
+    assert histogram.quantile(1.0) == 1.0
+    assert histogram.quantile(0.0) >= 0.01
+
+
+def test_histogram_overflow_bucket():
+    histogram = LatencyHistogram(buckets=[0.1])
+    histogram.observe(5.0)
+    histogram.observe(7.0)
+    assert 5.0 <= histogram.quantile(0.99) <= 7.0
+
+
+def test_empty_histogram():
+    assert LatencyHistogram().quantile(0.5) is None
+
+
+def test_collector_as_dict():
+    collector = MetricsCollector()
+    collector.record(_info('get_all_hosts', 0.2))
+    collector.record(_info('get_all_hosts', 0.4))
+    collector.record(_info('add_host', 0.1, ResultError(1, 'exists'), 1))
+    collector.record(_info('add_host', 0.1, ConnectionResetError(), None))
+
+    metrics = collector.as_dict()
+    assert list(metrics) == ['add_host', 'get_all_hosts']
+    assert metrics['get_all_hosts']['count'] == 2
+    assert metrics['get_all_hosts']['errors'] == 0
+    assert metrics['get_all_hosts']['response_bytes'] == 200
+    assert 0.2 <= metrics['get_all_hosts']['p50'] <= 0.4
+    assert metrics['get_all_hosts']['max'] == 0.4
+    assert metrics['add_host']['errors'] == 2
+    assert metrics['add_host']['result_errors'] == 1
+
+    collector.reset()
+    assert collector.as_dict() == {}
+
+
+def test_openmetrics(tmpdir):
+    collector = MetricsCollector(buckets=[0.1, 1.0])
+    collector.record(_info('get_all_hosts', 0.05))
+    collector.record(_info('get_all_hosts', 0.5))
+    text = collector.to_openmetrics()
+    lines = text.splitlines()
+    assert 'cmkclient_request_duration_seconds_bucket{action="get_all_hosts",le="0.1"} 1' in lines
+    assert 'cmkclient_request_duration_seconds_bucket{action="get_all_hosts",le="1.0"} 2' in lines
+    assert 'cmkclient_request_duration_seconds_bucket{action="get_all_hosts",le="+Inf"} 2' in lines
+    assert 'cmkclient_request_duration_seconds_count{action="get_all_hosts"} 2' in lines
+    assert 'cmkclient_requests_total{action="get_all_hosts"} 2' in lines
+    assert 'cmkclient_request_errors_total{action="get_all_hosts"} 0' in lines
+    assert lines[-1] == '# EOF'
+
+    path = str(tmpdir.join('cmkclient.prom'))
+    collector.write_openmetrics(path)
+    with open(path) as metrics_file:
+        assert metrics_file.read() == text
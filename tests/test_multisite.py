@@ -0,0 +1,94 @@
+"""
+Tests for the multi-site fan-out client.
+"""
+
+import time
+
+import pytest
+
+from cmkclient import ResponseError
+from cmkclient.exception import MultiSiteError
+from cmkclient.fakeserver import FakeServer, FakeSite
+from cmkclient.multisite import MultiSiteWebApi
+
+
+@pytest.fixture
+def servers():
+    servers = {
+        'berlin': FakeServer(FakeSite('berlin'), latency=0.2),
+        'paris': FakeServer(FakeSite('paris'), latency=0.2),
+        'rome': FakeServer(FakeSite('rome'), latency=0.2),
+    }
+    for server in servers.values():
+        server.start()
+    yield servers
+    for server in servers.values():
+        server.stop()
+
+
+@pytest.fixture
+def multi(servers):
+    multi = MultiSiteWebApi({site: server.api() for site, server in servers.items()})
+    yield multi
+    multi.close()
+
+
+def test_fan_out(servers, multi):
+    started = time.monotonic()
+    outcome = multi.get_all_users()
+    assert time.monotonic() - started < 0.5
+    assert sorted(outcome) == ['berlin', 'paris', 'rome']
+    assert all(outcome[site].ok for site in outcome)
+    assert all(0.2 <= elapsed < 0.5 for elapsed in outcome.timings.values())
+    assert outcome.elapsed < 0.5
+    assert 'automation' in outcome['rome'].get()
+    assert multi.sites == ['berlin', 'paris', 'rome']
+
+
+def test_site_errors(servers, multi):
+    servers['paris'].fail_next('get_all_hosts', status=503)
+    outcome = multi.get_all_hosts()
+    assert list(outcome.errors) == ['paris']
+    assert isinstance(outcome.errors['paris'], ResponseError)
+    assert sorted(outcome.results) == ['berlin', 'rome']
+    with pytest.raises(ResponseError):
+        outcome['paris'].get()
+    with pytest.raises(MultiSiteError) as excinfo:
+        outcome.raise_errors()
+    assert excinfo.value.outcome is outcome
+
+
+def test_host_index(servers, multi):
+    servers['berlin'].site.populate(3)
+    servers['rome'].site.populate(2)
+    index = multi.host_index()
+    assert sorted(index) == ['host000000', 'host000001', 'host000002']
+    assert sorted(index['host000000']) == ['berlin', 'rome']
+    assert list(index['host000002']) == ['berlin']
+
+    servers['rome'].fail_next('get_all_hosts', status=500)
+    with pytest.raises(MultiSiteError):
+        multi.host_index()
+    servers['rome'].fail_next('get_all_hosts', status=500)
+    assert sorted(multi.host_index(partial=True)['host000000']) == ['berlin']
+
+
+def test_call_subset(servers, multi):
+    outcome = multi.call('add_host', 'host00', site_names=['paris'])
+    assert list(outcome) == ['paris']
+    assert 'host00' in servers['paris'].site.hosts
+    assert 'host00' not in servers['berlin'].site.hosts
+    assert dict(multi.iter_all_hosts().results['paris']).keys() == {'host00'}
+    with pytest.raises(KeyError):
+        multi.call('get_all_hosts', site_names=['madrid'])
+    with pytest.raises(AttributeError):
+        multi._prepare_request
+
+
+def test_from_urls(servers):
+    server = servers['berlin']
+    multi = MultiSiteWebApi.from_urls({'berlin': server.url, 'paris': servers['paris'].url},
+                                      server.username, server.secret, timeout=5)
+    assert multi.apis['berlin'].pool is multi.apis['paris'].pool
+    assert multi.apis['berlin'].timeout == 5
+    assert not multi.get_hosttags().errors
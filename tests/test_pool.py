@@ -0,0 +1,213 @@
+"""
+Tests for the keep-alive connection pool.
+"""
+
+import gzip
+import http.client
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import threading
+import zlib
+
+import pytest
+
+from cmkclient.pool import ConnectionPool
+
+
+_TEXT = b''.join(b'host%05d: {"path": "folder", "attributes": {}}\n' % n for n in range(2000))
+
+
+class _EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    #: paths of the requests received, in order
+    received = []
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        if self.path in ('/close', '/drop'):
+            # close without telling the client, as servers do with idle connections
+            self.close_connection = True
+
+    def do_GET(self):
+        self.received.append(self.path)
+        if self.path == '/drop':
+            # drop the connection without answering
+            return
+        if self.path.startswith('/compressed/'):
+            self._reply_compressed(self.path.rsplit('/', 1)[1])
+        else:
+            self._reply(self.path.encode())
+
+    def _reply_compressed(self, encoding):
+        self.send_response(200)
+        if encoding in self.headers.get('Accept-Encoding', ''):
+            if encoding == 'gzip':
+                body = gzip.compress(_TEXT)
+            elif encoding == 'deflate':
+                body = zlib.compress(_TEXT)
+            self.send_header('Content-Encoding', encoding)
+        elif encoding == 'rawdeflate':
+            # deflate data without the zlib header, as sent by some servers
+            compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+            body = compressor.compress(_TEXT) + compressor.flush()
+            self.send_header('Content-Encoding', 'deflate')
+        else:
+            body = _TEXT
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.received.append(self.path)
+        if self.path != '/drop':
+            self._reply(body)
+
+    def _reply(self, body):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(HTTPServer):
+    #: set whenever the server has closed a connection
+    closed = threading.Event()
+
+    def shutdown_request(self, request):
+        super().shutdown_request(request)
+        self.closed.set()
+
+
+@pytest.fixture
+def server_url():
+    _EchoHandler.received = []
+    _Server.closed.clear()
+    server = _Server(('127.0.0.1', 0), _EchoHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{0}'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+def test_connection_reuse(server_url):
+    pool = ConnectionPool()
+    for n in range(3):
+        with pool.request(server_url + '/path?n={0}'.format(n)) as response:
+            assert response.status == 200
+            assert response.read() == '/path?n={0}'.format(n).encode()
+    assert pool.misses == 1
+    assert pool.hits == 2
+
+
+def test_post(server_url):
+    pool = ConnectionPool()
+    with pool.request(server_url + '/', data=b'request={}') as response:
+        assert response.read() == b'request={}'
+
+
+def test_unread_response_is_not_reused(server_url):
+    pool = ConnectionPool()
+    with pool.request(server_url + '/'):
+        pass
+    assert pool.stats()['idle'] == 0
+
+
+def test_idle_timeout(server_url):
+    pool = ConnectionPool(idle_timeout=0)
+    for _ in range(2):
+        with pool.request(server_url + '/') as response:
+            response.read()
+    assert pool.misses == 2
+    assert pool.hits == 0
+
+
+def test_close(server_url):
+    pool = ConnectionPool()
+    with pool.request(server_url + '/') as response:
+        response.read()
+    pool.close()
+    assert pool.stats()['idle'] == 0
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'deflate', 'rawdeflate'])
+def test_compressed_response(server_url, encoding):
+    pool = ConnectionPool()
+    with pool.request(server_url + '/compressed/' + encoding) as response:
+        assert response.read() == _TEXT
+    stats = pool.stats()
+    assert stats['decoded_bytes'] == len(_TEXT)
+    assert stats['wire_bytes'] < len(_TEXT) / 5
+
+
+def test_compressed_response_streamed(server_url):
+    pool = ConnectionPool()
+    chunks = []
+    with pool.request(server_url + '/compressed/gzip') as response:
+        while True:
+            chunk = response.read(1000)
+            if not chunk:
+                break
+            assert len(chunk) <= 1000
+            chunks.append(chunk)
+    assert b''.join(chunks) == _TEXT
+    # fully read: the connection can be reused
+    assert pool.stats()['idle'] == 1
+
+
+def test_compression_disabled(server_url):
+    pool = ConnectionPool(compress=False)
+    with pool.request(server_url + '/compressed/gzip') as response:
+        assert response.getheader('Content-Encoding') is None
+        assert response.read() == _TEXT
+    assert pool.wire_bytes == pool.decoded_bytes == len(_TEXT)
+
+
+def test_connection_closed_while_idle(server_url):
+    pool = ConnectionPool()
+    with pool.request(server_url + '/close') as response:
+        response.read()
+    assert _Server.closed.wait(5)
+    _EchoHandler.received.clear()
+    # seen closed before anything is sent: even a POST goes out once, on a new connection
+    with pool.request(server_url + '/', data=b'request={}') as response:
+        assert response.read() == b'request={}'
+    assert _EchoHandler.received == ['/']
+    assert pool.stale == 1
+    assert pool.misses == 2
+
+
+@pytest.mark.parametrize('data, sent', [(None, 2), (b'request={}', 1)])
+def test_only_get_is_sent_again(server_url, data, sent):
+    pool = ConnectionPool()
+    with pool.request(server_url + '/') as response:
+        response.read()
+    _EchoHandler.received.clear()
+    # the server may have acted on the request before dropping the connection
+    with pytest.raises(http.client.RemoteDisconnected):
+        with pool.request(server_url + '/drop', data=data):
+            pass
+    assert _EchoHandler.received == ['/drop'] * sent
+
+
+def test_http_proxy(server_url):
+    pool = ConnectionPool(proxies={'http': server_url})
+    with pool.request('http://cmk.example/site/check_mk/webapi.py?action=get_host') as response:
+        # the echoing server plays the proxy, which is sent the whole URL
+        assert response.read() == b'http://cmk.example/site/check_mk/webapi.py?action=get_host'
+
+
+def test_proxy_from_environment(server_url, monkeypatch):
+    monkeypatch.setenv('http_proxy', server_url)
+    monkeypatch.setenv('no_proxy', '127.0.0.1')
+    pool = ConnectionPool()
+    with pool.request('http://cmk.example/site') as response:
+        assert response.read() == b'http://cmk.example/site'
+    # the test server answers one connection at a time
+    pool.close()
+    with pool.request(server_url + '/site') as response:
+        assert response.read() == b'/site'
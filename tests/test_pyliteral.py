@@ -0,0 +1,51 @@
+"""
+Tests for the parser of Check_MK's Python-literal responses.
+"""
+
+from ast import literal_eval
+
+import pytest
+
+from cmkclient.pyliteral import loads
+
+
+@pytest.mark.parametrize('text', [
+    "{'result': {'ruleset': {'': [{'value': (80.0, 90.0), 'condition': {}}]}}, 'result_code': 0}",
+    "{u'alias': u'Site \\xe4', 'port': 6557, 'disabled': False, 'timeout': None}",
+    "[1, -2, 3.5, 1e-3, (), (1,), (1, 2), [], {}]",
+    "{(1, 'a'): 'tuple key', 2: 'int key'}",
+    "'it\\'s'",
+    '"double \\"quoted\\""',
+    "b'bytes'",
+    "[1, 2,]",
+    "(1)",
+    "  {\n 'a' :  1 }  ",
+])
+def test_same_as_literal_eval(text):
+    expected = literal_eval(text)
+    result = loads(text)
+    assert result == expected
+    assert type(result) is type(expected)
+
+
+def test_python2_long():
+    assert loads("{'size': 10L}") == {'size': 10}
+
+
+@pytest.mark.parametrize('text', [
+    "",
+    "[1 2]",
+    "[1,,2]",
+    "{'a' 1}",
+    "{'a': }",
+    "{'a'}",
+    "{1, 2}",
+    "['a': 1]",
+    "(1, 2",
+    "[1] [2]",
+    "'unterminated",
+    "__import__('os')",
+])
+def test_invalid(text):
+    with pytest.raises(ValueError):
+        loads(text)
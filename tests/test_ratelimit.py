@@ -0,0 +1,179 @@
+"""
+Tests for client-side rate and concurrency limits.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import socket
+import threading
+import time
+
+import pytest
+
+from cmkclient import ResponseError, ResultError
+from cmkclient.aio import AsyncWebApi
+from cmkclient.deadline import Deadline
+from cmkclient.exception import DeadlineExceeded
+from cmkclient.fakeserver import FakeServer
+from cmkclient.ratelimit import AdaptiveConcurrency, SiteLimiter, TokenBucket, is_overload, shared_limiter
+
+
+def _run(coroutine):
+    """
+    Run `coroutine` in a new event loop, like `asyncio.run`, which needs Python 3.7.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class _Response:
+    def __init__(self, status):
+        self.status = status
+
+
+def test_is_overload():
+    assert is_overload(socket.timeout())
+    assert is_overload(ConnectionResetError())
+    assert is_overload(ResponseError(_Response(503)))
+    assert not is_overload(ResponseError(_Response(404)))
+    assert not is_overload(ResultError(1, 'Check_MK exception: host exists'))
+    assert not is_overload(None)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(20)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.19
+
+    bucket = TokenBucket(1, burst=5)
+    assert [bucket.reserve() for _ in range(5)] == [0.0] * 5
+    assert bucket.reserve(max_wait=0.5) is None
+    assert 0.9 < bucket.reserve() <= 1.0
+
+
+def test_concurrency_limit():
+    limit = AdaptiveConcurrency(2, minimum=2, maximum=2)
+    assert limit.acquire() and limit.acquire()
+    assert not limit.acquire(timeout=0.05)
+    assert limit.waiting == 0
+
+    granted = threading.Event()
+    thread = threading.Thread(target=lambda: limit.acquire() and granted.set())
+    thread.start()
+    time.sleep(0.05)
+    assert limit.waiting == 1 and not granted.is_set()
+    limit.release(time.monotonic(), 0.01, False)
+    thread.join()
+    assert granted.is_set()
+    assert limit.in_flight == 2
+
+
+def test_aimd():
+    limit = AdaptiveConcurrency(4, minimum=1, maximum=8, latency_target=1.0)
+    # fast requests at full use of the limit increase it
+    for _ in range(40):
+        while limit.acquire(timeout=0):
+            pass
+        limit.release(time.monotonic(), 0.01, False)
+    assert limit.limit == 8
+
+    # a burst of overloaded requests halves it only once
+    started = time.monotonic()
+    for _ in range(limit.in_flight):
+        limit.release(started, 0.01, True)
+    assert limit.limit == 4
+    assert limit.decreases == 1
+
+    # slow requests count as overload too
+    limit.acquire()
+    limit.release(time.monotonic(), 1.5, False)
+    assert limit.limit == 2
+
+    # nothing changes while the limit is not fully used
+    limit.acquire()
+    limit.release(time.monotonic(), 0.01, False)
+    assert limit.limit == 2
+
+
+def test_shared_limiter():
+    limiter = shared_limiter('http://site/cmk', rate=5)
+    assert shared_limiter('http://site/cmk') is limiter
+    assert shared_limiter('http://other/cmk') is not limiter
+    assert limiter.bucket.rate == 5
+
+
+def test_web_api_concurrency():
+    limiter = SiteLimiter(concurrency=2)
+    observed = []
+    with FakeServer(latency=0.02) as server:
+        api = server.api(limiter=limiter)
+        other = server.api(limiter=limiter)
+        api.add_request_hook(before=lambda info: observed.append(limiter.concurrency.in_flight))
+        other.add_request_hook(before=lambda info: observed.append(limiter.concurrency.in_flight))
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda n: (api, other)[n % 2].get_all_hosts(), range(16)))
+    assert len(observed) == 16
+    assert max(observed) == 2
+    assert limiter.stats()['requests'] == 16
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_web_api_backs_off():
+    limiter = SiteLimiter(concurrency=AdaptiveConcurrency(8, latency_target=10))
+    with FakeServer(error_rate=1.0) as server:
+        api = server.api(limiter=limiter)
+        for _ in range(3):
+            with pytest.raises(ResponseError):
+                api.get_all_hosts()
+    assert limiter.concurrency.limit == 1
+    assert limiter.stats()['overloads'] == 3
+
+
+def test_web_api_rate_and_deadline():
+    limiter = SiteLimiter(rate=10)
+    with FakeServer() as server:
+        api = server.api(limiter=limiter)
+        started = time.monotonic()
+        for _ in range(4):
+            api.get_all_hosts()
+        assert time.monotonic() - started >= 0.29
+        with pytest.raises(DeadlineExceeded):
+            api.add_hosts(['host{0:02}'.format(n) for n in range(10)], batch_size=1, deadline=Deadline(0.25))
+
+
+def test_iter_all_hosts_holds_slot_until_closed():
+    limiter = SiteLimiter(concurrency=1)
+    with FakeServer() as server:
+        server.site.populate(20)
+        api = server.api(limiter=limiter)
+        api.stream_chunk_size = 64
+        hosts = api.iter_all_hosts()
+        next(hosts)
+        assert limiter.concurrency.in_flight == 1
+        hosts.close()
+        assert limiter.concurrency.in_flight == 0
+        assert len(list(api.iter_all_hosts())) == 20
+    assert limiter.concurrency.in_flight == 0
+    assert limiter.stats()['requests'] == 2
+
+
+def test_async_web_api():
+    limiter = SiteLimiter(concurrency=2)
+    observed = []
+
+    async def run(server):
+        api = AsyncWebApi(server.url, server.username, server.secret, limiter=limiter)
+        api.add_request_hook(before=lambda info: observed.append(limiter.concurrency.in_flight))
+        await asyncio.gather(*[api.get_all_hosts() for _ in range(8)])
+        api.pool.close()
+
+    with FakeServer(latency=0.02) as server:
+        _run(run(server))
+    assert len(observed) == 8
+    assert max(observed) == 2
+    assert limiter.concurrency.in_flight == 0
@@ -0,0 +1,158 @@
+"""
+Tests for the host and rule set reconciliation engines.
+"""
+
+import pytest
+
+from cmkclient.exception import ResultError
+from cmkclient.fakeserver import FakeServer
+from cmkclient.reconcile import HostReconciler, RulesetReconciler
+
+
+CURRENT = {
+    'host00': {'hostname': 'host00', 'path': '', 'attributes': {'ipaddress': '192.168.0.100'}},
+    'host01': {'hostname': 'host01', 'path': 'web', 'attributes': {'alias': 'Web', 'tag_agent': 'cmk-agent'}},
+    'host02': {'hostname': 'host02', 'path': '', 'attributes': {'meta_data': {'created_by': 'automation'}}},
+}
+
+
+def test_no_changes():
+    plan = HostReconciler(None).plan({
+        'host00': {'attributes': {'ipaddress': '192.168.0.100'}},
+        'host01': {'folder': '/web/', 'attributes': {'alias': 'Web'}, 'tags': {'agent': 'cmk-agent'}},
+        'host02': None,
+    }, CURRENT)
+    assert not plan
+
+
+def test_add_edit_move_delete():
+    plan = HostReconciler(None).plan({
+        'host00': {'attributes': {'ipaddress': '192.168.0.200'}},
+        'host01': {'folder': 'db', 'attributes': {'alias': 'Web'}},
+        'host03': {'folder': 'web', 'tags': {'tag_agent': 'cmk-agent'}},
+    }, CURRENT)
+    assert plan.add == [{'hostname': 'host03', 'folder': 'web', 'tag_agent': 'cmk-agent'}]
+    assert plan.edit == [{'hostname': 'host00', 'ipaddress': '192.168.0.200'}]
+    assert plan.move == [{'hostname': 'host01', 'folder': 'db', 'alias': 'Web'}]
+    assert plan.delete == ['host02']
+    assert plan.summary() == {'add': 1, 'edit': 1, 'move': 1, 'delete': 1}
+
+
+def test_unset_attributes():
+    plan = HostReconciler(None).plan({'host01': {'folder': 'web'}}, CURRENT)
+    assert plan.edit == [{'hostname': 'host01', 'unset_attributes': ['alias', 'tag_agent']}]
+
+
+def test_keep_unmanaged():
+    plan = HostReconciler(None, delete=False, unset=False).plan({'host01': {'folder': 'web'}}, CURRENT)
+    assert not plan
+
+
+def test_move_keeps_unmanaged_attributes():
+    plan = HostReconciler(None, unset=False).plan({'host01': {'folder': 'db'}}, CURRENT)
+    assert plan.move == [{'hostname': 'host01', 'folder': 'db', 'alias': 'Web', 'tag_agent': 'cmk-agent'}]
+    assert plan.move_from['host01'] == {
+        'hostname': 'host01', 'folder': 'web', 'alias': 'Web', 'tag_agent': 'cmk-agent'}
+
+
+def test_apply():
+    with FakeServer() as server:
+        api = server.api()
+        api.add_hosts([
+            {'hostname': 'host00', 'folder': 'web', 'alias': 'Web'},
+            {'hostname': 'host01', 'folder': 'web'},
+            'host02',
+        ])
+        reconciler = HostReconciler(api)
+        desired = {
+            'host00': {'folder': 'db', 'attributes': {'alias': 'Web'}},
+            'host01': {'folder': 'web', 'attributes': {'alias': 'Web'}},
+            'host03': {},
+        }
+        plan, result = reconciler.reconcile(desired)
+        assert plan.summary() == {'add': 1, 'edit': 1, 'move': 1, 'delete': 1}
+        assert result['moved']['succeeded_hosts'] == ['host00']
+        assert result['deleted'] == ['host02']
+        assert sorted(server.site.hosts) == ['host00', 'host01', 'host03']
+        assert server.site.hosts['host00']['path'] == 'db'
+        assert server.site.hosts['host01']['attributes'] == {'alias': 'Web'}
+        assert not reconciler.plan(desired)
+
+
+def test_failed_move_puts_hosts_back():
+    with FakeServer() as server:
+        api = server.api()
+        api.add_hosts([{'hostname': 'host00', 'folder': 'web', 'alias': 'Web'}, 'host01'])
+        server.fail_next('add_hosts')
+        _, result = HostReconciler(api).reconcile({
+            'host00': {'folder': 'db', 'attributes': {'alias': 'Web'}},
+            'host01': {'folder': 'db'},
+        })
+        assert sorted(result['moved']['failed_hosts']) == ['host00', 'host01']
+        assert sorted(result['restored']) == ['host00', 'host01']
+        assert server.site.hosts['host00']['path'] == 'web'
+        assert server.site.hosts['host00']['attributes'] == {'alias': 'Web'}
+        assert server.site.hosts['host01']['path'] == ''
+
+
+RULESET = 'checkgroup_parameters:hw_fans_perc'
+FAN_RULE = {'value': {'levels_lower': (10.0, 5.0)}, 'condition': {}, 'options': {}}
+
+
+def test_ruleset_no_changes():
+    current = {'ruleset': {'': [FAN_RULE], 'web': []}, 'configuration_hash': 'abc'}
+    plan = RulesetReconciler(None).plan(RULESET, {'/': [{'value': {'levels_lower': (10.0, 5.0)}}]}, current)
+    assert not plan
+    assert plan.configuration_hash == 'abc'
+
+
+def test_ruleset_changes_per_folder():
+    current = {'ruleset': {'': [FAN_RULE], 'db': [FAN_RULE, FAN_RULE]}}
+    desired = {
+        '': [{'value': {'levels_lower': [10.0, 5.0]}}],  # a list is not a tuple
+        'web': [FAN_RULE],
+    }
+    plan = RulesetReconciler(None, delete=True).plan(RULESET, desired, current)
+    assert plan.folders == {
+        '': {'added': 0, 'removed': 0, 'changed': 1},
+        'db': {'added': 0, 'removed': 2, 'changed': 0},
+        'web': {'added': 1, 'removed': 0, 'changed': 0},
+    }
+    assert plan.summary() == {'folders': 3, 'added': 1, 'removed': 2, 'changed': 1}
+    assert sorted(plan.ruleset) == ['', 'web']
+
+    # by default, folders left out keep their rules, and empty ones lose them
+    plan = RulesetReconciler(None).plan(RULESET, desired, current)
+    assert sorted(plan.folders) == ['', 'web']
+    assert sorted(plan.ruleset) == ['', 'db', 'web']
+    plan = RulesetReconciler(None).plan(RULESET, dict(desired, db=[]), current)
+    assert sorted(plan.folders) == ['', 'db', 'web']
+    assert sorted(plan.ruleset) == ['', 'web']
+
+
+def test_ruleset_reconcile():
+    with FakeServer() as server:
+        api = server.api()
+        api.add_folder('web')
+        reconciler = RulesetReconciler(api)
+        desired = {
+            RULESET: {'': [FAN_RULE]},
+            'host_groups': {'web': [{'value': 'webservers', 'condition': {}}]},
+        }
+        server.site.pending_sites.clear()
+        plans, written = reconciler.reconcile(desired)
+        assert written == ['host_groups']
+        assert not plans[RULESET]
+        assert server.site.rulesets['host_groups'] == {'web': [{'value': 'webservers', 'condition': {}, 'options': {}}]}
+
+        # a second sync writes nothing, so activates nothing
+        server.site.pending_sites.clear()
+        plans, written = reconciler.reconcile(desired)
+        assert written == []
+        assert not server.site.pending_sites
+
+        # the write is refused if the rule set changed after planning
+        plan = reconciler.plan('host_groups', {'web': []})
+        api.set_ruleset('host_groups', {'': [{'value': 'all', 'condition': {}, 'options': {}}]})
+        with pytest.raises(ResultError):
+            reconciler.apply(plan)